@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+""" Compares connect.models.codec against pickle and JSON for serializing models.
+
+Usage: ``python benchmarks/codec.py [number_of_objects]``
+"""
+
+import json
+import os
+import pickle
+import sys
+import timeit
+
+from connect.models import Fulfillment, TierConfigRequest, codec
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'data')
+
+
+def _load_json(filename, count):
+    # type: (str, int) -> str
+    """ Returns a JSON list with ``count`` objects taken from the given file. """
+    with open(os.path.join(DATA_DIR, filename)) as file_handle:
+        objects = json.loads(file_handle.read())
+    return json.dumps((objects * (count // len(objects) + 1))[:count])
+
+
+def _pickle_dumps(objects):
+    return pickle.dumps(objects, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _json_dumps(objects):
+    return json.dumps([obj.json for obj in objects])
+
+
+def bench(name, model_class, json_data, repeat=5):
+    # Deserialize from JSON so every object is distinct, otherwise pickle would memoize them
+    objects = model_class.deserialize(json_data)
+    methods = [
+        ('codec', codec.dumps, codec.loads, None),
+        ('pickle', _pickle_dumps, pickle.loads, None),
+        # Models cannot be deserialized from their own JSON representation, so the original
+        # JSON data is used to measure deserialization
+        ('json', _json_dumps, model_class.deserialize, json_data),
+    ]
+    print('{} ({} objects)'.format(name, len(objects)))
+    print('  {:<8} {:>12} {:>12} {:>12}'.format('method', 'size (B)', 'dumps (ms)', 'loads (ms)'))
+    for method, dumps, loads, data in methods:
+        data = data or dumps(objects)
+        dumps_time = min(timeit.repeat(lambda: dumps(objects), number=1, repeat=repeat))
+        loads_time = min(timeit.repeat(lambda: loads(data), number=1, repeat=repeat))
+        print('  {:<8} {:>12} {:>12.2f} {:>12.2f}'.format(
+            method, len(data), dumps_time * 1000, loads_time * 1000))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    for name, model_class, filename in (
+            ('Fulfillment', Fulfillment, 'response2.json'),
+            ('TierConfigRequest', TierConfigRequest, 'response_tier_config_request.json')):
+        bench(name, model_class, _load_json(filename, count))
+
+
+if __name__ == '__main__':
+    main()
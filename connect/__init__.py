@@ -38,6 +38,7 @@ name = 'connect'
 
 __all__ = [
     'config',
+    'daemon',
     'exceptions',
     'logger',
     'models',
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from connect.exceptions import DispatchTimeout
+from connect.resources.automation_engine import DispatchOutcome
+from connect.sharding import get_attribute
+
+
+class Bulkhead(object):
+    """ Limits of the worker pool of one product or group of products.
+
+    :param int max_workers: Maximum number of requests dispatched concurrently.
+    :param float timeout: Seconds a request may take to be dispatched, or ``None`` for no limit.
+        When a request times out, the requests of the same pool that have not started yet are
+        deferred to the next call to ``process``.
+    :param int max_queue: Maximum number of requests waiting for a worker, or ``None`` for no
+        limit. Requests beyond that are deferred to the next call to ``process``.
+    """
+
+    def __init__(self, max_workers=2, timeout=None, max_queue=None):
+        # type: (int, Optional[float], Optional[int]) -> None
+        if max_workers < 1:
+            raise ValueError('Bulkheads need at least one worker')
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_queue = max_queue
+
+
+class Bulkheads(object):
+    """ Dispatches requests on a separate, bounded worker pool for every product (or for every
+    group of products), so a slow vendor backend only delays the requests of its own products.
+
+    The pools are kept across calls to :py:meth:`dispatch`, so their limits hold for the
+    requests of consecutive calls to ``process`` too. Python threads cannot be interrupted, so a
+    request that times out keeps its worker busy until it finishes, but :py:meth:`dispatch` does
+    not wait for it. Until then, the request is :py:attr:`in_flight`: it is left out of the
+    following calls to ``process``, its lease (if requests are leased) is kept, and it counts
+    against the ``max_workers`` of its pool, so new requests of the pool are deferred while all
+    its workers are busy with requests that timed out. Call :py:meth:`close` once done.
+
+    :param Bulkhead default: Limits of the pools of products that are not in ``limits``.
+    :param dict[str,str] groups: Maps product ids to the name of their group. Products that are
+        not in a group get a pool of their own.
+    :param dict[str,Bulkhead] limits: Limits of the pools of some products or groups, by
+        product id or group name.
+    :param str key: Request attribute (from the ``attribute_paths`` of the engine) that defines
+        the pool of a request.
+    """
+
+    STATS = ('dispatched', 'timed_out', 'deferred')
+
+    logger = logging.getLogger('Bulkheads.logger')
+
+    def __init__(self, default=None, groups=None, limits=None, key='product'):
+        # type: (Optional[Bulkhead], Dict[str, str], Dict[str, Bulkhead], str) -> None
+        self.default = default or Bulkhead()
+        self.groups = dict(groups or {})
+        self.limits = dict(limits or {})
+        self.key = key
+        self._stats = OrderedDict()  # type: Dict[str, Dict[str, int]]
+        # Request id -> callbacks to run when its task finishes
+        self._in_flight = {}  # type: Dict[str, List[Callable[[str], Any]]]
+        self._executors = {}  # type: Dict[str, Any]
+        # Pool -> number of tasks that timed out and are still running
+        self._abandoned = {}  # type: Dict[str, int]
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Dict[str, int]]
+        """ (dict[str,dict[str,int]]) For every pool used in the last call to
+        :py:meth:`dispatch`, the number of requests dispatched, timed out and deferred. """
+        with self._lock:
+            return OrderedDict((pool, dict(value)) for pool, value in self._stats.items())
+
+    @property
+    def in_flight(self):
+        # type: () -> List[str]
+        """ (list[str]) Ids of the requests being dispatched, including the ones that timed out
+        but are still running. """
+        with self._lock:
+            return sorted(self._in_flight)
+
+    def bypass_in_flight(self, requests):
+        # type: (Iterable[Any]) -> Iterator[Any]
+        """
+        :param Iterable requests: Listed requests.
+        :return: The requests that are not :py:attr:`in_flight`.
+        :rtype: Iterator
+        """
+        for request in requests:
+            with self._lock:
+                running = request.id in self._in_flight
+            if running:
+                self.logger.info('Bypassing request {} still running since it timed out'
+                                 .format(request.id))
+            else:
+                yield request
+
+    def when_done(self, request_id, callback):
+        # type: (str, Callable[[str], Any]) -> None
+        """ Calls ``callback(request_id)`` once the request is not :py:attr:`in_flight`, which
+        may be right away.
+
+        :param str request_id: Id of the request.
+        :param Callable callback: Function to call.
+        """
+        with self._lock:
+            callbacks = self._in_flight.get(request_id)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return
+        callback(request_id)
+
+    def pool_of(self, value):
+        # type: (Any) -> str
+        """
+        :param value: Value of the key attribute of a request, like a product id.
+        :return: Name of the pool of the request.
+        :rtype: str
+        """
+        return self.groups.get(value, str(value))
+
+    def limits_of(self, pool):
+        # type: (str) -> Bulkhead
+        return self.limits.get(pool, self.default)
+
+    def close(self):
+        # type: () -> None
+        """ Shuts down the worker pools, without waiting for the requests still running. """
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=False)
+
+    def dispatch(self, engine, jobs):
+        # type: (Any, Iterable[tuple]) -> List[DispatchOutcome]
+        """ Dispatches requests, waiting until all of them finish, time out or are deferred.
+
+        :param AutomationEngine engine: Engine the requests belong to.
+        :param Iterable[tuple] jobs: Engine that must dispatch each request, and the request.
+        :return: The outcome of every request that was not deferred, in the order of ``jobs``.
+        :rtype: list[DispatchOutcome]
+        """
+        path = engine.attribute_paths.get(self.key)
+        if not path:
+            raise ValueError('Invalid bulkhead key `{}` for {}. Valid keys are: {}'.format(
+                self.key, engine.__class__.__name__, ', '.join(sorted(engine.attribute_paths))))
+
+        with self._lock:
+            self._stats = OrderedDict()
+        tasks = []  # type: List[_Task]
+        for job in jobs:
+            pool = self.pool_of(get_attribute(job[1], path))
+            limits = self.limits_of(pool)
+            waiting = sum(1 for task in tasks if task.pool == pool and not task.started)
+            with self._lock:
+                busy = self._abandoned.get(pool, 0)
+            if busy >= limits.max_workers or \
+                    (limits.max_queue is not None and waiting >= limits.max_queue):
+                self._count(pool, 'deferred')
+                continue
+            task = _Task(pool, job[1].id, limits.timeout)
+            with self._lock:
+                self._in_flight.setdefault(task.request_id, [])
+            task.future = self._executor(pool, limits).submit(
+                task.run, engine._dispatch_one, job)
+            task.future.add_done_callback(functools.partial(self._finish, task))
+            tasks.append(task)
+        return self._collect(tasks)
+
+    def _executor(self, pool, limits):
+        # type: (str, Bulkhead) -> Any
+        from concurrent.futures import ThreadPoolExecutor
+        with self._lock:
+            if pool not in self._executors:
+                self._executors[pool] = ThreadPoolExecutor(limits.max_workers)
+            return self._executors[pool]
+
+    def _collect(self, tasks):
+        # type: (List[_Task]) -> List[DispatchOutcome]
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        outcomes = {}
+        pending = list(tasks)
+        while pending:
+            # Tasks may start at any time, so poll often enough to notice their timeouts
+            if any(task.timeout is not None for task in pending):
+                wait_time = 0.05
+            else:
+                wait_time = None
+            wait([task.future for task in pending], wait_time, FIRST_COMPLETED)
+
+            now = time.time()
+            for task in list(pending):
+                if task not in pending:
+                    continue
+                if task.future.done():
+                    outcomes[id(task)] = task.future.result()
+                    pending.remove(task)
+                    self._count(task.pool, 'dispatched')
+                elif task.timed_out(now):
+                    self._abandon(task)
+                    outcomes[id(task)] = DispatchOutcome(
+                        task.request_id, None, DispatchTimeout(task.request_id, task.timeout),
+                        now - task.started)
+                    pending.remove(task)
+                    self._count(task.pool, 'timed_out')
+                    for other in [other for other in pending if other.pool == task.pool]:
+                        if other.future.cancel():
+                            pending.remove(other)
+                            self._count(other.pool, 'deferred')
+        return [outcomes[id(task)] for task in tasks if id(task) in outcomes]
+
+    def _abandon(self, task):
+        # type: (_Task) -> None
+        """ Counts a task that timed out against its pool until it finishes. """
+        with self._lock:
+            if not task.finished:
+                task.abandoned = True
+                self._abandoned[task.pool] = self._abandoned.get(task.pool, 0) + 1
+
+    def _finish(self, task, _future):
+        # type: (_Task, Any) -> None
+        request_id = task.request_id
+        with self._lock:
+            task.finished = True
+            if task.abandoned:
+                self._abandoned[task.pool] -= 1
+            callbacks = self._in_flight.pop(request_id, [])
+        for callback in callbacks:
+            try:
+                callback(request_id)
+            except Exception as ex:
+                self.logger.error('Error finishing request {}: {}'.format(request_id, ex))
+
+    def _count(self, pool, stat):
+        # type: (str, str) -> None
+        with self._lock:
+            self._stats.setdefault(pool, dict.fromkeys(self.STATS, 0))[stat] += 1
+
+
+class _Task(object):
+    def __init__(self, pool, request_id, timeout):
+        # type: (str, str, Optional[float]) -> None
+        self.pool = pool
+        self.request_id = request_id
+        self.timeout = timeout
+        self.started = None  # type: Optional[float]
+        self.future = None
+        self.finished = False
+        self.abandoned = False
+
+    def run(self, dispatch_one, job):
+        self.started = time.time()
+        return dispatch_one(job)
+
+    def timed_out(self, now):
+        # type: (float) -> bool
+        return self.timeout is not None and self.started is not None \
+            and now - self.started > self.timeout
@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class TTLCache(object):
+    """ Thread safe in-memory cache whose entries expire after some time. When the cache is
+    full, the least recently used entry is evicted.
+
+    The entries are not pickled along with the cache, so engines holding one can still be sent to
+    worker processes.
+
+    :param float ttl: Seconds an entry remains valid after being set.
+    :param int max_size: Maximum number of entries, or ``None`` for no limit.
+    """
+
+    STATS = ('hits', 'misses', 'evictions')
+
+    def __init__(self, ttl=300, max_size=1024):
+        # type: (float, Optional[int]) -> None
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()  # type: Dict[Hashable, tuple]
+        self._stats = dict.fromkeys(self.STATS, 0)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'ttl': self.ttl, 'max_size': self.max_size}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """ (dict[str,int]) Number of hits, misses and evictions since the cache was created. """
+        with self._lock:
+            return dict(self._stats)
+
+    def get(self, key, default=None):
+        # type: (Hashable, Any) -> Any
+        """
+        :param Hashable key: Key of the entry.
+        :param default: Value returned if there is no valid entry for the key.
+        :return: The value of the entry, or ``default``.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or entry[1] <= time.time():
+                self._stats['misses'] += 1
+                return default
+            self._entries[key] = entry
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        # type: (Hashable, Any, Optional[float]) -> None
+        """
+        :param Hashable key: Key of the entry.
+        :param value: Value of the entry.
+        :param float ttl: Seconds the entry remains valid, or ``None`` to use the cache ``ttl``.
+        """
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats['evictions'] += 1
+
+    def pop(self, key, default=None):
+        # type: (Hashable, Any) -> Any
+        """ Removes an entry.
+
+        :param Hashable key: Key of the entry.
+        :param default: Value returned if there is no valid entry for the key.
+        :return: The value of the removed entry, or ``default``.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return entry[0] if entry is not None and entry[1] > time.time() else default
+
+    def clear(self):
+        # type: () -> None
+        """ Removes all entries. """
+        with self._lock:
+            self._entries.clear()
+
+
+class TierConfigCache(object):
+    """ Cache of the approved tier configurations looked up by
+    :py:meth:`connect.models.TierConfig.get`, keyed by account and product. Configurations not
+    found are cached too.
+
+    It is used once assigned to ``TierConfig.cache``: ::
+
+        TierConfig.cache = TierConfigCache(ttl=600)
+
+    Then :py:class:`connect.resources.FulfillmentAutomation` prefetches the configurations of
+    all the tier accounts of every page of requests listed, with one query per product, and
+    :py:class:`connect.resources.TierConfigAutomation` invalidates the configurations it
+    approves. Cached configurations are frozen, because they are shared between threads.
+
+    :param float ttl: Seconds a configuration remains cached.
+    :param int max_size: Maximum number of configurations cached.
+    :param int chunk_size: Maximum number of accounts looked up in a single query.
+    """
+
+    def __init__(self, ttl=300, max_size=1024, chunk_size=100):
+        # type: (float, Optional[int], int) -> None
+        self.chunk_size = chunk_size
+        self._cache = TTLCache(ttl, max_size)
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """ (dict[str,int]) Number of hits, misses and evictions of the cache. """
+        return self._cache.stats
+
+    def get(self, account_id, product_id, config=None):
+        # type: (str, str, Any) -> Any
+        """
+        :param str account_id: Id of the tier account.
+        :param str product_id: Id of the product.
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        :return: The approved tier config, or ``None`` if it was not found.
+        :rtype: Optional[TierConfig]
+        """
+        # Imported here because connect.resources depends on this module
+        from connect.models.tier_config import TierConfig
+
+        tier_config = self._cache.get((account_id, product_id), _MISSING)
+        if tier_config is _MISSING:
+            tier_config = TierConfig.get_many([account_id], product_id, config).get(account_id)
+            self._store(account_id, product_id, tier_config)
+        return tier_config
+
+    def prefetch(self, account_ids, product_id, config=None):
+        # type: (Iterable[str], str, Any) -> None
+        """ Looks up the tier configs of the given accounts that are not cached, with one query
+        for every ``chunk_size`` accounts.
+
+        :param Iterable[str] account_ids: Ids of the tier accounts.
+        :param str product_id: Id of the product.
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        """
+        # Imported here because connect.resources depends on this module
+        from connect.models.tier_config import TierConfig
+
+        missing = set(account_id for account_id in account_ids
+                      if account_id and (account_id, product_id) not in self._cache)
+        if not missing:
+            return
+        found = TierConfig.get_many(missing, product_id, config, self.chunk_size)
+        for account_id in missing:
+            self._store(account_id, product_id, found.get(account_id))
+
+    def prefetch_requests(self, requests, config=None):
+        # type: (Iterable[Any], Any) -> None
+        """ Prefetches the tier configs of the tier 1 and tier 2 accounts of fulfillment
+        requests, for the product of their assets.
+
+        :param Iterable[Fulfillment] requests: Fulfillment requests.
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        """
+        accounts = OrderedDict()  # type: Dict[str, List[str]]
+        for request in requests:
+            asset = getattr(request, 'asset', None)
+            if not asset or not asset.product or not asset.tiers:
+                continue
+            for tier in (asset.tiers.tier1, asset.tiers.tier2):
+                if tier and tier.id:
+                    accounts.setdefault(asset.product.id, []).append(tier.id)
+        for product_id, account_ids in accounts.items():
+            self.prefetch(account_ids, product_id, config)
+
+    def invalidate(self, account_id, product_id):
+        # type: (str, str) -> None
+        """ Removes the tier config of an account and product, so it is looked up again. """
+        self._cache.pop((account_id, product_id))
+
+    def clear(self):
+        # type: () -> None
+        """ Removes all the tier configs. """
+        self._cache.clear()
+
+    def _store(self, account_id, product_id, tier_config):
+        if tier_config is not None:
+            tier_config.freeze()
+        self._cache.set((account_id, product_id), tier_config)
+
+
+class ProductCatalog(object):
+    """ Cache of the product data returned by the API, which changes rarely.
+
+    It is used once assigned to ``Product.cache``: ::
+
+        Product.cache = ProductCatalog(path='catalog.cache')
+        Product.cache.warm_up()
+
+    Then :py:meth:`connect.resources.Directory.list_products`,
+    :py:meth:`connect.resources.Directory.get_product`,
+    :py:meth:`connect.models.Product.get_templates`,
+    :py:meth:`connect.models.Product.get_product_configurations` and
+    :py:meth:`connect.resources.UsageAutomation.get_usage_template` take their responses from
+    the catalog. Responses are kept as returned by the API, so every call still returns new
+    models.
+
+    An entry older than ``ttl`` seconds is revalidated: it is returned as is while it is fetched
+    again in a background thread. If that fails, the entry is kept and revalidated on the next
+    call. Entries older than ``max_stale`` seconds are fetched again before returning.
+
+    :param float ttl: Seconds an entry is returned without revalidating it.
+    :param float max_stale: Seconds an entry can be returned while it is being revalidated.
+    :param int max_size: Maximum number of entries, or ``None`` for no limit. When the catalog
+        is full, the least recently used entry is evicted.
+    :param str path: Path of a file where the entries are persisted, so they survive restarts,
+        or ``None`` to keep them only in memory. They are encoded with
+        :py:mod:`connect.models.codec`, so the values returned by the ``load`` functions given
+        to :py:meth:`fetch` must be strings, bytes or other values it can encode.
+    :param float save_interval: Minimum seconds between writes of the file. Entries stored in
+        the meantime are written by the next store after the interval, or by :py:meth:`flush`.
+    """
+
+    logger = logging.getLogger('ProductCatalog.logger')
+
+    def __init__(self, ttl=3600, max_stale=86400, max_size=1024, path=None, save_interval=60):
+        # type: (float, float, Optional[int], Optional[str], float) -> None
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_size = max_size
+        self.path = path
+        self.save_interval = save_interval
+        self._entries = OrderedDict()  # type: Dict[Hashable, Tuple[Any, float]]
+        self._revalidating = set()
+        self._lock = threading.Lock()
+        # Held while writing the file, so writes happen in the same order as changes
+        self._save_lock = threading.Lock()
+        self._dirty = False
+        self._saved_at = time.time()
+        if path and os.path.exists(path):
+            try:
+                self._entries.update(self._load(path))
+            except Exception as ex:
+                self.logger.warning('Ignoring product catalog file `{}`: {}'.format(path, ex))
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def fetch(self, config, path, params=None, load=None):
+        # type: (Any, str, Optional[Dict[str, Any]], Optional[Callable[[], Any]]) -> Any
+        """
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        :param str path: Path of the data in the API, like ``products/CN-783-317-575``.
+        :param dict[str,Any] params: Filters of the request.
+        :param Callable load: Function that gets the data from the API, or ``None`` to get the
+            text of the response to a GET request to the path.
+        :return: The data, from the catalog if it is there.
+        """
+        config = self._get_config(config)
+        key = _hashable([config.api_url, path, sorted((params or {}).items())])
+        load = load or (lambda: self._get_text(config, path, params))
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.time() - entry[1] if entry else None
+            if entry and age < self.max_stale:
+                self._entries[key] = self._entries.pop(key)
+                if age >= self.ttl and key not in self._revalidating:
+                    self._revalidating.add(key)
+                    thread = threading.Thread(target=self._revalidate, args=(key, load))
+                    thread.daemon = True
+                    thread.start()
+                return entry[0]
+        value = load()
+        self._store(key, value)
+        return value
+
+    def warm_up(self, config=None):
+        # type: (Any) -> None
+        """ Fetches the list of products and, for every product in ``Config.products``, the
+        product, its templates and its configuration parameters, and then writes the file.
+
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        """
+        config = self._get_config(config)
+        paths = ['products']
+        for product_id in config.products or []:
+            paths.extend(['products/' + product_id, 'products/' + product_id + '/templates',
+                          'products/' + product_id + '/configurations'])
+        for path in paths:
+            try:
+                self.fetch(config, path)
+            except Exception as ex:
+                self.logger.warning('Could not warm up `{}`: {}'.format(path, ex))
+        self.flush()
+
+    def invalidate(self, product_id=None):
+        # type: (Optional[str]) -> None
+        """ Removes the entries of a product, and the list of products.
+
+        :param str product_id: Id of the product, or ``None`` to remove all the entries.
+        """
+        with self._lock:
+            for key in list(self._entries):
+                if product_id is None or key[1] == 'products' \
+                        or product_id in key[1].split('/'):
+                    del self._entries[key]
+            self._dirty = True
+        self.flush()
+
+    def clear(self):
+        # type: () -> None
+        """ Removes all the entries. """
+        self.invalidate()
+
+    def flush(self):
+        # type: () -> None
+        """ Writes the entries stored since the last write to the file, if any. """
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                self._dirty = False
+                self._saved_at = time.time()
+                entries = list(self._entries.items())
+            self._save(entries)
+
+    def _revalidate(self, key, load):
+        try:
+            self._store(key, load())
+        except Exception as ex:
+            self.logger.warning('Could not revalidate `{}`: {}'.format(key[1], ex))
+        finally:
+            with self._lock:
+                self._revalidating.discard(key)
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.time())
+            while self.max_size is not None and len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._dirty = True
+            due = time.time() - self._saved_at >= self.save_interval
+        if due:
+            self.flush()
+
+    def _save(self, entries):
+        if not self.path:
+            return
+        # Imported here because connect.models imports this module through connect.resources
+        from connect.models import codec
+        data = codec.dumps([[key, value, stored_at] for key, (value, stored_at) in entries])
+        temp_path = '{}.{}.tmp'.format(self.path, threading.current_thread().ident)
+        with open(temp_path, 'wb') as fp:
+            fp.write(data)
+        os.rename(temp_path, self.path)
+
+    @staticmethod
+    def _load(path):
+        # type: (str) -> List[Tuple[Hashable, Tuple[Any, float]]]
+        from connect.models import codec
+        with open(path, 'rb') as fp:
+            entries = codec.loads(fp.read())
+        return [(_hashable(key), (value, stored_at)) for key, value, stored_at in entries]
+
+    @staticmethod
+    def _get_config(config):
+        from connect.config import Config
+        return config or Config.get_instance()
+
+    @staticmethod
+    def _get_text(config, path, params):
+        # Imported here because connect.resources depends on this module
+        from connect.resources.base import ApiClient
+        client = ApiClient(config, path)
+        return (client.get(params=params) if params else client.get())[0]
+
+
+_MISSING = object()
+
+
+def _hashable(value):
+    # type: (Any) -> Hashable
+    """ Converts the lists and dicts in a value, like the filters of a request, into tuples. """
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(elem) for elem in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _hashable(elem)) for key, elem in value.items()))
+    return value
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class ConversationWriter(object):
+    """ Adds conversation messages in background threads, so dispatching a request does not wait
+    for them. Install it as the ``conversation_sink`` of a
+    :py:class:`connect.resources.FulfillmentAutomation` engine::
+
+        writer = ConversationWriter(engine)
+        engine.conversation_sink = writer.write
+        try:
+            engine.process()
+        finally:
+            writer.close()
+
+    Messages of the same request are added in order, by one thread at a time. A message equal
+    to the previous one of the same request is discarded if that one has not been added yet.
+    Messages that fail are retried, and dropped (with an error logged) once ``max_retries`` is
+    reached.
+
+    Messages still waiting when the process exits are lost, so call :py:meth:`close` (or
+    :py:meth:`flush`) before exiting. Pickled writers do not keep their waiting messages.
+
+    :param FulfillmentAutomation engine: Engine used to add the messages.
+    :param int workers: Maximum number of messages added concurrently.
+    :param int max_retries: Number of times a failed message is retried.
+    :param float retry_delay: Seconds to wait before retrying a failed message. It doubles after
+        every retry.
+    """
+
+    STATS = ('written', 'coalesced', 'retried', 'failed')
+
+    logger = logging.getLogger('ConversationWriter.logger')
+
+    def __init__(self, engine, workers=2, max_retries=3, retry_delay=1.0):
+        # type: (Any, int, int, float) -> None
+        if workers < 1:
+            raise ValueError('Conversation writers need at least one worker')
+        self.engine = engine
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._pending = OrderedDict()  # type: Dict[str, tuple]
+        self._active = {}  # type: Dict[str, str]
+        self._threads = []  # type: List[threading.Thread]
+        self._closed = False
+        self._stats = dict.fromkeys(self.STATS, 0)
+        self._cond = threading.Condition()
+
+    def __getstate__(self):
+        return {'engine': self.engine, 'workers': self.workers,
+                'max_retries': self.max_retries, 'retry_delay': self.retry_delay}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """ (dict[str,int]) Number of messages written, coalesced with a previous one, retried
+        and failed. """
+        with self._cond:
+            return dict(self._stats)
+
+    def write(self, request, message):
+        # type: (Any, str) -> None
+        """ Queues a message for the conversation of a request.
+
+        :param Fulfillment request: Request the message refers to.
+        :param str message: Text of the message.
+        :raises RuntimeError: Raised if the writer is closed.
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('Cannot write messages after closing the writer')
+            _, messages = self._pending.setdefault(request.id, (request, []))
+            # The last message of the request may be being written right now
+            if message == (messages[-1] if messages else self._active.get(request.id)):
+                self._stats['coalesced'] += 1
+                return
+            messages.append(message)
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name='ConversationWriter-{}'
+                                          .format(len(self._threads)))
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+            self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        # type: (Optional[float]) -> bool
+        """ Waits until all queued messages have been written or dropped.
+
+        :param float timeout: Maximum seconds to wait, or ``None`` to wait until finished.
+        :return: Whether all messages were written or dropped.
+        :rtype: bool
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while self._pending or self._active:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout=None):
+        # type: (Optional[float]) -> bool
+        """ Flushes the queued messages and stops the worker threads.
+
+        :param float timeout: Maximum seconds to wait, or ``None`` to wait until finished.
+        :return: Whether all messages were written or dropped.
+        :rtype: bool
+        """
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if flushed:
+            for thread in self._threads:
+                thread.join()
+        return flushed
+
+    def _work(self):
+        while True:
+            with self._cond:
+                request_id = self._next_request()
+                while request_id is None:
+                    if self._closed:
+                        return
+                    self._cond.wait()
+                    request_id = self._next_request()
+                request, messages = self._pending.pop(request_id)
+                self._active[request_id] = messages[-1]
+            try:
+                for message in messages:
+                    self._write(request, message)
+            finally:
+                with self._cond:
+                    del self._active[request_id]
+                    self._cond.notify_all()
+
+    def _next_request(self):
+        # type: () -> Optional[str]
+        for request_id in self._pending:
+            if request_id not in self._active:
+                return request_id
+        return None
+
+    def _write(self, request, message):
+        # type: (Any, str) -> None
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.engine._add_conversation_message(request, message)
+                self._count('written')
+                return
+            except Exception as ex:
+                if attempt == self.max_retries:
+                    self._count('failed')
+                    self.logger.error('Error updating conversation for request {}: {}'
+                                      .format(request.id, ex))
+                    return
+                self._count('retried')
+                self.logger.warning('Error updating conversation for request {}, retrying '
+                                    'in {} seconds: {}'.format(request.id, delay, ex))
+                time.sleep(delay)
+                delay *= 2
+
+    def _count(self, stat):
+        # type: (str) -> None
+        with self._cond:
+            self._stats[stat] += 1
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import argparse
+import importlib
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
+
+from connect.bulkhead import Bulkhead, Bulkheads
+from connect.cache import ProductCatalog
+from connect.config import Config
+from connect.conversations import ConversationWriter
+from connect.journal import Journal
+from connect.leases import LeaseManager, SQLiteLeaseStore
+from connect.models.product import Product
+from connect.resources.automation_engine import AutomationEngine
+from connect.scheduler import Scheduler
+from connect.sharding import FileMembership, Shard
+from connect.watermark import Watermark
+
+
+class Daemon(object):
+    """ Runs an automation engine in a loop, polling Connect for new requests.
+
+    The interval between polls adapts to the length of the queue:
+
+    - If the last poll listed a full page of requests (as many as the ``limit`` of the
+      engine), there are more waiting, so the next poll is done right away. Requests that were
+      listed but not dispatched (for example, because another replica handles them) count too.
+    - If it listed some requests, the next poll is done after ``min_interval`` seconds.
+    - If it listed none (or failed), the interval is multiplied by ``backoff``, up to
+      ``max_interval`` seconds.
+
+    A random jitter of up to ``jitter`` times the interval is added or subtracted to every wait,
+    so replicas started at the same time do not poll in sync.
+
+    If a ``journal`` is passed in ``process_kwargs`` and ``journal_retention`` is given, the
+    entries of the journal that were not updated for that many seconds are deleted after every
+    poll, at most once per ``journal_retention / 10`` seconds.
+
+    When the process receives SIGTERM or SIGINT, the daemon finishes dispatching the requests
+    of the current poll and then stops. If a ``shard`` is passed in ``process_kwargs``, the
+    replica leaves it when stopping, so the remaining replicas take over its requests.
+
+    :param AutomationEngine engine: Engine used to process requests.
+    :param float min_interval: Seconds to wait between polls while there are requests.
+    :param float max_interval: Maximum seconds to wait between polls when the queue is empty.
+    :param float backoff: Factor applied to the interval after every empty poll.
+    :param float jitter: Fraction of the interval used as random jitter.
+    :param dict[str,Any] filters: Filters for listing the requests, or ``None`` to use the
+        default ones of the engine.
+    :param dict[str,Any] process_kwargs: Additional arguments passed to
+        :py:meth:`AutomationEngine.process` (like ``max_workers``).
+    :param float journal_retention: Seconds journal entries are kept after their last update,
+        or ``None`` to keep them forever.
+    """
+
+    logger = logging.getLogger('Daemon.logger')
+
+    def __init__(self, engine, min_interval=1.0, max_interval=300.0, backoff=2.0, jitter=0.1,
+                 filters=None, process_kwargs=None, journal_retention=None):
+        # type: (AutomationEngine, float, float, float, float, dict, dict, Optional[float]) -> None
+        if min_interval <= 0 or max_interval < min_interval:
+            raise ValueError('Intervals must satisfy 0 < min_interval <= max_interval')
+        if backoff < 1:
+            raise ValueError('Backoff must be at least 1')
+        if not 0 <= jitter < 1:
+            raise ValueError('Jitter must be in range [0, 1)')
+        if journal_retention is not None and journal_retention <= 0:
+            raise ValueError('Journal retention must be positive')
+        self.engine = engine
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.filters = filters
+        self.process_kwargs = process_kwargs or {}
+        self.journal_retention = journal_retention
+        self._interval = min_interval
+        self._pruned = 0.0
+        self._stopped = threading.Event()
+
+    @property
+    def stopped(self):
+        # type: () -> bool
+        return self._stopped.is_set()
+
+    def run(self, handle_signals=True):
+        """ Polls and processes requests until :py:meth:`stop` is called.
+
+        :param bool handle_signals: Whether to stop gracefully on SIGTERM and SIGINT. Signal
+            handlers can only be installed from the main thread.
+        """
+        previous = {}
+        if handle_signals:
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                previous[signum] = signal.signal(signum, self._handle_signal)
+        self.logger.info('Starting daemon for {}'.format(self.engine.__class__.__name__))
+        try:
+            while not self.stopped:
+                wait = self.next_interval(self.poll())
+                if wait > 0:
+                    self.logger.debug('Next poll in {:.2f} seconds'.format(wait))
+                    self._stopped.wait(wait)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+            if self.process_kwargs.get('shard'):
+                self.process_kwargs['shard'].leave()
+            metrics = getattr(self.engine, 'metrics', None)
+            if metrics:
+                self.logger.info('Dispatch times:\n{}'.format(metrics.report()))
+        self.logger.info('Daemon stopped')
+
+    def poll(self):
+        # type: () -> Optional[int]
+        """ Processes the pending requests once.
+
+        :return: The number of requests that were listed (see
+            :py:attr:`AutomationEngine.last_listed`), or ``None`` if listing or dispatching them
+            raised an exception.
+        :rtype: Optional[int]
+        """
+        try:
+            self.engine.process(self.filters, **self.process_kwargs)
+        except Exception as ex:
+            self.logger.exception('Error processing requests: {}'.format(ex))
+            return None
+        finally:
+            self._prune_journal()
+        return self.engine.last_listed
+
+    def next_interval(self, count):
+        # type: (Optional[int]) -> float
+        """ Updates the poll interval with the number of requests listed in the last poll.
+
+        :param Optional[int] count: Value returned by :py:meth:`poll`.
+        :return: Seconds to wait before the next poll, including jitter.
+        :rtype: float
+        """
+        if count and self.engine.limit and count >= self.engine.limit:
+            self._interval = self.min_interval
+            return 0.0
+        elif count:
+            self._interval = self.min_interval
+        else:
+            self._interval = min(self._interval * self.backoff, self.max_interval)
+        return self._interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def stop(self):
+        """ Stops the daemon once the requests being dispatched are finished. """
+        self._stopped.set()
+
+    def _prune_journal(self):
+        journal = self.process_kwargs.get('journal')
+        if not journal or not self.journal_retention \
+                or time.time() - self._pruned < self.journal_retention / 10:
+            return
+        self._pruned = time.time()
+        try:
+            pruned = journal.prune(self.journal_retention)
+        except Exception as ex:
+            self.logger.error('Error pruning the journal: {}'.format(ex))
+            return
+        if pruned:
+            self.logger.info('Pruned {} journal entries'.format(pruned))
+
+    def _handle_signal(self, signum, _frame):
+        self.logger.info('Received signal {}, finishing current requests'.format(signum))
+        self.stop()
+
+
+def load_engine(path, config=None):
+    # type: (str, Optional[Config]) -> AutomationEngine
+    """ Instantiates an automation engine from its path.
+
+    :param str path: Path of the engine class, like ``'package.module:ClassName'``.
+    :param Config config: Config object or ``None`` to use environment config.
+    :return: The engine.
+    :rtype: AutomationEngine
+    :raises ValueError: Raised if the path is invalid.
+    :raises TypeError: Raised if the class is not an automation engine.
+    """
+    module_name, _, class_name = path.partition(':')
+    if not module_name or not class_name:
+        raise ValueError('Engine path must have the form `package.module:ClassName`, got `{}`'
+                         .format(path))
+    cls = getattr(importlib.import_module(module_name), class_name)
+    if not isinstance(cls, type) or not issubclass(cls, AutomationEngine):
+        raise TypeError('`{}` is not a subclass of AutomationEngine'.format(path))
+    return cls(config)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    """ Entry point of the ``connect-daemon`` command. """
+    parser = argparse.ArgumentParser(
+        prog='connect-daemon',
+        description='Continuously process Connect requests with an automation engine.')
+    parser.add_argument('engine', help='engine class, like `package.module:ClassName`')
+    parser.add_argument('--config', help='config file (default: config.json)')
+    parser.add_argument('--min-interval', type=float, default=1.0,
+                        help='seconds between polls while there are requests (default: 1)')
+    parser.add_argument('--max-interval', type=float, default=300.0,
+                        help='maximum seconds between polls (default: 300)')
+    parser.add_argument('--backoff', type=float, default=2.0,
+                        help='interval factor after every empty poll (default: 2)')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                        help='fraction of the interval used as jitter (default: 0.1)')
+    parser.add_argument('--max-workers', type=int,
+                        help='number of requests dispatched concurrently')
+    parser.add_argument('--processes', type=int,
+                        help='number of worker processes running process_request')
+    parser.add_argument('--bulkhead-workers', type=int,
+                        help='dispatch each product on its own pool with this many workers')
+    parser.add_argument('--bulkhead-timeout', type=float,
+                        help='seconds a request may take on a product pool')
+    parser.add_argument('--shard-dir',
+                        help='directory shared by all replicas, enables sharding')
+    parser.add_argument('--shard-key', default='id',
+                        help='request attribute used to split work among replicas (default: id)')
+    parser.add_argument('--member',
+                        help='id of this replica (default: hostname and process id)')
+    parser.add_argument('--lease-db',
+                        help='SQLite database shared by all workers, enables leasing requests')
+    parser.add_argument('--journal',
+                        help='SQLite database where the outcome of requests is journaled')
+    parser.add_argument('--journal-retention', type=float, default=7 * 86400.0,
+                        help='seconds journal entries are kept after their last update '
+                             '(default: 604800, one week)')
+    parser.add_argument('--fair-share', action='store_true',
+                        help='order requests by urgency with fair share among products and '
+                             'marketplaces')
+    parser.add_argument('--watermark',
+                        help='file where the watermark is kept, enables listing only the '
+                             'requests updated since the previous poll')
+    parser.add_argument('--sweep-interval', type=float, default=3600.0,
+                        help='seconds between polls listing all requests when using a '
+                             'watermark (default: 3600)')
+    parser.add_argument('--conversation-workers', type=int,
+                        help='add conversation messages in the background with this many '
+                             'threads')
+    parser.add_argument('--product-catalog', nargs='?', const='',
+                        help='cache product data, warmed up at startup for the products of the '
+                             'config, in the given file (or only in memory if no file is given)')
+    parser.add_argument('--product-catalog-ttl', type=float, default=3600.0,
+                        help='seconds before cached product data is revalidated (default: 3600)')
+    args = parser.parse_args(argv)
+
+    config = Config(file=args.config) if args.config else None
+    process_kwargs = {key: value
+                      for key, value in (('max_workers', args.max_workers),
+                                         ('processes', args.processes))
+                      if value}
+    if args.shard_dir:
+        # Replicas only send heartbeats when polling, so they must outlive the longest wait
+        membership = FileMembership(args.shard_dir, ttl=3 * args.max_interval)
+        member = args.member or '{}-{}'.format(socket.gethostname(), os.getpid())
+        process_kwargs['shard'] = Shard(member, membership, key=args.shard_key)
+    if args.lease_db:
+        process_kwargs['leases'] = LeaseManager(SQLiteLeaseStore(args.lease_db))
+    if args.bulkhead_workers:
+        process_kwargs['bulkheads'] = Bulkheads(
+            Bulkhead(args.bulkhead_workers, timeout=args.bulkhead_timeout))
+    if args.fair_share:
+        process_kwargs['scheduler'] = Scheduler()
+    if args.journal:
+        process_kwargs['journal'] = Journal(args.journal)
+    if args.watermark:
+        process_kwargs['watermark'] = Watermark(args.watermark, args.sweep_interval)
+    engine = load_engine(args.engine, config)
+    catalog = None
+    if args.product_catalog is not None:
+        catalog = ProductCatalog(ttl=args.product_catalog_ttl, path=args.product_catalog or None)
+        catalog.warm_up(engine.config)
+        Product.cache = catalog
+    writer = None
+    if args.conversation_workers and hasattr(engine, 'conversation_sink'):
+        writer = ConversationWriter(engine, workers=args.conversation_workers)
+        engine.conversation_sink = writer.write
+    try:
+        Daemon(engine,
+               min_interval=args.min_interval,
+               max_interval=args.max_interval,
+               backoff=args.backoff,
+               jitter=args.jitter,
+               process_kwargs=process_kwargs,
+               journal_retention=args.journal_retention).run()
+    finally:
+        if writer:
+            writer.close()
+        if catalog is not None:
+            catalog.flush()
+        if 'bulkheads' in process_kwargs:
+            process_kwargs['bulkheads'].close()
+        engine.close_pool()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+""" Side data that ``process_request`` needs for every request, fetched once for a whole page
+of requests instead of once per request.
+
+An automation engine lists the data it needs in its ``enrichments``: ::
+
+    class ProductFulfillment(FulfillmentAutomation):
+        enrichments = (TierConfigs(), ProductTemplates())
+
+        def process_request(self, request):
+            tier1_config = request.enrichment['tier_configs']['tier1']
+            templates = request.enrichment['templates']
+            ...
+
+Before dispatching a page of requests, the engine collects the keys that every enrichment needs
+for all the requests of the page (like the ids of their tier accounts), fetches each kind of
+data with bulk queries or parallel calls (and the different kinds in parallel too), and attaches
+the results to every request in the read-only ``enrichment`` dict, under the name of each
+enrichment. If fetching some kind of data fails, the error is logged and ``None`` is attached
+instead.
+
+The enrichment is not part of the JSON representation of the request, nor of its encoding with
+:py:mod:`connect.models.codec`. When requests are processed on a pool of worker processes, it is
+sent along with every request, or fetched again in the worker if it cannot be encoded.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Sequence
+
+from connect.models.base import _FrozenDict
+from connect.models.fulfillment import Fulfillment
+from connect.models.product import Product
+from connect.models.tier_config import TierConfig
+from connect.sharding import get_attribute
+
+
+class Enrichment(object):
+    """ Base class of the kinds of side data. Subclasses implement :py:meth:`keys`, and either
+    :py:meth:`fetch` to get the data for all the keys of a page at once, or :py:meth:`fetch_one`
+    to get it for every key in parallel.
+
+    :param str name: Key of the data in ``request.enrichment``, or ``None`` to use the default
+        name of the class.
+    :param int max_workers: Number of keys fetched in parallel by the default :py:meth:`fetch`.
+    """
+
+    name = None  # type: str
+
+    def __init__(self, name=None, max_workers=4):
+        # type: (Optional[str], int) -> None
+        if name:
+            self.name = name
+        self.max_workers = max_workers
+
+    def keys(self, engine, request):
+        # type: (Any, Any) -> List[Hashable]
+        """
+        :param AutomationEngine engine: Engine dispatching the request.
+        :param request: Request of the page.
+        :return: Keys of the data the request needs.
+        :rtype: list[Hashable]
+        """
+        raise NotImplementedError('Please implement `{}.keys` method'
+                                  .format(self.__class__.__name__))
+
+    def fetch(self, engine, keys):
+        # type: (Any, List[Hashable]) -> Dict[Hashable, Any]
+        """
+        :param AutomationEngine engine: Engine dispatching the requests.
+        :param list[Hashable] keys: Keys needed by all the requests of the page, without
+            repetitions.
+        :return: The data found for the keys.
+        :rtype: dict[Hashable,Any]
+        """
+        if len(keys) == 1 or self.max_workers <= 1:
+            return {key: self.fetch_one(engine, key) for key in keys}
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(min(self.max_workers, len(keys))) as executor:
+            return dict(zip(keys, executor.map(lambda key: self.fetch_one(engine, key), keys)))
+
+    def fetch_one(self, engine, key):
+        # type: (Any, Hashable) -> Any
+        """
+        :param AutomationEngine engine: Engine dispatching the requests.
+        :param Hashable key: Key of the data.
+        :return: The data for the key.
+        """
+        raise NotImplementedError('Please implement `{}.fetch_one` method'
+                                  .format(self.__class__.__name__))
+
+    def value(self, request, keys, values):
+        # type: (Any, List[Hashable], Dict[Hashable, Any]) -> Any
+        """
+        :param request: Request of the page.
+        :param list[Hashable] keys: Keys returned by :py:meth:`keys` for the request.
+        :param dict[Hashable,Any] values: Data fetched for the whole page.
+        :return: The data attached to the request. By default, the data of its first key, or
+            ``None`` if there is none.
+        """
+        return values.get(keys[0]) if keys else None
+
+
+class TierConfigs(Enrichment):
+    """ Approved tier configs of the tier 1 and tier 2 accounts of fulfillment requests, as a
+    dict with the keys ``tier1`` and ``tier2`` (``None`` if the request has no such account or
+    it has no approved config). They are looked up with one query per product, or taken from
+    ``TierConfig.cache`` if it is set (see :py:class:`connect.cache.TierConfigCache`).
+    """
+
+    name = 'tier_configs'
+
+    def keys(self, engine, request):
+        return [(account_id, product_id)
+                for _, account_id, product_id in self._tiers(request)
+                if account_id and product_id]
+
+    def fetch(self, engine, keys):
+        accounts = OrderedDict()  # type: Dict[str, List[str]]
+        for account_id, product_id in keys:
+            accounts.setdefault(product_id, []).append(account_id)
+        values = {}
+        for product_id, account_ids in accounts.items():
+            if TierConfig.cache is not None:
+                TierConfig.cache.prefetch(account_ids, product_id, engine.config)
+                found = {account_id: TierConfig.cache.get(account_id, product_id, engine.config)
+                         for account_id in account_ids}
+            else:
+                found = TierConfig.get_many(account_ids, product_id, engine.config)
+            values.update(((account_id, product_id), found.get(account_id))
+                          for account_id in account_ids)
+        return values
+
+    def value(self, request, keys, values):
+        return {level: values.get((account_id, product_id))
+                for level, account_id, product_id in self._tiers(request)}
+
+    @staticmethod
+    def _tiers(request):
+        asset = getattr(request, 'asset', None)
+        tiers = asset.tiers if asset else None
+        product_id = asset.product.id if asset and asset.product else None
+        return [(level, tier.id if tier else None, product_id)
+                for level, tier in (('tier1', tiers and tiers.tier1),
+                                    ('tier2', tiers and tiers.tier2))]
+
+
+class ProductTemplates(Enrichment):
+    """ Templates of the product of every request, as a list of
+    :py:class:`connect.models.Template`. """
+
+    name = 'templates'
+
+    def keys(self, engine, request):
+        return [_product_id(engine, request)]
+
+    def fetch_one(self, engine, key):
+        return Product(id=key).get_templates(engine.config) if key else None
+
+
+class ProductConfigurations(Enrichment):
+    """ Configuration parameters of the product of every request, as a list of
+    :py:class:`connect.models.ProductConfigurationParameter`.
+
+    :param dict[str,Any] filters: Filters for the parameters, see
+        :py:meth:`connect.models.Product.get_product_configurations`.
+    """
+
+    name = 'product_configurations'
+
+    def __init__(self, filters=None, **kwargs):
+        # type: (Optional[Dict[str, Any]], Any) -> None
+        super(ProductConfigurations, self).__init__(**kwargs)
+        self.filters = filters
+
+    def keys(self, engine, request):
+        return [_product_id(engine, request)]
+
+    def fetch_one(self, engine, key):
+        return Product(id=key).get_product_configurations(self.filters, engine.config) \
+            if key else None
+
+
+class Conversations(Enrichment):
+    """ Conversation of every request, as a :py:class:`connect.models.Conversation`, or
+    ``None`` if it has none. :py:class:`connect.resources.FulfillmentAutomation` also uses it to
+    add messages to the conversation without looking it up again.
+    """
+
+    name = 'conversation'
+
+    def keys(self, engine, request):
+        return [request.id]
+
+    def fetch(self, engine, keys):
+        values = super(Conversations, self).fetch(engine, keys)
+        remember = getattr(engine, '_remember_conversation', None)
+        if remember:
+            for request_id, conversation in values.items():
+                remember(request_id, conversation)
+        return values
+
+    def fetch_one(self, engine, key):
+        return Fulfillment(id=key).get_conversation(engine.config)
+
+
+def enrich(engine, requests, enrichments):
+    # type: (Any, Iterable[Any], Sequence[Enrichment]) -> None
+    """ Fetches the data of the enrichments for a page of requests, and attaches it to them.
+    Every enrichment is timed as the ``enrich_<name>`` stage of the engine metrics.
+
+    :param AutomationEngine engine: Engine dispatching the requests.
+    :param Iterable requests: Requests of the page.
+    :param Sequence[Enrichment] enrichments: Data to attach.
+    """
+    requests = list(requests)
+    filled = [{} for _ in requests]
+    try:
+        if requests and enrichments:
+            _fill(engine, requests, enrichments, filled)
+    finally:
+        for request, enrichment in zip(requests, filled):
+            # Set on the dict of the request, so it is attached to frozen requests too
+            request.__dict__['_enrichment'] = _FrozenDict(enrichment)
+
+
+def _fill(engine, requests, enrichments, filled):
+    # type: (Any, List[Any], Sequence[Enrichment], List[Dict[str, Any]]) -> None
+
+    def run(enrichment):
+        with engine.metrics.time('enrich_' + enrichment.name):
+            keys = [list(enrichment.keys(engine, request)) for request in requests]
+            unique = list(OrderedDict.fromkeys(key for request_keys in keys
+                                               for key in request_keys if key is not None))
+            try:
+                values = enrichment.fetch(engine, unique) if unique else {}
+            except Exception as ex:
+                engine.logger.warning('Could not fetch `{}` for {} requests: {}'
+                                      .format(enrichment.name, len(requests), ex))
+                values = {}
+        for request, request_keys, enrichment_values in zip(requests, keys, filled):
+            enrichment_values[enrichment.name] = enrichment.value(request, request_keys, values)
+
+    if len(enrichments) == 1:
+        run(enrichments[0])
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(len(enrichments)) as executor:
+            list(executor.map(run, enrichments))
+
+
+def _product_id(engine, request):
+    # type: (Any, Any) -> Optional[str]
+    path = engine.attribute_paths.get('product')
+    return get_attribute(request, path) if path else None
@@ -42,6 +42,18 @@ class Message(Exception):
         """
         return str(self)
 
+    def __reduce__(self):
+        # Subclasses take different arguments in their constructors, so rebuild them without
+        # calling it. This allows passing exceptions between processes
+        return _rebuild_message, (self.__class__, self.args, self.__dict__)
+
+
+def _rebuild_message(cls, args, state):
+    message = cls.__new__(cls)
+    Exception.__init__(message, *args)
+    message.__dict__.update(state)
+    return message
+
 
 class FailRequest(Message):
     """ Causes the request being processed to fail.
@@ -71,10 +83,13 @@ class SkipRequest(Message):
     """ Causes the request being processed to be skipped.
 
     :param str message: Exception message.
+    :param float retry_after: Seconds during which the request is not processed again, as long as
+        it is not updated, or ``None`` to use the ``skip_ttl`` of the engine.
     """
 
-    def __init__(self, message=''):
+    def __init__(self, message='', retry_after=None):
         super(SkipRequest, self).__init__(message or 'Request skipped', 'skip')
+        self.retry_after = retry_after
 
 
 class ServerError(Exception):
@@ -87,6 +102,24 @@ class ServerError(Exception):
         super(ServerError, self).__init__(str(error), error.error_code)
 
 
+class DispatchTimeout(Exception):
+    """ Indicates that dispatching a request took longer than allowed, so its outcome was not
+    awaited. The request may still be being dispatched in the background.
+
+    :param str request_id: Id of the request.
+    :param float timeout: Seconds allowed.
+    """
+
+    def __init__(self, request_id, timeout):
+        super(DispatchTimeout, self).__init__(
+            'Dispatching request {} took more than {} seconds'.format(request_id, timeout))
+        self.request_id = request_id
+        self.timeout = timeout
+
+    def __reduce__(self):
+        return DispatchTimeout, (self.request_id, self.timeout)
+
+
 class UsageFileAction(Message):
     """ Base exception for Usage API actions.
 
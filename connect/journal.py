@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from contextlib import closing
+import pickle
+import sqlite3
+import time
+from typing import Any, List, Optional, Tuple
+
+from connect.exceptions import Message, SkipRequest
+
+
+class Journal(object):
+    """ Write-ahead journal of the outcome of ``process_request`` for every request, kept in an
+    SQLite database in WAL mode.
+
+    When passed to :py:meth:`connect.resources.automation_engine.AutomationEngine.process`,
+    the value returned (or the exception raised) by ``process_request`` is written to the
+    journal before the request is approved, inquired or failed. If the process crashes before
+    that action reaches Connect, the request is still pending when the engine restarts, and its
+    journaled outcome is replayed instead of calling ``process_request`` again.
+
+    Once ``dispatch`` returns a result for a request, its entry is marked as done and is never
+    replayed, so a request that goes back to pending (like an inquired request that has been
+    completed by the customer) is processed again.
+
+    Only outcomes that lead to an action are journaled: results, and exceptions like
+    :py:class:`connect.exceptions.InquireRequest` or :py:class:`connect.exceptions.FailRequest`.
+    Skipped requests and unexpected errors are processed again on the next run.
+
+    :param str path: Path of the database file. It is created if it does not exist.
+    :param float timeout: Seconds to wait for other processes to unlock the database.
+    """
+
+    PENDING = 'pending'
+    DONE = 'done'
+
+    def __init__(self, path, timeout=30.0):
+        # type: (str, float) -> None
+        self._path = path
+        self._timeout = timeout
+        with closing(self._connect()) as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('CREATE TABLE IF NOT EXISTS journal ('
+                               'request_id TEXT PRIMARY KEY, state TEXT NOT NULL, '
+                               'outcome BLOB NOT NULL, updated REAL NOT NULL)')
+
+    @staticmethod
+    def should_record(result, error):
+        # type: (Any, Optional[Exception]) -> bool
+        """
+        :param result: Value returned by ``process_request``.
+        :param Exception error: Exception raised by ``process_request``.
+        :return: Whether the outcome leads to an action, and must be journaled.
+        :rtype: bool
+        """
+        if error is not None:
+            return isinstance(error, Message) and not isinstance(error, SkipRequest)
+        return bool(result)
+
+    def get(self, request_id):
+        # type: (str) -> Optional[Tuple[Any, Optional[Exception]]]
+        """
+        :param str request_id: Id of the request.
+        :return: The journaled ``(result, error)`` outcome of a request whose action is still
+            pending, or ``None``.
+        :rtype: Optional[tuple]
+        """
+        with closing(self._connect()) as connection:
+            row = connection.execute(
+                'SELECT outcome FROM journal WHERE request_id = ? AND state = ?',
+                (request_id, self.PENDING)).fetchone()
+        return pickle.loads(bytes(row[0])) if row else None
+
+    def record(self, request_id, result, error):
+        # type: (str, Any, Optional[Exception]) -> None
+        """ Journals the outcome of a request, with its action pending. """
+        outcome = sqlite3.Binary(pickle.dumps((result, error), 2))
+        with closing(self._connect()) as connection:
+            connection.execute(
+                'INSERT OR REPLACE INTO journal (request_id, state, outcome, updated) '
+                'VALUES (?, ?, ?, ?)',
+                (request_id, self.PENDING, outcome, time.time()))
+
+    def complete(self, request_id):
+        # type: (str) -> None
+        """ Marks the action of a request as done. """
+        with closing(self._connect()) as connection:
+            connection.execute(
+                'UPDATE journal SET state = ?, updated = ? WHERE request_id = ?',
+                (self.DONE, time.time(), request_id))
+
+    def pending(self):
+        # type: () -> List[str]
+        """
+        :return: Ids of the requests whose action is pending.
+        :rtype: list[str]
+        """
+        with closing(self._connect()) as connection:
+            return [row[0] for row in connection.execute(
+                'SELECT request_id FROM journal WHERE state = ? ORDER BY updated',
+                (self.PENDING,))]
+
+    def prune(self, max_age):
+        # type: (float) -> int
+        """ Deletes entries that have not been updated for ``max_age`` seconds.
+
+        :param float max_age: Age in seconds.
+        :return: The number of deleted entries.
+        :rtype: int
+        """
+        with closing(self._connect()) as connection:
+            return connection.execute('DELETE FROM journal WHERE updated < ?',
+                                      (time.time() - max_age,)).rowcount
+
+    def _connect(self):
+        # type: () -> sqlite3.Connection
+        return sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from contextlib import closing
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, Optional
+
+
+class LeaseStore(object):
+    """ Interface of lease stores. A lease gives one owner exclusive rights over a key until it
+    expires, unless it is renewed before.
+
+    Implementations must perform every operation atomically, even when the store is shared by
+    several processes or hosts. A networked store (like Redis or etcd) can be plugged in by
+    implementing these three methods; :py:class:`MemoryLeaseStore` can stand in for it in tests.
+    """
+
+    def acquire(self, key, owner, ttl):
+        # type: (str, str, float) -> bool
+        """ Acquires the lease of a key if it is free, expired, or already held by ``owner``.
+
+        :param str key: Key to lease.
+        :param str owner: Id of the owner.
+        :param float ttl: Seconds until the lease expires.
+        :return: Whether ``owner`` holds the lease now.
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def renew(self, key, owner, ttl):
+        # type: (str, str, float) -> bool
+        """ Extends a lease held by ``owner``.
+
+        :param str key: Leased key.
+        :param str owner: Id of the owner.
+        :param float ttl: Seconds from now until the lease expires.
+        :return: Whether the lease was still held by ``owner``.
+        :rtype: bool
+        """
+        raise NotImplementedError()
+
+    def release(self, key, owner):
+        # type: (str, str) -> None
+        """ Releases a lease if it is held by ``owner``.
+
+        :param str key: Leased key.
+        :param str owner: Id of the owner.
+        """
+        raise NotImplementedError()
+
+
+class MemoryLeaseStore(LeaseStore):
+    """ Lease store shared by the threads of a process. """
+
+    def __init__(self):
+        self._leases = {}  # type: Dict[str, tuple]
+        self._lock = threading.Lock()
+
+    def acquire(self, key, owner, ttl):
+        now = time.time()
+        with self._lock:
+            current_owner, expires = self._leases.get(key, (None, 0))
+            if current_owner not in (None, owner) and expires > now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def renew(self, key, owner, ttl):
+        now = time.time()
+        with self._lock:
+            current_owner, expires = self._leases.get(key, (None, 0))
+            if current_owner != owner or expires <= now:
+                return False
+            self._leases[key] = (owner, now + ttl)
+            return True
+
+    def release(self, key, owner):
+        with self._lock:
+            if self._leases.get(key, (None, 0))[0] == owner:
+                del self._leases[key]
+
+
+class FileLeaseStore(LeaseStore):
+    """ Lease store shared by the processes that can access a directory. Every lease is kept
+    in its own file, which is locked with ``fcntl`` while it is read or updated, so this store
+    is only available on POSIX systems.
+
+    :param str directory: Directory where leases are stored.
+    """
+
+    def __init__(self, directory):
+        # type: (str) -> None
+        self._directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def acquire(self, key, owner, ttl):
+        return self._update(key, owner, ttl, allow_free=True)
+
+    def renew(self, key, owner, ttl):
+        return self._update(key, owner, ttl, allow_free=False)
+
+    def release(self, key, owner):
+        self._update(key, owner, None, allow_free=False)
+
+    def _update(self, key, owner, ttl, allow_free):
+        # type: (str, str, Optional[float], bool) -> bool
+        import fcntl
+        now = time.time()
+        with open(self._path(key), 'a+') as lease_file:
+            fcntl.flock(lease_file, fcntl.LOCK_EX)
+            try:
+                lease_file.seek(0)
+                try:
+                    lease = json.loads(lease_file.read() or '{}')
+                except ValueError:
+                    lease = {}
+                held = lease.get('owner') == owner and lease.get('expires', 0) > now
+                free = not lease.get('owner') or lease.get('expires', 0) <= now
+                if not held and not (allow_free and free):
+                    return False
+                lease_file.seek(0)
+                lease_file.truncate()
+                if ttl is not None:
+                    lease_file.write(json.dumps({'owner': owner, 'expires': now + ttl}))
+                lease_file.flush()
+                return True
+            finally:
+                fcntl.flock(lease_file, fcntl.LOCK_UN)
+
+    def _path(self, key):
+        # type: (str) -> str
+        # Keys like request ids are safe file names, but hash them anyway
+        return os.path.join(self._directory,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest() + '.lease')
+
+
+class SQLiteLeaseStore(LeaseStore):
+    """ Lease store shared by the processes that can access an SQLite database.
+
+    :param str path: Path of the database file. It is created if it does not exist.
+    :param float timeout: Seconds to wait for other processes to unlock the database.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        # type: (str, float) -> None
+        self._path = path
+        self._timeout = timeout
+        with closing(self._connect()) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS leases '
+                               '(key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)')
+
+    def acquire(self, key, owner, ttl):
+        now = time.time()
+        with closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('DELETE FROM leases WHERE key = ? AND (expires <= ? OR owner = ?)',
+                               (key, now, owner))
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO leases (key, owner, expires) VALUES (?, ?, ?)',
+                (key, owner, now + ttl))
+            connection.execute('COMMIT')
+            return cursor.rowcount == 1
+
+    def renew(self, key, owner, ttl):
+        now = time.time()
+        with closing(self._connect()) as connection:
+            cursor = connection.execute(
+                'UPDATE leases SET expires = ? WHERE key = ? AND owner = ? AND expires > ?',
+                (now + ttl, key, owner, now))
+            return cursor.rowcount == 1
+
+    def release(self, key, owner):
+        with closing(self._connect()) as connection:
+            connection.execute('DELETE FROM leases WHERE key = ? AND owner = ?', (key, owner))
+
+    def _connect(self):
+        # type: () -> sqlite3.Connection
+        # Connections cannot be shared between threads, and opening them is cheap
+        return sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
+
+
+class LeaseManager(object):
+    """ Claims requests before they are dispatched, so concurrent workers and replicas of an
+    automation never process the same request twice. Pass it to
+    :py:meth:`connect.resources.automation_engine.AutomationEngine.process`.
+
+    While leases are held, a background thread renews them every ``ttl / 3`` seconds. If a
+    lease cannot be renewed (for example, because the process stalled for longer than ``ttl``),
+    it is counted as lost.
+
+    The number of leases acquired, lost to contention (requests that were not processed here
+    because somebody else held them), renewed, lost and released is available in
+    :py:attr:`stats`.
+
+    :param LeaseStore store: Store of leases.
+    :param str owner: Id of this worker. By default, a unique id based on the host name and
+        process id.
+    :param float ttl: Seconds a lease lasts without being renewed.
+    """
+
+    STATS = ('acquired', 'contended', 'renewed', 'lost', 'released')
+
+    logger = logging.getLogger('Leases.logger')
+
+    def __init__(self, store, owner=None, ttl=300.0):
+        # type: (LeaseStore, Optional[str], float) -> None
+        if ttl <= 0:
+            raise ValueError('Lease TTL must be positive')
+        self.store = store
+        self.owner = owner or '{}-{}-{}'.format(
+            socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+        self.ttl = ttl
+        self._held = set()
+        self._stats = dict.fromkeys(self.STATS, 0)
+        self._lock = threading.Lock()
+        self._renewer = None  # type: Optional[threading.Thread]
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, int]
+        """ (dict[str,int]) Counters of lease operations. """
+        with self._lock:
+            return dict(self._stats)
+
+    @property
+    def held(self):
+        # type: () -> list
+        with self._lock:
+            return sorted(self._held)
+
+    def acquire(self, key):
+        # type: (str) -> bool
+        """
+        :param str key: Key to lease.
+        :return: Whether the lease was acquired, or was already held.
+        :rtype: bool
+        """
+        with self._lock:
+            if key in self._held:
+                return True
+        acquired = self.store.acquire(key, self.owner, self.ttl)
+        with self._lock:
+            self._stats['acquired' if acquired else 'contended'] += 1
+            if acquired:
+                self._held.add(key)
+                self._start_renewer()
+        if not acquired:
+            self.logger.info('Request {} is leased by another worker'.format(key))
+        return acquired
+
+    def release(self, key):
+        # type: (str) -> None
+        with self._lock:
+            if key not in self._held:
+                return
+            self._held.discard(key)
+            self._stats['released'] += 1
+        self.store.release(key, self.owner)
+
+    def renew_all(self):
+        """ Renews all held leases. Leases that could not be renewed are dropped. """
+        for key in self.held:
+            renewed = self.store.renew(key, self.owner, self.ttl)
+            with self._lock:
+                if key not in self._held:
+                    continue
+                if renewed:
+                    self._stats['renewed'] += 1
+                else:
+                    self._stats['lost'] += 1
+                    self._held.discard(key)
+            if not renewed:
+                self.logger.warning('Lease of request {} was lost'.format(key))
+
+    def _start_renewer(self):
+        # Must be called with the lock held
+        if self._renewer and self._renewer.is_alive():
+            return
+        self._renewer = threading.Thread(target=self._renew_loop, name='LeaseRenewer')
+        self._renewer.daemon = True
+        self._renewer.start()
+
+    def _renew_loop(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            with self._lock:
+                if not self._held:
+                    self._renewer = None
+                    return
+            try:
+                self.renew_all()
+            except Exception as ex:
+                self.logger.error('Error renewing leases: {}'.format(ex))
@@ -3,11 +3,17 @@
 # This file is part of the Ingram Micro Cloud Blue Connect SDK.
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
-from .logger import function_log, logger
+from .logger import function_log, get_request_context, logger, request_context, \
+    set_request_context, RequestContextFilter, RequestContextFormatter
 
 # TODO add auto settings for cloud platforms
 
 __all__ = [
     'function_log',
-    'logger'
+    'get_request_context',
+    'logger',
+    'request_context',
+    'set_request_context',
+    'RequestContextFilter',
+    'RequestContextFormatter',
 ]
@@ -3,11 +3,18 @@
 # This file is part of the Ingram Micro Cloud Blue Connect SDK.
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
+from contextlib import contextmanager
 from functools import wraps
 import json
 import logging
 import os
+import threading
+import time
 from logging.config import dictConfig
+from typing import Iterator
+
+import six
+from six.moves import reprlib
 
 with open(os.path.join(os.path.dirname(__file__), 'config.json')) as config_file:
     config = json.load(config_file)
@@ -17,27 +24,153 @@ dictConfig(config['logging'])
 logger = logging.getLogger()
 
 
-def function_log(custom_logger=None):
-    if not custom_logger:
-        custom_logger = logging.getLogger()
-        sformat = " %(levelname)-6s; %(asctime)s; %(name)-6s; %(module)s:%(funcName)s:line" \
-                  "-%(lineno)d: %(message)s"
-        for handler in custom_logger.handlers:
-            handler.setFormatter(logging.Formatter(sformat, "%I:%M:%S"))
+try:
+    from contextvars import ContextVar
+    _context = ContextVar('connect_request_context', default='')
+except ImportError:
+    _context = None
+    _local = threading.local()
+
+
+def get_request_context():
+    # type: () -> str
+    """ Returns the context of the request being dispatched, like its id, that is added to
+    the log records. """
+    return _context.get() if _context is not None else getattr(_local, 'value', '')
+
+
+def set_request_context(*values):
+    # type: (str) -> None
+    """ Sets the context of the request being dispatched in the current thread (or task),
+    like its id and the id of its asset. """
+    _install_context_handlers()
+    value = ' '.join(str(value) for value in values if value)
+    if _context is not None:
+        _context.set(value)
+    else:
+        _local.value = value
+
+
+@contextmanager
+def request_context(*values):
+    # type: (str) -> Iterator[None]
+    """ Context manager that sets the request context in its body, and restores the previous
+    one afterwards, even if the body sets another one. """
+    previous = get_request_context()
+    set_request_context(*values)
+    try:
+        yield
+    finally:
+        set_request_context(previous)
+
+
+class RequestContextFilter(logging.Filter):
+    """ Handler filter that stores the request context in the ``request_context`` attribute of
+    the records, so formatters can use ``%(request_context)s``.
+
+    It is added to every handler of the root logger, including the ones added after importing
+    this module. Handlers with no formatter also get a :py:class:`RequestContextFormatter`,
+    while custom formatters can include the context with ``%(request_context)s``, like
+    ``logging.Formatter('%(request_context)s %(message)s')``.
+    """
+
+    def filter(self, record):
+        if not hasattr(record, 'request_context'):
+            record.request_context = get_request_context()
+        return True
+
+
+class RequestContextFormatter(logging.Formatter):
+    """ Formatter that prepends the request context to the messages. """
+
+    def format(self, record):
+        context = getattr(record, 'request_context', None)
+        if context is None:
+            context = get_request_context()
+        return context + super(RequestContextFormatter, self).format(record)
+
 
-    # noinspection PyUnusedLocal
-    def decorator(func, **kwargs):
+_FORMAT = ' %(levelname)-6s; %(asctime)s; %(name)-6s; %(module)s:%(funcName)s:line' \
+          '-%(lineno)d: %(message)s'
+
+for _handler in logger.handlers:
+    _handler.setFormatter(RequestContextFormatter(_FORMAT, '%I:%M:%S'))
+    _handler.addFilter(RequestContextFilter())
+
+
+def _install_context_handlers():
+    # type: () -> None
+    """ Adds the request context filter to the handlers of the root logger that lack it, like
+    the ones added after importing this module, and the formatter to those with none. """
+    for handler in logging.getLogger().handlers:
+        if any(isinstance(log_filter, RequestContextFilter) for log_filter in handler.filters):
+            continue
+        if handler.formatter is None:
+            handler.setFormatter(RequestContextFormatter(_FORMAT, '%I:%M:%S'))
+        handler.addFilter(RequestContextFilter())
+
+
+MAX_REPR_LENGTH = 1000
+""" Maximum length of the arguments and return values logged by :py:func:`function_log`. """
+
+
+def function_log(custom_logger=None, timed=False, max_length=MAX_REPR_LENGTH):
+    """ Decorator that logs the calls to a method: its name with level INFO, and its arguments
+    and return value with level DEBUG. Arguments and return values are only formatted if the
+    record is emitted, and are truncated to ``max_length`` characters.
+
+    :param logging.Logger custom_logger: Logger to use, or ``None`` to use the root logger.
+    :param bool timed: Whether to log the duration of every call with level INFO.
+    :param int max_length: Maximum length of the arguments and return values logged.
+    """
+    custom_logger = custom_logger or logger
+
+    def decorator(func):
         # noinspection PyShadowingNames
         @wraps(func)
         def wrapper(self, *args, **kwargs):
+            if not custom_logger.isEnabledFor(logging.INFO):
+                return func(self, *args, **kwargs)
+
             custom_logger.info('Entering: %s', func.__name__)
-            custom_logger.debug('Function params: {} {}'.format(args, kwargs))
+            debug = custom_logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                custom_logger.debug('Function params: %s %s',
+                                    _Repr(args, max_length), _Repr(kwargs, max_length))
+            start = time.time() if timed else None
             result = func(self, *args, **kwargs)
-            custom_logger.debug(
-                'Function `{}.{}` return: {}'.format(
-                    self.__class__.__name__, func.__name__, result))
+            if timed:
+                custom_logger.info('Function `%s.%s` took %.1f ms', self.__class__.__name__,
+                                   func.__name__, (time.time() - start) * 1000)
+            if debug:
+                custom_logger.debug('Function `%s.%s` return: %s', self.__class__.__name__,
+                                    func.__name__, _Repr(result, max_length))
             return result
 
         return wrapper
 
     return decorator
+
+
+class _Repr(object):
+    """ Truncated representation of an object, only computed when it is logged. Containers are
+    truncated while formatting them, so only their first elements are formatted. """
+
+    __slots__ = ('obj', 'max_length')
+
+    def __init__(self, obj, max_length):
+        self.obj = obj
+        self.max_length = max_length
+
+    def __str__(self):
+        if self.max_length is None:
+            return str(self.obj)
+        if isinstance(self.obj, six.string_types):
+            text = self.obj
+        else:
+            limited = reprlib.Repr()
+            limited.maxstring = limited.maxother = self.max_length
+            text = limited.repr(self.obj)
+        if len(text) > self.max_length:
+            text = text[:self.max_length] + '...'
+        return text
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import bisect
+from collections import OrderedDict
+from contextlib import contextmanager
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+class Histogram(object):
+    """ Distribution of durations, counted in buckets.
+
+    :param Sequence[float] buckets: Upper bounds of the buckets, in seconds, in increasing order.
+        Durations above the last one are counted in an additional bucket.
+    """
+
+    def __init__(self, buckets):
+        # type: (Sequence[float]) -> None
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None  # type: Optional[float]
+        self.max = None  # type: Optional[float]
+
+    def observe(self, seconds):
+        # type: (float) -> None
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = seconds if self.min is None else min(self.min, seconds)
+        self.max = seconds if self.max is None else max(self.max, seconds)
+
+    def merge(self, other):
+        # type: (Histogram) -> None
+        """ Adds the observations of another histogram with the same buckets. """
+        if other.buckets != self.buckets:
+            raise ValueError('Cannot merge histograms with different buckets')
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        # type: () -> float
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, percent):
+        # type: (float) -> float
+        """
+        :param float percent: Percentile, between 0 and 100.
+        :return: Upper bound of the bucket holding the percentile (capped by the maximum
+            duration observed), or 0 if there are no observations.
+        :rtype: float
+        """
+        if not self.count:
+            return 0.0
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        # type: () -> Dict[str, float]
+        return {'count': self.count, 'total': self.total, 'mean': self.mean,
+                'min': self.min or 0.0, 'max': self.max or 0.0, 'p50': self.percentile(50),
+                'p95': self.percentile(95), 'p99': self.percentile(99)}
+
+
+class Metrics(object):
+    """ Histograms of the time spent on every stage of dispatching requests (like
+    ``process_request`` or ``approve``), by outcome of the dispatch (like ``approve``,
+    ``inquire``, ``fail``, ``skip`` or ``error``).
+
+    Every automation engine has its own ``metrics``. Stages timed while dispatching a request
+    are counted under the outcome of that dispatch, along with the ``dispatch`` stage itself.
+    Stages timed outside a dispatch, like ``list`` and ``decode``, have no outcome.
+
+    :param Sequence[float] buckets: Upper bounds of the buckets of the histograms, in seconds.
+    """
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+               30.0, 60.0)
+
+    def __init__(self, buckets=BUCKETS):
+        # type: (Sequence[float]) -> None
+        self.buckets = tuple(buckets)
+        self._histograms = OrderedDict()  # type: Dict[Tuple[str, str], Histogram]
+        self._lock = threading.Lock()
+        self._context = threading.local()
+
+    def __getstate__(self):
+        return {'buckets': self.buckets}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def observe(self, stage, seconds, outcome=None):
+        # type: (str, float, Optional[str]) -> None
+        """ Records the duration of a stage. Inside :py:meth:`dispatch`, it is recorded once
+        the outcome is known, unless it is given.
+
+        :param str stage: Name of the stage.
+        :param float seconds: Duration.
+        :param str outcome: Outcome of the dispatch.
+        """
+        pending = getattr(self._context, 'pending', None)
+        if outcome is None and pending is not None:
+            pending.append((stage, seconds))
+            return
+        with self._lock:
+            key = (stage, outcome or '')
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(self.buckets)
+            self._histograms[key].observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        # type: (str) -> Iterator[None]
+        """ Context manager that records the time spent in its body as a stage, or the time
+        set with :py:meth:`set_elapsed` in its body. """
+        start = time.time()
+        try:
+            yield
+        finally:
+            elapsed = self._elapsed().pop(stage, None)
+            self.observe(stage, time.time() - start if elapsed is None else elapsed)
+
+    def set_elapsed(self, stage, seconds):
+        # type: (str, float) -> None
+        """ Makes the innermost :py:meth:`time` of a stage running in this thread record the
+        given duration instead of the time spent in its body. Used when the work of the stage
+        was done beforehand, and its result is only replayed while dispatching the request.
+
+        :param str stage: Name of the stage.
+        :param float seconds: Duration.
+        """
+        self._elapsed()[stage] = seconds
+
+    @contextmanager
+    def dispatch(self):
+        # type: () -> Iterator[None]
+        """ Context manager that records the time spent dispatching a request, and the stages
+        timed while doing it, under the outcome set with :py:meth:`set_outcome`. The outcome is
+        ``error`` if the body raises an exception, or ``none`` if no outcome was set.
+        """
+        self._context.pending = []
+        self._context.outcome = None
+        self._context.elapsed = {}
+        start = time.time()
+        try:
+            yield
+        except Exception:
+            self._context.outcome = 'error'
+            raise
+        finally:
+            pending = self._context.pending + [('dispatch', time.time() - start)]
+            outcome = self._context.outcome or 'none'
+            self._context.pending = None
+            for stage, seconds in pending:
+                self.observe(stage, seconds, outcome)
+
+    def set_outcome(self, outcome):
+        # type: (str) -> None
+        """ Sets the outcome of the request being dispatched in this thread, if any. """
+        if getattr(self._context, 'pending', None) is not None:
+            self._context.outcome = outcome
+
+    def histogram(self, stage, outcome=None):
+        # type: (str, Optional[str]) -> Optional[Histogram]
+        """
+        :param str stage: Name of the stage.
+        :param str outcome: Outcome, or ``None`` for the stages timed outside a dispatch.
+        :return: The histogram of the stage, or ``None`` if it was never timed.
+        :rtype: Optional[Histogram]
+        """
+        with self._lock:
+            return self._histograms.get((stage, outcome or ''))
+
+    def merged(self, stage):
+        # type: (str) -> Histogram
+        """
+        :param str stage: Name of the stage.
+        :return: The histogram of the stage for all outcomes together.
+        :rtype: Histogram
+        """
+        merged = Histogram(self.buckets)
+        with self._lock:
+            for (name, _), histogram in self._histograms.items():
+                if name == stage:
+                    merged.merge(histogram)
+        return merged
+
+    def snapshot(self):
+        # type: () -> Dict[Tuple[str, str], Dict[str, float]]
+        """
+        :return: For every stage and outcome (an empty string for stages timed outside a
+            dispatch), the count, total, mean, min, max, and 50th, 95th and 99th percentiles of
+            the durations, in seconds.
+        :rtype: dict[tuple[str,str],dict[str,float]]
+        """
+        with self._lock:
+            return OrderedDict((key, histogram.as_dict())
+                               for key, histogram in sorted(self._histograms.items()))
+
+    def report(self):
+        # type: () -> str
+        """
+        :return: The snapshot as a text table, with durations in milliseconds.
+        :rtype: str
+        """
+        lines = ['{:<20} {:<10} {:>8} {:>10} {:>10} {:>10} {:>10} {:>10}'.format(
+            'stage', 'outcome', 'count', 'mean', 'p50', 'p95', 'p99', 'max')]  # type: List[str]
+        for (stage, outcome), stats in self.snapshot().items():
+            lines.append('{:<20} {:<10} {:>8} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f} {:>10.1f}'
+                         .format(stage, outcome or '-', stats['count'],
+                                 *(stats[name] * 1000 for name in
+                                   ('mean', 'p50', 'p95', 'p99', 'max'))))
+        return '\n'.join(lines)
+
+    def reset(self):
+        # type: () -> None
+        """ Removes all the histograms. """
+        with self._lock:
+            self._histograms.clear()
+
+    def _elapsed(self):
+        # type: () -> Dict[str, float]
+        elapsed = getattr(self._context, 'elapsed', None)
+        if elapsed is None:
+            elapsed = self._context.elapsed = {}
+        return elapsed
@@ -12,6 +12,10 @@ class BaseModel(object):
     """ Base class of all models.
 
     All the arguments provided on creation of the model are injected as attributes on the object.
+
+    Models are mutable by default. Calling :py:meth:`freeze` makes a model immutable, so it can be
+    cached and shared across threads without defensive copies, and :py:meth:`evolve` can then be
+    used to obtain modified copies of it.
     """
 
     _schema = BaseSchema()  # type: BaseSchema
@@ -24,13 +28,75 @@ class BaseModel(object):
         for attr, val in kwargs.items():
             setattr(self, attr, val)
 
+    def __setattr__(self, name, value):
+        if self.frozen:
+            raise AttributeError('Cannot set attribute `{}` of frozen `{}` object'
+                                 .format(name, self.__class__.__name__))
+        super(BaseModel, self).__setattr__(name, value)
+
+    def __delattr__(self, name):
+        if self.frozen:
+            raise AttributeError('Cannot delete attribute `{}` of frozen `{}` object'
+                                 .format(name, self.__class__.__name__))
+        super(BaseModel, self).__delattr__(name)
+
+    @property
+    def frozen(self):
+        """
+        :return: Whether the model has been frozen with :py:meth:`freeze`.
+        :rtype: bool
+        """
+        return self.__dict__.get('_frozen', False)
+
+    @property
+    def enrichment(self):
+        """
+        :return: Side data attached to the request by the ``enrichments`` of the automation
+            engine dispatching it (see :py:mod:`connect.enrichment`), or ``None``. It is not part
+            of the JSON representation of the model.
+        :rtype: dict[str,Any]|None
+        """
+        return self.__dict__.get('_enrichment')
+
+    def freeze(self):
+        """ Makes the model immutable, along with all the models, lists and dicts it contains
+        (lists are converted into tuples). Setting or deleting an attribute of a frozen model
+        raises an ``AttributeError``. Freezing cannot be undone, use :py:meth:`evolve` to obtain
+        modified copies instead.
+
+        :return: The model itself.
+        :rtype: BaseModel
+        """
+        if not self.frozen:
+            for attr, val in list(self.__dict__.items()):
+                self.__dict__[attr] = _freeze(val)
+            self.__dict__['_frozen'] = True
+        return self
+
+    def evolve(self, **changes):
+        """ Returns a copy of the model with the given attributes changed. Unchanged attributes
+        are not copied but shared with the original model (this is safe when it is frozen).
+        The copy is frozen if the model is frozen.
+
+        :param changes: Attributes to change in the copy.
+        :return: A new instance of the same class as the model.
+        :rtype: BaseModel
+        """
+        copy = self.__class__.__new__(self.__class__)
+        # Values of a frozen model are already frozen, only the changed ones need to be
+        copy.__dict__.update(self.__dict__)
+        if self.frozen:
+            changes = {attr: _freeze(val) for attr, val in changes.items()}
+        copy.__dict__.update(changes)
+        return copy
+
     @property
     def json(self):
         """
         :return: The JSON representation of the model.
         :rtype: dict|list
         """
-        dump = json.dumps(self, default=lambda o: getattr(o, '__dict__', str(o)))
+        dump = json.dumps(self, default=_json_default)
         return json.loads(dump)
 
     @classmethod
@@ -63,3 +129,32 @@ class BaseModel(object):
                     data=json_data),
             )
         return objects
+
+
+class _FrozenDict(dict):
+    """ Dict that cannot be modified, used for dicts contained in frozen models. """
+
+    def __reduce__(self):
+        return _FrozenDict, (dict(self),)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Frozen dict cannot be modified')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _immutable
+
+
+def _freeze(val):
+    if isinstance(val, BaseModel):
+        return val.freeze()
+    elif isinstance(val, (list, tuple)):
+        return tuple(_freeze(elem) for elem in val)
+    elif isinstance(val, dict) and not isinstance(val, _FrozenDict):
+        return _FrozenDict((key, _freeze(elem)) for key, elem in val.items())
+    else:
+        return val
+
+
+def _json_default(obj):
+    if hasattr(obj, '__dict__'):
+        return {attr: val for attr, val in obj.__dict__.items() if not attr.startswith('_')}
+    return str(obj)
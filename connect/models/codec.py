@@ -0,0 +1,551 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+""" Compact binary serialization of models.
+
+Values are encoded with a msgpack-like format, where models are written as a schema id followed
+by their attributes, with schema fields written as their position in the schema, so field names
+are not repeated on every object, and repeated strings are written only once per message. The
+id of every model is fixed in :py:data:`SCHEMA_IDS`. Every message starts with a header listing
+the schemas it uses and their version (a checksum of the model name and field names), so data
+written with an incompatible version of a model is detected on decoding instead of producing
+corrupt objects.
+
+Typical uses are disk caches, shared memory caches and handing requests to worker processes: ::
+
+    from connect.models import codec
+
+    data = codec.dumps(request)
+    request = codec.loads(data, frozen=True)
+"""
+
+import datetime
+import struct
+import zlib
+from typing import Any, Dict, List, Tuple, Type
+
+import six
+
+from .base import BaseModel
+
+FORMAT_VERSION = 2
+
+_MAGIC = b'CN'
+
+_NONE = 0xC0
+_FALSE = 0xC2
+_TRUE = 0xC3
+_BYTES = 0xC4
+_MODEL = 0xC7
+_FLOAT = 0xCB
+_INT = 0xD3
+_BIGINT = 0xD4
+_DATETIME = 0xD7
+_STR = 0xD9
+_LIST = 0xDC
+_DICT = 0xDE
+_STR_REF = 0xDF
+_FIXINT_MAX = 0x7F
+
+_INT64 = struct.Struct('>q')
+_DOUBLE = struct.Struct('>d')
+_DATETIME_STRUCT = struct.Struct('>qh')
+_CHECKSUM = struct.Struct('>I')
+_NAIVE = -0x8000
+_EPOCH = datetime.datetime(1970, 1, 1)
+_BYTE = [six.int2byte(value) for value in range(256)]
+_BYTE_NONE = _BYTE[_NONE]
+_BYTE_STR = _BYTE[_STR]
+_BYTE_STR_REF = _BYTE[_STR_REF]
+_ABSENT = object()
+
+
+SCHEMA_IDS = {
+    # Ids are part of the format: never reuse or change the id of a model, only add new ones
+    'Activation': 0,
+    'Agreement': 1,
+    'AgreementStats': 2,
+    'Asset': 3,
+    'BaseModel': 4,
+    'Company': 5,
+    'Configuration': 6,
+    'Connection': 7,
+    'Constraints': 8,
+    'Contact': 9,
+    'ContactInfo': 10,
+    'Contract': 11,
+    'Conversation': 12,
+    'ConversationMessage': 13,
+    'Country': 14,
+    'CustomerUiSettings': 15,
+    'Document': 16,
+    'DownloadLink': 17,
+    'Event': 18,
+    'Events': 19,
+    'ExtIdHub': 20,
+    'Fulfillment': 21,
+    'Hub': 22,
+    'HubInstance': 23,
+    'HubStats': 24,
+    'Item': 25,
+    'Marketplace': 26,
+    'Param': 27,
+    'PhoneNumber': 28,
+    'Product': 29,
+    'ProductCategory': 30,
+    'ProductConfiguration': 31,
+    'ProductConfigurationParameter': 32,
+    'ProductFamily': 33,
+    'ProductStats': 34,
+    'ProductStatsInfo': 35,
+    'Renewal': 36,
+    'ServerErrorResponse': 37,
+    'Template': 38,
+    'TierAccount': 39,
+    'TierAccounts': 40,
+    'TierConfig': 41,
+    'TierConfigRequest': 42,
+    'UsageFile': 43,
+    'UsageListing': 44,
+    'UsageRecord': 45,
+    'UsageRecords': 46,
+    'User': 47,
+    'ValueChoice': 48,
+}  # type: Dict[str, int]
+""" Id of every model in the encoded data. """
+
+
+class _Schema(object):
+    def __init__(self, schema_id, model_class):
+        # type: (int, Type[BaseModel]) -> None
+        self.id = schema_id
+        self.model_class = model_class
+        self.fields = tuple(sorted(model_class._schema.fields.keys()))
+        # Attributes that are schema fields are written as their position in the schema
+        self.keys = {
+            field: _BYTE[index] if index <= _FIXINT_MAX else _BYTE[_INT] + _INT64.pack(index)
+            for index, field in enumerate(self.fields)
+        }  # type: Dict[str, bytes]
+        self.version = zlib.crc32(
+            '{}:{}'.format(model_class.__name__, ','.join(self.fields)).encode('utf-8')
+        ) & 0xFFFFFFFF
+        chunks = [_BYTE[_MODEL]]
+        _write_varint(chunks, schema_id)
+        self.prefix = b''.join(chunks)
+
+
+class _Registry(object):
+    def __init__(self):
+        self._by_class = None  # type: Dict[type, _Schema]
+        self._by_id = None  # type: Dict[int, _Schema]
+
+    def by_class(self, model_class):
+        # type: (type) -> _Schema
+        self._load()
+        try:
+            return self._by_class[model_class]
+        except KeyError:
+            raise TypeError('Cannot encode model of unregistered type `{}`'
+                            .format(model_class.__name__))
+
+    def by_id(self, schema_id):
+        # type: (int) -> _Schema
+        self._load()
+        try:
+            return self._by_id[schema_id]
+        except KeyError:
+            raise ValueError('Unknown schema id {}'.format(schema_id))
+
+    def _load(self):
+        if self._by_id is None:
+            from connect import models
+            schemas = [_Schema(schema_id, getattr(models, name))
+                       for name, schema_id in SCHEMA_IDS.items()]
+            self._by_class = {schema.model_class: schema for schema in schemas}
+            self._by_id = {schema.id: schema for schema in schemas}
+
+
+_registry = _Registry()
+
+
+def dumps(obj):
+    # type: (Any) -> bytes
+    """ Encodes a model (or a list or dict of models and basic values).
+
+    :param Any obj: Object to encode.
+    :return: The encoded data.
+    :rtype: bytes
+    :raises TypeError: Raised if the object contains values that cannot be encoded.
+    """
+    encoder = _Encoder()
+    encoder.encode(obj)
+    header = [_MAGIC, _BYTE[FORMAT_VERSION]]
+    _write_varint(header, len(encoder.schemas))
+    for schema in sorted(encoder.schemas.values(), key=lambda s: s.id):
+        _write_varint(header, schema.id)
+        header.append(_CHECKSUM.pack(schema.version))
+    return b''.join(header + encoder.chunks)
+
+
+def loads(data, frozen=False):
+    # type: (bytes, bool) -> Any
+    """ Decodes data encoded with :py:func:`dumps`.
+
+    :param bytes data: Encoded data.
+    :param bool frozen: Whether to freeze the decoded models (see
+        :py:meth:`connect.models.BaseModel.freeze`).
+    :return: The decoded object.
+    :raises ValueError: Raised if the data is corrupt or was encoded with an incompatible
+        version of some model.
+    """
+    if not isinstance(data, bytes):
+        data = bytes(data)
+    if data[:2] != _MAGIC:
+        raise ValueError('Data was not encoded with connect.models.codec')
+    if six.indexbytes(data, 2) != FORMAT_VERSION:
+        raise ValueError('Unsupported format version {}'.format(six.indexbytes(data, 2)))
+    decoder = _Decoder(data, 3, frozen)
+    for _ in range(decoder.read_varint()):
+        schema = _registry.by_id(decoder.read_varint())
+        decoder.schemas[schema.id] = schema
+        version, = _CHECKSUM.unpack_from(data, decoder.pos)
+        decoder.pos += _CHECKSUM.size
+        if version != schema.version:
+            raise ValueError('Data was encoded with an incompatible version of `{}`'
+                             .format(schema.model_class.__name__))
+    try:
+        obj = decoder.decode()
+    except IndexError:
+        raise ValueError('Unexpected end of data')
+    if decoder.pos != len(data):
+        raise ValueError('Unexpected data after the end of the encoded object')
+    return obj
+
+
+def _write_varint(chunks, value):
+    # type: (List[bytes], int) -> None
+    if value <= 0x7F:
+        chunks.append(_BYTE[value])
+        return
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    chunks.append(bytes(out))
+
+
+class _Encoder(object):
+    # The methods bind the attributes they use to local variables and handle strings and None
+    # (the most common values) inline, as this is the hot path of encoding
+    def __init__(self):
+        self.chunks = []  # type: List[bytes]
+        self.schemas = {}  # type: Dict[type, _Schema]
+        self._strings = {}  # type: Dict[six.text_type, int]
+        self._encoders = {
+            bool: self._encode_bool,
+            float: self._encode_float,
+            six.binary_type: self._encode_bytes,
+            list: self._encode_list,
+            tuple: self._encode_list,
+            datetime.datetime: self._encode_datetime,
+        }
+        for int_type in six.integer_types:
+            self._encoders[int_type] = self._encode_int
+
+    def encode(self, obj):
+        obj_type = type(obj)
+        if obj_type is six.text_type:
+            self._encode_str(obj)
+        elif obj is None:
+            self.chunks.append(_BYTE_NONE)
+        else:
+            encoder = self._encoders.get(obj_type)
+            if encoder:
+                encoder(obj)
+            elif isinstance(obj, BaseModel):
+                # Following models of the same class are found in the dict of encoders
+                self._encoders[obj_type] = self._encode_model
+                self._encode_model(obj)
+            elif isinstance(obj, dict):
+                self._encode_dict(obj)
+            else:
+                raise TypeError('Cannot encode object of type `{}`'.format(obj_type.__name__))
+
+    def _encode_bool(self, obj):
+        self.chunks.append(_BYTE[_TRUE if obj else _FALSE])
+
+    def _encode_int(self, obj):
+        if 0 <= obj <= _FIXINT_MAX:
+            self.chunks.append(_BYTE[obj])
+        elif -0x8000000000000000 <= obj <= 0x7FFFFFFFFFFFFFFF:
+            self.chunks.append(_BYTE[_INT] + _INT64.pack(obj))
+        else:
+            self.chunks.append(_BYTE[_BIGINT])
+            self._write_bytes(str(obj).encode('ascii'))
+
+    def _encode_float(self, obj):
+        self.chunks.append(_BYTE[_FLOAT] + _DOUBLE.pack(obj))
+
+    def _encode_str(self, obj):
+        # Strings are interned, so repeated ones are written as a reference to the first one
+        strings = self._strings
+        index = strings.get(obj)
+        if index is None:
+            strings[obj] = len(strings)
+            encoded = obj.encode('utf-8')
+            length = len(encoded)
+            if length <= 0x7F:
+                self.chunks.append(_BYTE_STR + _BYTE[length] + encoded)
+            else:
+                self.chunks.append(_BYTE_STR)
+                self._write_bytes(encoded)
+        elif index <= 0x7F:
+            self.chunks.append(_BYTE_STR_REF + _BYTE[index])
+        else:
+            self.chunks.append(_BYTE_STR_REF)
+            _write_varint(self.chunks, index)
+
+    def _encode_bytes(self, obj):
+        self.chunks.append(_BYTE[_BYTES])
+        self._write_bytes(obj)
+
+    def _encode_datetime(self, obj):
+        offset = obj.utcoffset()
+        naive = obj.replace(tzinfo=None) - (offset or datetime.timedelta(0))
+        delta = naive - _EPOCH
+        micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+        if offset is None:
+            minutes = _NAIVE
+        else:
+            minutes, seconds = divmod(offset.total_seconds(), 60)
+            if seconds:
+                raise TypeError('Cannot encode datetime with UTC offset `{}`, which is not a '
+                                'whole number of minutes'.format(offset))
+            minutes = int(minutes)
+        self.chunks.append(_BYTE[_DATETIME] + _DATETIME_STRUCT.pack(micros, minutes))
+
+    def _encode_list(self, obj):
+        self.chunks.append(_BYTE[_LIST])
+        _write_varint(self.chunks, len(obj))
+        encode = self.encode
+        for elem in obj:
+            encode(elem)
+
+    def _encode_dict(self, obj):
+        self.chunks.append(_BYTE[_DICT])
+        _write_varint(self.chunks, len(obj))
+        encode = self.encode
+        for key, val in obj.items():
+            encode(key)
+            encode(val)
+
+    def _encode_model(self, obj):
+        model_class = type(obj)
+        schema = self.schemas.get(model_class)
+        if schema is None:
+            schema = self.schemas[model_class] = _registry.by_class(model_class)
+        chunks = self.chunks
+        append = chunks.append
+        encode = self.encode
+        encode_str = self._encode_str
+        encoders = self._encoders
+        text_type = six.text_type
+        keys = schema.keys
+        append(schema.prefix)
+        # The number of attributes is only known after skipping the private ones
+        count_pos = len(chunks)
+        append(b'')
+        count = 0
+        for attr, val in obj.__dict__.items():
+            key = keys.get(attr)
+            if key is not None:
+                append(key)
+            elif attr.startswith('_'):
+                continue
+            else:
+                encode_str(text_type(attr))
+            count += 1
+            if val is None:
+                append(_BYTE_NONE)
+            else:
+                val_type = type(val)
+                if val_type is text_type:
+                    encode_str(val)
+                elif val_type in encoders:
+                    encoders[val_type](val)
+                else:
+                    encode(val)
+        count_chunks = []
+        _write_varint(count_chunks, count)
+        chunks[count_pos] = count_chunks[0]
+
+    def _write_bytes(self, obj):
+        _write_varint(self.chunks, len(obj))
+        self.chunks.append(obj)
+
+
+class _Decoder(object):
+    # Like the encoder, the methods bind attributes to local variables, handle the most common
+    # tags inline and dispatch the rest through a table indexed by tag
+    def __init__(self, data, pos, frozen):
+        # type: (bytes, int, bool) -> None
+        # Indexing bytes returns ints on Python 3, so they only need to be copied on Python 2
+        self.data = data if six.PY3 else bytearray(data)
+        self.pos = pos
+        self.frozen = frozen
+        self.schemas = {}  # type: Dict[int, _Schema]
+        self._strings = []  # type: List[six.text_type]
+        self._decoders = [None] * 256
+        for tag, decoder in (
+                (_NONE, lambda: None),
+                (_FALSE, lambda: False),
+                (_TRUE, lambda: True),
+                (_STR, self._decode_str),
+                (_STR_REF, self._decode_str_ref),
+                (_MODEL, self._decode_model),
+                (_LIST, self._decode_list),
+                (_DICT, self._decode_dict),
+                (_INT, lambda: self._unpack(_INT64)[0]),
+                (_FLOAT, lambda: self._unpack(_DOUBLE)[0]),
+                (_DATETIME, self._decode_datetime),
+                (_BYTES, lambda: bytes(self._read_bytes())),
+                (_BIGINT, lambda: int(self._read_bytes().decode('ascii')))):
+            self._decoders[tag] = decoder
+
+    def read_varint(self):
+        # type: () -> int
+        data = self.data
+        pos = self.pos
+        byte = data[pos]
+        if byte < 0x80:
+            self.pos = pos + 1
+            return byte
+        result = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                self.pos = pos
+                return result
+            shift += 7
+
+    def decode(self):
+        pos = self.pos
+        tag = self.data[pos]
+        self.pos = pos + 1
+        if tag <= _FIXINT_MAX:
+            return tag
+        decoder = self._decoders[tag]
+        if decoder is None:
+            raise ValueError('Invalid tag 0x{:02X} at position {}'.format(tag, pos))
+        return decoder()
+
+    def _decode_str(self):
+        pos = self.pos
+        length = self.data[pos]
+        if length <= 0x7F:
+            self.pos = pos + 1 + length
+            if self.pos > len(self.data):
+                raise ValueError('Unexpected end of data')
+            string = self.data[pos + 1:self.pos].decode('utf-8')
+        else:
+            string = self._read_bytes().decode('utf-8')
+        self._strings.append(string)
+        return string
+
+    def _decode_str_ref(self):
+        return self._strings[self.read_varint()]
+
+    def _decode_list(self):
+        decode = self.decode
+        return [decode() for _ in range(self.read_varint())]
+
+    def _decode_dict(self):
+        decode = self.decode
+        result = {}
+        for _ in range(self.read_varint()):
+            key = decode()
+            result[key] = decode()
+        return result
+
+    def _decode_datetime(self):
+        micros, minutes = self._unpack(_DATETIME_STRUCT)
+        value = _EPOCH + datetime.timedelta(microseconds=micros)
+        if minutes == _NAIVE:
+            return value
+        offset = _FixedOffset(minutes)
+        return (value + offset.utcoffset(None)).replace(tzinfo=offset)
+
+    def _decode_model(self):
+        schema_id = self.read_varint()
+        try:
+            schema = self.schemas[schema_id]
+        except KeyError:
+            raise ValueError('Schema id {} is not in the header'.format(schema_id))
+        obj = schema.model_class.__new__(schema.model_class)
+        attrs = obj.__dict__
+        fields = schema.fields
+        data = self.data
+        decode = self.decode
+        strings = self._strings
+        for _ in range(self.read_varint()):
+            pos = self.pos
+            tag = data[pos]
+            if tag <= _FIXINT_MAX:
+                self.pos = pos + 1
+                attr = fields[tag]
+            else:
+                attr = decode()
+                if isinstance(attr, six.integer_types):
+                    attr = fields[attr]
+            pos = self.pos
+            tag = data[pos]
+            if tag == _NONE:
+                self.pos = pos + 1
+                attrs[attr] = None
+            elif tag == _STR_REF and data[pos + 1] <= 0x7F:
+                self.pos = pos + 2
+                attrs[attr] = strings[data[pos + 1]]
+            else:
+                attrs[attr] = decode()
+        return obj.freeze() if self.frozen else obj
+
+    def _read_bytes(self):
+        # type: () -> bytes
+        length = self.read_varint()
+        start = self.pos
+        self.pos += length
+        if self.pos > len(self.data):
+            raise ValueError('Unexpected end of data')
+        return self.data[start:self.pos]
+
+    def _unpack(self, struct_):
+        # type: (struct.Struct) -> Tuple
+        values = struct_.unpack_from(self.data, self.pos)
+        self.pos += struct_.size
+        return values
+
+
+class _FixedOffset(datetime.tzinfo):
+    def __init__(self, minutes):
+        # type: (int) -> None
+        super(_FixedOffset, self).__init__()
+        self._minutes = minutes
+
+    def __getinitargs__(self):
+        return self._minutes,
+
+    def utcoffset(self, dt):
+        return datetime.timedelta(minutes=self._minutes)
+
+    def dst(self, dt):
+        return datetime.timedelta(0)
+
+    def tzname(self, dt):
+        sign = '-' if self._minutes < 0 else '+'
+        hours, minutes = divmod(abs(self._minutes), 60)
+        return 'UTC{}{:02d}:{:02d}'.format(sign, hours, minutes)
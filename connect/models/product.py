@@ -4,7 +4,7 @@
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
 import datetime
-from typing import Optional
+from typing import Any, Optional
 
 from .base import BaseModel
 from .company import Company
@@ -68,14 +68,21 @@ class Product(BaseModel):
     stats = None  # type: Optional[ProductStats]
     """ (:py:class:``.ProductStats) Statistics of product use, depends on account of callee. """
 
+    cache = None  # type: Optional[Any]
+    """ (:py:class:`connect.cache.ProductCatalog` | None) Cache of the product data, or ``None``
+    (default) to query Connect on every call.
+    """
+
     def get_templates(self, config=None):
         """
         :param Config config: Configuration to use, or None for environment config.
         :return: List of all templates associated with the product.
         :rtype: List[Template]
         """
-        text, _ = ApiClient(config or Config.get_instance(),
-                            'products/' + self.id + '/templates').get()
+        path = 'products/' + self.id + '/templates'
+        if self.cache is not None:
+            return Template.deserialize(self.cache.fetch(config, path))
+        text, _ = ApiClient(config or Config.get_instance(), path).get()
         return Template.deserialize(text)
 
     def get_product_configurations(self, filters=None, config=None):
@@ -93,6 +100,9 @@ class Product(BaseModel):
         :return: A list with the product configuration parameter data.
         :rtype: List[ProductConfigurationParameter]
         """
-        text, _ = ApiClient(config or Config.get_instance(),
-                            'products/' + self.id + '/configurations').get(params=filters)
+        path = 'products/' + self.id + '/configurations'
+        if self.cache is not None:
+            return ProductConfigurationParameter.deserialize(
+                self.cache.fetch(config, path, filters))
+        text, _ = ApiClient(config or Config.get_instance(), path).get(params=filters)
         return ProductConfigurationParameter.deserialize(text)
@@ -3,7 +3,7 @@
 # This file is part of the Ingram Micro Cloud Blue Connect SDK.
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
 from .base import BaseModel
 from .configuration import Configuration
@@ -70,6 +70,11 @@ class TierConfig(BaseModel):
     status = None  # type: str
     """ (str) TierConfig status. """
 
+    cache = None  # type: Optional[Any]
+    """ (:py:class:`connect.cache.TierConfigCache` | None) Cache used by :py:meth:`get`, or
+    ``None`` (default) to query Connect on every call.
+    """
+
     @classmethod
     def get(cls, account_id, product_id, config=None):
         """
@@ -84,6 +89,9 @@ class TierConfig(BaseModel):
         :return: The requested Tier Config, or ``None`` if it was not found.
         :rtype: Optional[TierConfig]
         """
+        if cls.cache is not None:
+            return cls.cache.get(account_id, product_id, config)
+
         from .tier_config_request import TierConfigRequest
         from connect.resources.base import ApiClient
 
@@ -101,6 +109,39 @@ class TierConfig(BaseModel):
         else:
             return None
 
+    @classmethod
+    def get_many(cls, account_ids, product_id, config=None, chunk_size=100):
+        """
+        Gets the tier config data of many accounts at once, with one query for every
+        ``chunk_size`` accounts. The cache is not used.
+
+        :param Iterable[str] account_ids: Account Ids of the requested Tier Configs.
+        :param str product_id: Id of the product.
+        :param Config config: Config to use, or ``None`` to use environment config (default).
+        :param int chunk_size: Maximum number of accounts requested in a single query.
+        :return: The Tier Configs found, by account id.
+        :rtype: Dict[str, TierConfig]
+        """
+        from .tier_config_request import TierConfigRequest
+        from connect.resources.base import ApiClient
+
+        account_ids = sorted(set(account_id for account_id in account_ids if account_id))
+        client = ApiClient(config, base_path='tier/config-requests')
+        found = {}  # type: Dict[str, TierConfig]
+        for start in range(0, len(account_ids), chunk_size):
+            params = {
+                'status': 'approved',
+                'configuration__product__id': product_id,
+                'configuration__account__id__in': ','.join(
+                    account_ids[start:start + chunk_size]),
+            }
+            for page in client.iter_pages(params=params):
+                for request in TierConfigRequest.deserialize_json(page):
+                    account = request.configuration.account
+                    if account and account.id not in found:
+                        found[account.id] = request.configuration
+        return found
+
     def get_param_by_id(self, id_):
         """ Get a Tier Config parameter.
 
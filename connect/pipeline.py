@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+import functools
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from six.moves import queue
+
+from connect.resources.automation_engine import AutomationEngine, DispatchOutcome
+
+# Marks the end of the items of a queue
+_END = object()
+
+
+class Stage(object):
+    """ Stage of a :py:class:`Pipeline`.
+
+    :param str name: Name of the stage.
+    :param Callable func: Function called with every item. It returns the item passed to the
+        next stage, or ``None`` to drop it.
+    :param int workers: Number of threads running the stage.
+    :param int queue_size: Maximum number of items waiting for the stage. When the queue is
+        full, the previous stage blocks until there is room.
+    :param bool fan_out: Whether ``func`` returns a list of items instead of a single one.
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=16, fan_out=False):
+        # type: (str, Callable, int, int, bool) -> None
+        if workers < 1 or queue_size < 1:
+            raise ValueError('Stages need at least one worker and a queue of one item')
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+        self.fan_out = fan_out
+
+
+class Pipeline(object):
+    """ Runs items through a sequence of stages connected by bounded queues. Stages run
+    concurrently, each one on its own threads, and a slow stage makes the previous ones wait
+    once its queue is full.
+
+    If a stage raises an exception, the pipeline stops reading its source, the items already
+    read are discarded, and the exception is raised by :py:meth:`run`.
+
+    :param list[Stage] stages: Stages, in order.
+    :param str source_name: Name used for the source in the stats.
+    """
+
+    logger = logging.getLogger('Pipeline.logger')
+
+    def __init__(self, stages, source_name='source'):
+        # type: (List[Stage], str) -> None
+        if not stages:
+            raise ValueError('Pipelines need at least one stage')
+        self.stages = list(stages)
+        self.source_name = source_name
+        self._stats = OrderedDict()  # type: Dict[str, _StageStats]
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Dict[str, float]]
+        """ (dict[str,dict[str,float]]) For the source and every stage of the last run:
+
+        - ``processed``: Number of items read or processed.
+        - ``busy``: Seconds spent reading or processing items, added for all workers.
+        - ``throughput``: Items processed per second of the run.
+        - ``utilization``: Fraction of the time that the workers of the stage were busy.
+        - ``queue_max``, ``queue_mean``: Maximum and mean number of items found waiting in the
+          queue of the stage when its workers took an item.
+        """
+        with self._lock:
+            return OrderedDict((name, stats.as_dict()) for name, stats in self._stats.items())
+
+    def run(self, source):
+        # type: (Iterable[Any]) -> List[Any]
+        """
+        :param Iterable source: Items to process. It is consumed in a separate thread.
+        :return: The items returned by the last stage, in the order they were completed.
+        :rtype: list
+        """
+        queues = [queue.Queue(stage.queue_size) for stage in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        results = []  # type: List[Any]
+        errors = []  # type: List[Exception]
+        abort = threading.Event()
+        start = time.time()
+        with self._lock:
+            self._stats = OrderedDict([(self.source_name, _StageStats(1, start))] + [
+                (stage.name, _StageStats(stage.workers, start)) for stage in self.stages])
+
+        def fail(ex):
+            with self._lock:
+                errors.append(ex)
+            abort.set()
+
+        def feed():
+            stats = self._stats[self.source_name]
+            try:
+                iterator = iter(source)
+                while not abort.is_set():
+                    began = time.time()
+                    try:
+                        item = next(iterator)
+                    except StopIteration:
+                        break
+                    stats.add(time.time() - began)
+                    queues[0].put(item)
+            except Exception as ex:
+                fail(ex)
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_END)
+
+        def work(index):
+            stage = self.stages[index]
+            stats = self._stats[stage.name]
+            while True:
+                stats.sample(queues[index].qsize())
+                item = queues[index].get()
+                if item is _END:
+                    break
+                if abort.is_set():
+                    # Keep draining the queue, so previous stages do not block
+                    continue
+                began = time.time()
+                try:
+                    output = stage.func(item)
+                except Exception as ex:
+                    self.logger.error('Error in stage {}: {}'.format(stage.name, ex))
+                    fail(ex)
+                    continue
+                finally:
+                    stats.add(time.time() - began)
+                for value in (output if stage.fan_out else [output]):
+                    if value is None:
+                        continue
+                    if index + 1 < len(self.stages):
+                        queues[index + 1].put(value)
+                    else:
+                        with self._lock:
+                            results.append(value)
+
+            # The last worker of a stage signals the end to the next one
+            with self._lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    queues[index + 1].put(_END)
+
+        threads = [threading.Thread(target=feed, name='{}-0'.format(self.source_name))]
+        for index, stage in enumerate(self.stages):
+            threads.extend(threading.Thread(target=work, args=(index,),
+                                            name='{}-{}'.format(stage.name, i))
+                           for i in range(stage.workers))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        end = time.time()
+        for stats in self._stats.values():
+            stats.end = end
+
+        if errors:
+            raise errors[0]
+        return results
+
+
+class _StageStats(object):
+    def __init__(self, workers, start):
+        # type: (int, float) -> None
+        self.workers = workers
+        self.start = start
+        self.end = None  # type: Optional[float]
+        self.processed = 0
+        self.busy = 0.0
+        self.samples = 0
+        self.queue_total = 0
+        self.queue_max = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy):
+        # type: (float) -> None
+        with self._lock:
+            self.processed += 1
+            self.busy += busy
+
+    def sample(self, size):
+        # type: (int) -> None
+        with self._lock:
+            self.samples += 1
+            self.queue_total += size
+            self.queue_max = max(self.queue_max, size)
+
+    def as_dict(self):
+        # type: () -> Dict[str, float]
+        with self._lock:
+            elapsed = max((self.end or time.time()) - self.start, 1e-6)
+            return {
+                'processed': self.processed,
+                'busy': self.busy,
+                'throughput': self.processed / elapsed,
+                'utilization': self.busy / (elapsed * self.workers),
+                'queue_max': self.queue_max,
+                'queue_mean': float(self.queue_total) / self.samples if self.samples else 0.0,
+            }
+
+
+class EnginePipeline(object):
+    """ Processes the pending requests of an automation engine in five stages, connected by
+    bounded queues:
+
+    - ``fetch``: Gets pages of pending requests (this is the source of the pipeline).
+    - ``decode``: Deserializes the requests in a page.
+    - ``process``: Calls ``process_request``.
+    - ``act``: Calls ``dispatch`` to approve, inquire, fail or skip the request with the outcome
+      of ``process_request``.
+    - ``converse``: Adds the messages generated by ``dispatch`` to the conversation of the
+      request (only for engines with a ``conversation_sink``, like
+      :py:class:`connect.resources.FulfillmentAutomation`).
+
+    Every stage can have a different number of workers. Check :py:attr:`stats` after a run to
+    find the bottleneck.
+
+    :param AutomationEngine engine: Engine used to process requests.
+    :param dict[str,int] workers: Number of workers of some stages. By default, four for
+        ``process`` and two for ``act`` and ``converse``.
+    :param int queue_size: Size of the queue of every stage.
+    :param int page_size: Number of requests fetched on every page, or ``None`` to use the
+        ``limit`` of the engine. Pages are requested in order of creation, continuing from the
+        last request fetched.
+    """
+
+    STAGES = ('decode', 'process', 'act', 'converse')
+    WORKERS = {'decode': 1, 'process': 4, 'act': 2, 'converse': 2}
+
+    def __init__(self, engine, workers=None, queue_size=16, page_size=None):
+        # type: (AutomationEngine, Optional[Dict[str, int]], int, Optional[int]) -> None
+        unknown = set(workers or {}) - set(self.STAGES)
+        if unknown:
+            raise ValueError('Unknown pipeline stages: {}'.format(', '.join(sorted(unknown))))
+        self.engine = engine
+        self.page_size = page_size or engine.limit
+        counts = dict(self.WORKERS, **(workers or {}))
+        funcs = {'decode': self._decode, 'process': self._process, 'act': self._act,
+                 'converse': self._converse}
+        self.pipeline = Pipeline([
+            Stage(name, funcs[name], counts[name], queue_size, fan_out=(name == 'decode'))
+            for name in self.STAGES], source_name='fetch')
+
+    @property
+    def stats(self):
+        # type: () -> Dict[str, Dict[str, float]]
+        """ (dict[str,dict[str,float]]) Stats of every stage, see :py:attr:`Pipeline.stats`. """
+        return self.pipeline.stats
+
+    def run(self, filters=None):
+        # type: (Optional[Dict[str, Any]]) -> List[DispatchOutcome]
+        """ Processes the requests matching the given filters. As with ``process``, the first
+        error raised by ``dispatch`` is raised once all requests have finished.
+
+        :param dict[str,Any] filters: Filters for listing the requests, or ``None`` to use the
+            default ones.
+        :return: The outcome of dispatching every request, in the order they were completed.
+        :rtype: list[DispatchOutcome]
+        """
+        filters = dict(filters or self.engine.filters())
+        filters.pop('limit', None)
+        # Requests leave the list while they are approved, which shifts pages requested by
+        # offset, so they are requested by keyset if the engine supports it
+        pages = self.engine._api.iter_pages(params=filters, limit=self.page_size,
+                                            keyset=self.engine.keyset)
+        return self.engine._check_outcomes(self.pipeline.run(pages))
+
+    def _decode(self, page):
+        requests = list(self.engine._bypass_skipped(self.engine.model_class.deserialize_json(page)))
+        self.engine._prefetch(requests)
+        return requests
+
+    def _process(self, request):
+        if self.engine._precheck(request) is not None:
+            # Requests that must not be processed go straight to dispatch
+            return request, None, None
+        start = time.time()
+        try:
+            outcome = self.engine.process_request(request), None
+        except Exception as ex:
+            outcome = None, ex
+        return request, outcome, time.time() - start
+
+    def _act(self, item):
+        request, outcome, elapsed = item
+        if outcome is None:
+            return self.engine._dispatch_one((self.engine, request)), request, []
+        engine, _ = self.engine._make_job(request, outcome=outcome)
+        # process_request is timed when its outcome is replayed, so it is counted under the
+        # outcome of the dispatch
+        engine.process_request = functools.partial(
+            _timed, engine.metrics, elapsed, engine.process_request)
+        messages = []
+        engine.conversation_sink = lambda _request, message: messages.append(message)
+        return self.engine._dispatch_one((engine, request)), request, messages
+
+    def _converse(self, item):
+        dispatch_outcome, request, messages = item
+        for message in messages:
+            self.engine._add_conversation_message(request, message)
+        return dispatch_outcome
+
+
+def _timed(metrics, elapsed, process_request, request):
+    metrics.set_elapsed('process_request', elapsed)
+    return process_request(request)
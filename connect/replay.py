@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import argparse
+import copy
+import json
+import math
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from connect.cache import TTLCache
+from connect.config import Config
+from connect.metrics import Metrics
+
+
+class ReplayReport(object):
+    """ Results of replaying the captured requests at one concurrency level.
+
+    :param int concurrency: Number of requests dispatched concurrently.
+    :param int count: Number of requests dispatched.
+    :param float elapsed: Seconds spent dispatching all of them.
+    :param Metrics metrics: Times of the dispatch stages.
+    :param list[float] latencies: Seconds spent dispatching every request.
+    """
+
+    def __init__(self, concurrency, count, elapsed, metrics, latencies=None):
+        # type: (int, int, float, Metrics, Optional[List[float]]) -> None
+        self.concurrency = concurrency
+        self.count = count
+        self.elapsed = elapsed
+        self.metrics = metrics
+        self.latencies = sorted(latencies or [])
+
+    @property
+    def throughput(self):
+        # type: () -> float
+        """ (float) Requests dispatched per second. """
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def outcomes(self):
+        # type: () -> Dict[str, int]
+        """ (dict[str,int]) Number of requests by outcome (like ``approve`` or ``skip``). """
+        return {outcome: stats['count']
+                for (stage, outcome), stats in self.metrics.snapshot().items()
+                if stage == 'dispatch'}
+
+    def latency(self, stage='dispatch'):
+        # type: (str) -> Dict[str, float]
+        """
+        :param str stage: Name of the stage, like ``dispatch`` or ``process_request``.
+        :return: The 50th, 95th and 99th percentiles of the duration of the stage in seconds,
+            for all outcomes. They are exact for ``dispatch``, and upper bounds of the histogram
+            buckets for other stages.
+        :rtype: dict[str,float]
+        """
+        if stage == 'dispatch' and self.latencies:
+            return {'p50': _percentile(self.latencies, 50),
+                    'p95': _percentile(self.latencies, 95),
+                    'p99': _percentile(self.latencies, 99)}
+        histogram = self.metrics.merged(stage)
+        return {'p50': histogram.percentile(50), 'p95': histogram.percentile(95),
+                'p99': histogram.percentile(99)}
+
+
+def _percentile(values, percent):
+    # type: (List[float], float) -> float
+    """ Nearest-rank percentile of sorted values. """
+    rank = int(math.ceil(percent / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+class Replay(object):
+    """ Benchmarks the ``process_request`` of an automation engine against captured requests.
+
+    Requests are dispatched as usual, but the calls that change something in Connect are
+    replaced by stubs that only wait ``action_latency`` seconds: approving, inquiring or failing
+    requests, updating their parameters, usage file actions and conversation messages. Other
+    calls, like the ones done by ``process_request`` to get data, still reach the API.
+
+    :param AutomationEngine engine: Engine whose requests are replayed.
+    :param list requests: Captured requests, as decoded JSON objects.
+    :param float action_latency: Seconds every stubbed call takes.
+    """
+
+    def __init__(self, engine, requests, action_latency=0.0):
+        # type: (Any, List[Dict[str, Any]], float) -> None
+        self.engine = engine
+        self.requests = requests
+        self.action_latency = action_latency
+
+    def run(self, concurrency=1):
+        # type: (int) -> ReplayReport
+        """ Dispatches all requests once.
+
+        :param int concurrency: Number of requests dispatched concurrently.
+        :return: The results.
+        :rtype: ReplayReport
+        """
+        engine = self._stub_engine()
+        requests = engine.model_class.deserialize_json(self.requests)
+        start = time.time()
+        outcomes = engine._dispatch_all([(engine, request) for request in requests], concurrency)
+        return ReplayReport(concurrency, len(requests), time.time() - start, engine.metrics,
+                            [outcome.elapsed for outcome in outcomes])
+
+    def _stub_engine(self):
+        engine = copy.copy(self.engine)
+        engine.metrics = Metrics()
+        engine._skipped = TTLCache(max_size=None)
+        engine._api = _StubApiClient(engine._api, self.action_latency)
+        if hasattr(engine, '_add_conversation_message'):
+            engine.conversation_sink = None
+            engine._add_conversation_message = self._add_conversation_message(engine)
+        return engine
+
+    def _add_conversation_message(self, engine):
+        def add_conversation_message(_request, _message):
+            with engine.metrics.time('conversation_post'):
+                time.sleep(self.action_latency)
+        return add_conversation_message
+
+
+class _StubApiClient(object):
+    """ Delegates to an ApiClient, except for POST and PUT calls. """
+
+    def __init__(self, client, latency):
+        self._client = client
+        self._latency = latency
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def post(self, path='', **kwargs):
+        time.sleep(self._latency)
+        return '{}', 200
+
+    def put(self, path='', **kwargs):
+        time.sleep(self._latency)
+        return '{}', 200
+
+
+def load_pages(paths):
+    # type: (Iterable[str]) -> List[Dict[str, Any]]
+    """ Loads captured requests from JSON files, each containing a list of requests (like a page
+    returned by the API) or a single one.
+
+    :param Iterable[str] paths: Paths of the files.
+    :return: The requests, as decoded JSON objects.
+    :rtype: list[dict[str,Any]]
+    """
+    requests = []
+    for path in paths:
+        with open(path) as fp:
+            page = json.load(fp)
+        requests.extend(page if isinstance(page, list) else [page])
+    return requests
+
+
+def format_reports(reports):
+    # type: (Sequence[ReplayReport]) -> str
+    """
+    :param Sequence[ReplayReport] reports: Reports to format.
+    :return: A text table with the throughput, latency (in milliseconds) and outcomes of every
+        report.
+    :rtype: str
+    """
+    lines = ['{:>11} {:>8} {:>10} {:>9} {:>9} {:>9}  {}'.format(
+        'concurrency', 'requests', 'req/s', 'p50', 'p95', 'p99', 'outcomes')]
+    for report in reports:
+        latency = report.latency()
+        lines.append('{:>11} {:>8} {:>10.1f} {:>9.1f} {:>9.1f} {:>9.1f}  {}'.format(
+            report.concurrency, report.count, report.throughput,
+            latency['p50'] * 1000, latency['p95'] * 1000, latency['p99'] * 1000,
+            ', '.join('{}={}'.format(outcome, count)
+                      for outcome, count in sorted(report.outcomes.items()))))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    # type: (Optional[List[str]]) -> None
+    """ Entry point of the ``connect-replay`` command. """
+    from connect.daemon import load_engine
+
+    parser = argparse.ArgumentParser(
+        prog='connect-replay',
+        description='Benchmark an automation engine against captured requests, without '
+                    'approving, inquiring or failing them.')
+    parser.add_argument('engine', help='engine class, like `package.module:ClassName`')
+    parser.add_argument('pages', nargs='+', help='JSON files with captured requests')
+    parser.add_argument('--config', help='config file (default: config.json)')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1],
+                        help='concurrency levels to measure (default: 1)')
+    parser.add_argument('--action-latency', type=float, default=0.0,
+                        help='seconds every stubbed call takes (default: 0)')
+    parser.add_argument('--stages', action='store_true',
+                        help='also print the time of every stage')
+    args = parser.parse_args(argv)
+
+    config = Config(file=args.config) if args.config else None
+    replay = Replay(load_engine(args.engine, config), load_pages(args.pages),
+                    action_latency=args.action_latency)
+    reports = [replay.run(concurrency) for concurrency in args.concurrency]
+    print(format_reports(reports))
+    if args.stages:
+        for report in reports:
+            print('\nConcurrency {}:\n{}'.format(report.concurrency, report.metrics.report()))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 # This file is part of the Ingram Micro Cloud Blue Connect SDK.
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
+from .automation_engine import DispatchOutcome
+from .columnar import ColumnBuilder
 from .directory import Directory
 from .fulfillment_automation import FulfillmentAutomation
 from .template import TemplateResource
@@ -12,7 +14,9 @@ from .usage_file_automation import UsageFileAutomation
 
 
 __all__ = [
+    'ColumnBuilder',
     'Directory',
+    'DispatchOutcome',
     'FulfillmentAutomation',
     'TemplateResource',
     'TierConfigAutomation',
@@ -3,29 +3,227 @@
 # This file is part of the Ingram Micro Cloud Blue Connect SDK.
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
+from collections import OrderedDict, deque, namedtuple
 import copy
+import functools
 import logging
-from typing import Any, Dict
+import pickle
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
-from connect.logger import function_log, logger as global_logger
+import six
+
+from connect.cache import TTLCache
+from connect.logger import function_log, request_context, set_request_context
+from connect.metrics import Metrics
 from connect.models.activation_tile_response import ActivationTileResponse
-from connect.models.base import BaseModel
+from connect.models.base import BaseModel, _FrozenDict
+from connect.sharding import get_attribute
 from .base import BaseResource
 from .template import TemplateResource
 
 
+class DispatchOutcome(namedtuple('DispatchOutcome', ('request_id', 'result', 'error', 'elapsed'))):
+    """ Outcome of dispatching one request, as reported by :py:meth:`AutomationEngine.process`.
+
+    - ``request_id`` (str): Id of the request.
+    - ``result`` (str): Value returned by ``dispatch``, or ``None`` if it raised an exception.
+    - ``error`` (Exception): Exception raised by ``dispatch``, or ``None``.
+    - ``elapsed`` (float): Time spent dispatching the request, in seconds.
+    """
+
+
+# Engine used to dispatch a request, and the request
+_Job = Tuple['AutomationEngine', BaseModel]
+
+
 class AutomationEngine(BaseResource):
     limit = 1000  # type: int
     logger = logging.getLogger()
 
+    attribute_paths = {'id': 'id'}  # type: Dict[str, str]
+    """ (dict[str,str]) Dotted paths of the request attributes that can be used to split work,
+    like the key of a :py:class:`connect.sharding.Shard`. """
+
+    skip_ttl = None  # type: Optional[float]
+    """ (float) Seconds during which a request skipped with
+    :py:class:`connect.exceptions.SkipRequest` is not processed again, as long as it is not
+    updated, or ``None`` to process it again on every call to ``process``. The ``retry_after``
+    of the exception takes precedence. """
+
+    # Worker processes kept across calls to `process`, and their arguments, see `_get_pool`
+    _pool = None  # type: Any
+    _pool_args = None  # type: Optional[tuple]
+
+    batch_size = 50  # type: int
+    """ (int) Maximum number of requests passed to ``process_requests`` at once. """
+
+    batch_keys = ('product', 'type')  # type: Sequence[str]
+    """ (Sequence[str]) Keys of ``attribute_paths`` that group requests in batches for
+    ``process_requests``. All the requests of a batch have the same values for them. """
+
+    enrichments = ()  # type: Sequence[Any]
+    """ (Sequence[connect.enrichment.Enrichment]) Side data fetched for every page of requests
+    before dispatching them, and attached to each request as ``request.enrichment[name]``. """
+
+    keyset = None  # type: Optional[Sequence[str]]
+    """ (Sequence[str]) Fields that sort the requests to list them by keyset, like
+    ``('created', 'id')`` (see :py:meth:`connect.resources.base.ApiClient.iter_pages`). They must
+    be top-level fields the API can filter by. If set, :py:meth:`list` gets all the requests
+    matching the filters, ``limit`` at a time, and the engine pipeline requests its pages by
+    keyset. Otherwise, :py:meth:`list` only gets the first ``limit`` requests, and the pipeline
+    requests pages by offset. """
+
+    last_listed = 0  # type: int
+    """ (int) Number of requests listed by the last call to :py:meth:`process`, including the
+    ones that were not dispatched (because they were skipped recently, assigned to another
+    replica or claimed by another worker). """
+
+    def __init__(self, config=None):
+        super(AutomationEngine, self).__init__(config)
+        # Keys of the requests skipped recently, see `_skip_key`
+        self._skipped = TTLCache(max_size=10000)
+        self.metrics = Metrics()
+
+    def __getstate__(self):
+        # The pool stays in this process, it is not copied nor sent to the workers
+        state = self.__dict__.copy()
+        state['_pool'] = None
+        state['_pool_args'] = None
+        return state
+
     def filters(self, status='pending', **kwargs):
         # type: (str, Dict[str, Any]) -> Dict[str, Any]
         return super(AutomationEngine, self).filters(status=status, **kwargs)
 
-    def process(self, filters=None):
-        # type: (Dict[str, Any]) -> None
-        for request in self.list(filters):
-            self.dispatch(request)
+    def process(self, filters=None, max_workers=None, processes=None, max_tasks_per_child=None,
+                shard=None, leases=None, journal=None, scheduler=None, bulkheads=None,
+                watermark=None):
+        """ Lists the requests matching the given filters and dispatches them.
+
+        Requests are dispatched one at a time in the calling thread, unless ``max_workers`` is
+        greater than one, in which case they are dispatched concurrently on a thread pool. In that
+        case, ``process_request`` must be thread safe. On Python 2, the thread pools come from the
+        ``futures`` package, which is installed along with the SDK.
+
+        If the engine implements ``process_requests``, requests are grouped in batches (see
+        ``batch_size`` and ``batch_keys``) that are passed to it, and then dispatched with the
+        outcome it returned for each of them. In that case, ``processes`` is ignored.
+
+        If ``processes`` is given, ``process_request`` is instead run on a pool of worker
+        processes, which is useful when it performs CPU intensive work. Requests are sent to the
+        workers encoded with :py:mod:`connect.models.codec`, and the result returned (or exception
+        raised) by ``process_request`` is sent back, so the request can be approved, inquired,
+        failed or skipped from this process. The engine is pickled once for every worker, so its
+        attributes must be picklable, and changes done to it in ``process_request`` are not
+        visible here. Workers are kept for the following calls with the same ``processes`` and
+        ``max_tasks_per_child``, until :py:meth:`close_pool` is called.
+
+        If ``bulkheads`` are given, requests are dispatched on a separate thread pool for each
+        product (or group of products), instead of on a single one, and ``max_workers`` is
+        ignored. Requests that time out are reported with a
+        :py:class:`connect.exceptions.DispatchTimeout` error, which is not raised, and are left
+        out of the following calls until they finish.
+
+        If a ``scheduler`` is given, requests are dispatched in the order it decides instead of
+        the order they were listed.
+
+        If ``leases`` is given, every request is claimed before running ``process_request``,
+        and requests already claimed by other workers or replicas are left out. Once claimed,
+        the request is fetched again, and left out too if its status changed since it was
+        listed, as happens when another replica dispatched it and released its lease in the
+        meantime. Leases are released once all requests have been dispatched.
+
+        If a ``journal`` is given, the outcome of ``process_request`` is journaled before the
+        request is approved, inquired or failed, and requests with a journaled outcome whose
+        action did not complete in a previous run replay it instead of calling
+        ``process_request`` again. In process pool mode, these are dispatched before the rest.
+
+        If a ``watermark`` is given, only the requests updated since the previous call are listed,
+        except for periodic sweeps that list all of them.
+
+        Requests skipped recently (see ``skip_ttl``) are left out right after listing them, unless
+        they have been updated since.
+
+        If dispatching some request raises an exception, it is raised right away when
+        requests are dispatched one at a time, as in previous versions. When they are dispatched
+        concurrently, the rest of requests are still dispatched, and the first exception is
+        raised once all of them have finished.
+
+        :param dict[str,Any] filters: Filters for listing the requests, or ``None`` to use
+            the default ones.
+        :param int max_workers: Maximum number of requests dispatched concurrently.
+        :param int processes: Number of worker processes running ``process_request``, or
+            ``None`` to run it in this process.
+        :param int max_tasks_per_child: Number of requests a worker process handles before
+            being replaced with a fresh one, or ``None`` to keep workers for the whole run.
+        :param connect.sharding.Shard shard: If given, only the requests assigned to this
+            replica by the shard are dispatched.
+        :param connect.leases.LeaseManager leases: If given, used to claim requests.
+        :param connect.journal.Journal journal: If given, used to journal outcomes.
+        :param connect.scheduler.Scheduler scheduler: If given, used to order requests.
+        :param connect.bulkhead.Bulkheads bulkheads: If given, used to dispatch requests.
+        :param connect.watermark.Watermark watermark: If given, used to list only the requests
+            that changed.
+        :return: The outcome of dispatching every request, in the order they were dispatched.
+        :rtype: list[DispatchOutcome]
+        """
+        if watermark:
+            filters = watermark.filters(self, filters)
+        listed = self.list(filters)
+        self.last_listed = len(listed)
+        requests = self._bypass_skipped(listed)
+        if bulkheads:
+            requests = bulkheads.bypass_in_flight(requests)
+        if shard:
+            requests = shard.select(self, requests)
+        if scheduler:
+            requests = scheduler.order(self, requests)
+        claimed = []  # type: List[str]
+        if leases:
+            requests = self._claim(requests, leases, claimed)
+        try:
+            # Only the requests this replica dispatches are prefetched
+            requests = list(requests)
+            self._prefetch(requests)
+            if self._processes_batches():
+                jobs = self._process_in_batches(requests, journal)
+            elif processes:
+                jobs = self._process_in_pool(requests, processes, max_tasks_per_child, journal)
+            else:
+                jobs = (self._make_job(request, journal) for request in requests)
+            if bulkheads:
+                outcomes = bulkheads.dispatch(self, jobs)
+            else:
+                outcomes = self._dispatch_all(jobs, max_workers, stop_on_error=True)
+        finally:
+            for key in claimed:
+                if bulkheads:
+                    # Requests that timed out keep their lease until they finish
+                    bulkheads.when_done(key, leases.release)
+                else:
+                    leases.release(key)
+        if watermark:
+            watermark.advance(self, listed)
+        return self._check_outcomes(outcomes)
+
+    def list(self, filters=None):
+        # type: (Dict[str, Any]) -> List[Any]
+        filters = filters or self.filters()
+        self.logger.info('Get list request with filters - {}'.format(filters))
+        if self.keyset:
+            params = dict(filters)
+            limit = params.pop('limit', None) or self.limit
+            with self.metrics.time('list'):
+                objects = [obj for page in self._api.iter_pages(params=params, limit=limit,
+                                                                keyset=self.keyset)
+                           for obj in page]
+            with self.metrics.time('decode'):
+                return self.model_class.deserialize_json(objects)
+        with self.metrics.time('list'):
+            response, _ = self._api.get(params=filters)
+        with self.metrics.time('decode'):
+            return self.model_class.deserialize(response)
 
     def dispatch(self, request):
         # type: (BaseModel) -> str
@@ -36,34 +234,357 @@ class AutomationEngine(BaseResource):
         raise NotImplementedError('Please implement `{}.process_request` method'
                                   .format(self.__class__.__name__))
 
+    def process_requests(self, requests):
+        # type: (List[BaseModel]) -> List[Any]
+        """ Optional hook to process a batch of requests at once, for example with the bulk
+        API of a vendor backend. If implemented, it is called instead of ``process_request``.
+
+        :param list requests: Requests of the batch, which share the values of ``batch_keys``.
+        :return: For every request, in the same order, the value that ``process_request``
+            would return for it, or the exception it would raise (like
+            :py:class:`connect.exceptions.InquireRequest`). If the method raises an exception,
+            it is used as the outcome of every request of the batch.
+        :rtype: list
+        """
+        raise NotImplementedError('Please implement `{}.process_requests` method'
+                                  .format(self.__class__.__name__))
+
     @function_log(custom_logger=logger)
     def approve(self, pk, data):
         # type: (str, dict) -> str
-        return self._api.post(path=pk + '/approve/', json=data)[0]
+        with self.metrics.time('approve'):
+            response = self._api.post(path=pk + '/approve/', json=data)[0]
+        self.metrics.set_outcome('approve')
+        return response
 
     @function_log(custom_logger=logger)
     def inquire(self, pk):
         # type: (str) -> str
-        return self._api.post(path=pk + '/inquire/', json={})[0]
+        with self.metrics.time('inquire'):
+            response = self._api.post(path=pk + '/inquire/', json={})[0]
+        self.metrics.set_outcome('inquire')
+        return response
 
     @function_log(custom_logger=logger)
     def fail(self, pk, reason):
         # type: (str, str) -> str
-        return self._api.post(path=pk + '/fail/', json={'reason': reason})[0]
+        with self.metrics.time('fail'):
+            response = self._api.post(path=pk + '/fail/', json={'reason': reason})[0]
+        self.metrics.set_outcome('fail')
+        return response
 
     @function_log(custom_logger=logger)
     def render_template(self, pk, template_id):
         # type: (str, str) -> ActivationTileResponse
         return TemplateResource(self.config).render(template_id, pk)
 
+    def _precheck(self, request):
+        # type: (BaseModel) -> Optional[str]
+        """ Called by ``dispatch`` before processing a request, and before handing it to worker
+        processes, to find requests that must not be processed, like the ones of products not
+        handled by the engine.
+
+        :return: The result of dispatching the request without processing it, or ``None`` if it
+            must be processed.
+        """
+        return None
+
+    def _prefetch(self, requests):
+        # type: (List[BaseModel]) -> None
+        """ Called with every list of requests before dispatching them, to look up at once the
+        data that ``process_request`` needs for each of them. """
+        if self.enrichments:
+            # Imported here because connect.enrichment depends on this package through the models
+            from connect.enrichment import enrich
+            enrich(self, requests, self.enrichments)
+
+    def _remember_skip(self, request, skip):
+        # type: (BaseModel, Any) -> None
+        """ Called by ``dispatch`` when ``process_request`` raises a ``SkipRequest``. """
+        self.metrics.set_outcome('skip')
+        ttl = skip.retry_after if skip.retry_after is not None else self.skip_ttl
+        if ttl:
+            self._skipped.set(self._skip_key(request), True, ttl)
+
+    def _skip_key(self, request):
+        # type: (BaseModel) -> tuple
+        # Updating a request changes its key, so it is processed again
+        path = self.attribute_paths.get('updated')
+        return request.id, get_attribute(request, path) if path else None
+
+    def _bypass_skipped(self, requests):
+        # type: (Iterable[BaseModel]) -> Iterator[BaseModel]
+        for request in requests:
+            if self._skip_key(request) in self._skipped:
+                self.logger.debug('Bypassing request {} skipped recently'.format(request.id))
+            else:
+                yield request
+
+    @staticmethod
+    def _check_outcomes(outcomes):
+        # type: (List[DispatchOutcome]) -> List[DispatchOutcome]
+        """ Raises the first error found in the outcomes, other than timeouts. """
+        # Imported here because connect.exceptions depends on this package through the models
+        from connect.exceptions import DispatchTimeout
+        errors = [outcome.error for outcome in outcomes
+                  if outcome.error and not isinstance(outcome.error, DispatchTimeout)]
+        if errors:
+            raise errors[0]
+        return outcomes
+
+    def _claim(self, requests, leases, claimed):
+        # type: (Iterable[BaseModel], Any, List[str]) -> Iterator[BaseModel]
+        for request in requests:
+            if not leases.acquire(request.id):
+                continue
+            if self._is_stale(request):
+                # Another worker dispatched the request and released its lease after this
+                # one listed it
+                self.logger.info('Request {} was already processed by another worker'
+                                 .format(request.id))
+                leases.release(request.id)
+                continue
+            claimed.append(request.id)
+            yield request
+
+    def _is_stale(self, request):
+        # type: (BaseModel) -> bool
+        """ Returns whether the status of a listed request has changed since it was listed. """
+        try:
+            with self.metrics.time('recheck'):
+                response, _ = self._api.get(path=request.id)
+            current = self.model_class.deserialize(response)
+        except Exception as ex:
+            self.logger.warning('Could not check the status of request {}: {}'
+                                .format(request.id, ex))
+            return True
+        if isinstance(current, list):
+            current = current[0] if current else None
+        return getattr(current, 'status', None) != getattr(request, 'status', None)
+
+    def _dispatch_all(self, jobs, max_workers=None, stop_on_error=False):
+        # type: (Iterable[_Job], Optional[int], bool) -> List[DispatchOutcome]
+        """ Dispatches the jobs, concurrently if ``max_workers`` is greater than one. Otherwise,
+        if ``stop_on_error`` is set, the jobs after the first one raising an error are not
+        dispatched. """
+        if max_workers and max_workers > 1:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers) as executor:
+                return list(executor.map(self._dispatch_one, jobs))
+        outcomes = []
+        for job in jobs:
+            outcomes.append(self._dispatch_one(job))
+            if stop_on_error and outcomes[-1].error is not None:
+                break
+        return outcomes
+
+    @staticmethod
+    def _dispatch_one(job):
+        # type: (_Job) -> DispatchOutcome
+        engine, request = job
+        start = time.time()
+        try:
+            with engine.metrics.dispatch(), request_context():
+                result, error = engine.dispatch(request), None
+        except Exception as ex:
+            result, error = None, ex
+        return DispatchOutcome(request.id, result, error, time.time() - start)
+
+    def _make_job(self, request, journal=None, outcome=None):
+        # type: (BaseModel, Any, Optional[tuple]) -> _Job
+        """ Returns the engine that must dispatch a request. If an outcome is given, or found in
+        the journal, it is a copy of this engine whose ``process_request`` replays it.
+        """
+        if outcome is None and journal:
+            outcome = journal.get(request.id)
+        if outcome is None and not journal:
+            return self, request
+        engine = copy.copy(self)
+        if outcome is not None:
+            engine.process_request = functools.partial(_replay, *outcome)
+        else:
+            engine.process_request = functools.partial(_record, journal, self.process_request)
+        if journal:
+            engine.dispatch = functools.partial(_complete, journal, engine.dispatch)
+        return engine, request
+
+    def _processes_batches(self):
+        # type: () -> bool
+        return six.get_unbound_function(self.__class__.process_requests) \
+            is not six.get_unbound_function(AutomationEngine.process_requests)
+
+    def _process_in_batches(self, requests, journal=None):
+        # type: (Iterable[BaseModel], Any) -> Iterator[_Job]
+        """ Groups requests in batches, calls ``process_requests`` with each one, and yields
+        every request together with a copy of this engine whose ``process_request`` replays the
+        outcome returned for it.
+        """
+        paths = [self.attribute_paths[key] for key in self.batch_keys
+                 if key in self.attribute_paths]
+        batches = OrderedDict()  # type: Dict[tuple, List[BaseModel]]
+        for request in requests:
+            if self._precheck(request) is not None:
+                # Requests that must not be processed are not passed to ``process_requests``
+                yield self, request
+                continue
+            outcome = journal.get(request.id) if journal else None
+            if outcome is not None:
+                yield self._make_job(request, journal, outcome)
+                continue
+            key = tuple(get_attribute(request, path) for path in paths)
+            batch = batches.setdefault(key, [])
+            batch.append(request)
+            if len(batch) >= self.batch_size:
+                for job in self._process_batch(batches.pop(key), journal):
+                    yield job
+        for batch in batches.values():
+            for job in self._process_batch(batch, journal):
+                yield job
+
+    def _process_batch(self, batch, journal=None):
+        # type: (List[BaseModel], Any) -> Iterator[_Job]
+        try:
+            with self.metrics.time('process_requests'):
+                results = list(self.process_requests(batch))
+            if len(results) != len(batch):
+                raise ValueError('`{}.process_requests` returned {} results for {} requests'
+                                 .format(self.__class__.__name__, len(results), len(batch)))
+            outcomes = [(None, result) if isinstance(result, Exception) else (result, None)
+                        for result in results]
+        except Exception as ex:
+            outcomes = [(None, ex)] * len(batch)
+        for request, (result, error) in zip(batch, outcomes):
+            if journal and journal.should_record(result, error):
+                journal.record(request.id, result, error)
+            yield self._make_job(request, journal, (result, error))
+
+    def _process_in_pool(self, requests, processes, max_tasks_per_child=None, journal=None):
+        # type: (Iterable[BaseModel], int, Optional[int], Any) -> Iterator[_Job]
+        """ Runs ``process_request`` for every request on a pool of worker processes, and
+        yields each request together with a copy of this engine whose ``process_request``
+        replays what happened in the worker.
+        """
+        from connect.models import codec
+
+        # Requests that must not be processed, or have a journaled outcome, do not need to go
+        # through the pool
+        pending = []
+        for request in requests:
+            outcome = journal.get(request.id) if journal else None
+            if self._precheck(request) is not None:
+                yield self, request
+            elif outcome is not None:
+                yield self._make_job(request, journal, outcome)
+            else:
+                pending.append(request)
+        requests = pending
+        if not requests:
+            return
+        pool = self._get_pool(processes, max_tasks_per_child)
+
+        # Requests are consumed by the pool in a separate thread, and results come back in order
+        sent = deque()
+
+        def encode():
+            for req in requests:
+                sent.append(req)
+                try:
+                    yield codec.dumps([req, req.enrichment])
+                except TypeError:
+                    # Enrichments holding values the codec cannot encode are fetched again in
+                    # the worker
+                    yield codec.dumps([req, None])
+
+        try:
+            for result, error in pool.imap(_process_in_worker, encode()):
+                request = sent.popleft()
+                if journal and journal.should_record(result, error):
+                    journal.record(request.id, result, error)
+                yield self._make_job(request, journal, (result, error))
+        except BaseException:
+            self.close_pool()
+            raise
+
+    def _get_pool(self, processes, max_tasks_per_child):
+        # type: (int, Optional[int]) -> Any
+        """ Returns the pool of worker processes, starting it if there is none with the same
+        arguments. """
+        import multiprocessing
+
+        args = (processes, max_tasks_per_child)
+        if self._pool is not None and self._pool_args != args:
+            self.close_pool()
+        if self._pool is None:
+            self._pool = multiprocessing.Pool(
+                processes,
+                initializer=_init_worker,
+                initargs=(pickle.dumps(self, pickle.HIGHEST_PROTOCOL),),
+                maxtasksperchild=max_tasks_per_child)
+            self._pool_args = args
+        return self._pool
+
+    def close_pool(self):
+        # type: () -> None
+        """ Stops the worker processes started by ``process``, if any. """
+        pool, self._pool, self._pool_args = self._pool, None, None
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
     def _set_custom_logger(self, *args):
-        handlers = [copy.copy(hdlr) for hdlr in global_logger.handlers]
-        log_level = global_logger.level
-        self.__class__.logger.setLevel(log_level)
-        self.__class__.logger.propagate = False
-        self.__class__.logger.handlers = handlers
-        base = " %(levelname)-6s; %(asctime)s; %(name)-6s; %(module)s:%(funcName)s:line" \
-               "-%(lineno)d: %(message)s"
-        sformat = " ".join(args) + base
-        [handler.setFormatter(logging.Formatter(sformat, "%I:%M:%S"))
-         for handler in self.__class__.logger.handlers]
+        # The context is kept per thread and added to the records by the filter and formatter
+        # of the global handlers, so the cost does not depend on the handlers
+        set_request_context(*args)
+
+
+_worker_engine = None  # type: AutomationEngine
+
+
+def _init_worker(pickled_engine):
+    global _worker_engine
+    _worker_engine = pickle.loads(pickled_engine)
+
+
+def _process_in_worker(encoded_request):
+    # type: (bytes) -> Tuple[Any, Optional[Exception]]
+    from connect.models import codec
+    request, enrichment = codec.loads(encoded_request)
+    if enrichment is not None:
+        request.__dict__['_enrichment'] = _FrozenDict(enrichment)
+    else:
+        _worker_engine._prefetch([request])
+    try:
+        outcome = _worker_engine.process_request(request), None
+    except Exception as ex:
+        outcome = None, ex
+
+    # Make sure that the outcome survives the trip back to the parent process
+    try:
+        pickle.loads(pickle.dumps(outcome, pickle.HIGHEST_PROTOCOL))
+        return outcome
+    except Exception:
+        result, error = outcome
+        return None, RuntimeError('{}: {}'.format(type(error or result).__name__, error or result))
+
+
+def _replay(result, error, _request):
+    if error:
+        raise error
+    return result
+
+
+def _record(journal, process_request, request):
+    try:
+        result, error = process_request(request), None
+    except Exception as ex:
+        result, error = None, ex
+    if journal.should_record(result, error):
+        journal.record(request.id, result, error)
+    return _replay(result, error, request)
+
+
+def _complete(journal, dispatch, request):
+    result = dispatch(request)
+    if result:
+        journal.complete(request.id)
+    return result
@@ -4,8 +4,9 @@
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
 import functools
+import json
 import logging
-from typing import Any, List, Dict, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import requests
 from requests import compat
@@ -16,6 +17,9 @@ from connect.logger import function_log
 from connect.models.base import BaseModel
 from connect.models.server_error_response import ServerErrorResponse
 
+# Decoded JSON objects of a page of a list
+_Page = List[Dict[str, Any]]
+
 
 class ApiClient(object):
     def __init__(self, config, base_path):
@@ -67,6 +71,83 @@ class ApiClient(object):
         response = requests.get(**kwargs)
         return self._check_and_pack_response(response)
 
+    def iter_pages(self, path='', params=None, limit=100, keyset=None):
+        # type: (str, Dict[str, Any], int, Optional[Sequence[str]]) -> Iterator[_Page]
+        """ Iterates over a paginated list, yielding the decoded JSON objects of each page
+        without building models for them. Iteration stops after the first page holding
+        less than ``limit`` objects.
+
+        By default, pages are requested by offset. If objects enter or leave the list while
+        iterating (like pending requests being approved), offset pages shift, so objects are
+        skipped or repeated. Passing a ``keyset`` orders the list by the given fields and
+        requests every page from the key of the last object seen instead, which stays correct
+        while the list changes and costs the same for every page. As the API cannot filter by
+        a compound key at once, objects after the last key ``(created, id)`` are requested
+        first with ``created=<created>&id__gt=<id>``, and once those are exhausted with
+        ``created__gt=<created>``, so a key with more fields may take an extra short request
+        per field.
+
+        :param str path: Path of the list.
+        :param dict[str,Any] params: Filters.
+        :param int limit: Number of objects requested per page.
+        :param Sequence[str] keyset: Dotted paths of the fields that sort the list, like
+            ``('created', 'id')``. The last one must be unique, and every object must have a
+            value for all of them.
+        """
+        params = dict(params or {})
+        params['limit'] = limit
+        if keyset:
+            return self._iter_keyset_pages(path, params, limit, list(keyset))
+        return self._iter_offset_pages(path, params, limit)
+
+    def _iter_offset_pages(self, path, params, limit):
+        # type: (str, Dict[str, Any], int) -> Iterator[_Page]
+        offset = params.pop('offset', 0)
+        while True:
+            params['offset'] = offset
+            page = self._get_page(path, params)
+            if page:
+                yield page
+            if len(page) < limit:
+                break
+            offset += len(page)
+
+    def _iter_keyset_pages(self, path, params, limit, keyset):
+        # type: (str, Dict[str, Any], int, List[str]) -> Iterator[_Page]
+        params.pop('offset', None)
+        params['order_by'] = ','.join(keyset)
+        last = None  # type: Optional[tuple]
+        # Index of the field compared with ``__gt``, the ones before it are compared for equality
+        level = len(keyset) - 1
+        while True:
+            query = dict(params)
+            # The first page is not filtered, like seeking at the first field
+            if last is None:
+                level = 0
+            else:
+                query.update(zip(keyset[:level], last[:level]))
+                query['{}__gt'.format(keyset[level])] = last[level]
+            page = self._get_page(path, query)
+            if page:
+                yield page
+                last = _get_key(page[-1], keyset)
+            if len(page) >= limit:
+                level = len(keyset) - 1
+            elif level == 0:
+                break
+            else:
+                # No more objects share the first fields of the last key, seek past them
+                level -= 1
+
+    def _get_page(self, path, params):
+        # type: (str, Dict[str, Any]) -> _Page
+        text, _ = self.get(path, params=dict(params))
+        page = json.loads(text)
+        if not isinstance(page, list):
+            raise TypeError('Expected a list of objects in paginated response, got `{}`'
+                            .format(type(page).__name__))
+        return page
+
     @function_log()
     def post(self, path='', **kwargs):
         # type: (str, Any) -> Tuple[str, int]
@@ -163,3 +244,17 @@ class BaseResource(object):
         self.logger.info('Get list request with filters - {}'.format(filters))
         response, _ = self._api.get(params=filters)
         return self.model_class.deserialize(response)
+
+
+def _get_key(obj, keyset):
+    # type: (Dict[str, Any], List[str]) -> tuple
+    key = []
+    for path in keyset:
+        value = obj
+        for name in path.split('.'):
+            value = value.get(name) if isinstance(value, dict) else None
+        if value is None:
+            raise ValueError('Object `{}` has no value for the keyset field `{}`'
+                             .format(obj.get('id'), path))
+        key.append(value)
+    return tuple(key)
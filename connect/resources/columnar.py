@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+
+class ColumnBuilder(object):
+    """ Accumulates raw JSON objects (as returned by the API, before deserialization into models)
+    into column arrays.
+
+    Columns are specified as dotted paths into each object, like ``'product.id'`` or
+    ``'tiers.tier1.id'``. When a path traverses a list, the next path component selects the
+    element with that ``id`` (or index, if it is a number), so ``'params.seats.value'`` is the
+    value of the parameter with id ``seats``.
+
+    If ``explode`` is the name of a list field (like ``'items'``), one row is generated for
+    every element in that list, and columns starting with ``explode + '.'`` are resolved against
+    the element instead of the object that contains it.
+
+    :param Sequence[str] columns: Column paths.
+    :param str explode: Optional name of a list field to explode into rows.
+    :param dict[str,Callable] converters: Optional functions used to convert the values of
+        some columns (for example, ``{'items.quantity': int}``). They are not called for
+        missing values.
+    """
+
+    OUTPUTS = ('dict', 'numpy', 'pandas', 'arrow')
+
+    def __init__(self, columns, explode=None, converters=None):
+        # type: (Sequence[str], Optional[str], Optional[Dict[str, Callable]]) -> None
+        if not columns:
+            raise ValueError('At least one column must be specified')
+        self._columns = list(columns)
+        self._explode = explode
+        self._data = OrderedDict((column, []) for column in self._columns)
+        self._paths = [self._split(column) for column in self._columns]
+        self._converters = [(converters or {}).get(column) for column in self._columns]
+
+    @property
+    def columns(self):
+        # type: () -> List[str]
+        return list(self._columns)
+
+    def __len__(self):
+        return len(self._data[self._columns[0]])
+
+    def add(self, obj):
+        # type: (Dict[str, Any]) -> None
+        """ Adds the rows generated by one object. """
+        if self._explode:
+            for element in _get_path(obj, [self._explode]) or []:
+                self._add_row(obj, element)
+        else:
+            self._add_row(obj, None)
+
+    def _add_row(self, obj, element):
+        columns = zip(self._columns, self._paths, self._converters)
+        for column, (in_element, path), converter in columns:
+            value = _get_path(element if in_element else obj, path)
+            if converter and value is not None:
+                value = converter(value)
+            self._data[column].append(value)
+
+    def add_page(self, page):
+        # type: (List[Dict[str, Any]]) -> None
+        """ Adds the rows generated by all objects in a page. """
+        for obj in page:
+            self.add(obj)
+
+    def build(self, output='dict'):
+        """ Returns the accumulated columns.
+
+        :param str output: One of:
+
+          - ``'dict'``: An ordered dict mapping column names to lists of values.
+          - ``'numpy'``: A NumPy structured array, with one field per column.
+          - ``'pandas'``: A pandas DataFrame.
+          - ``'arrow'``: A PyArrow Table.
+
+        :return: The columns in the requested format.
+        :raises ValueError: Raised if the output format is not supported.
+        :raises ImportError: Raised if the library required by the output format is not
+            installed.
+        """
+        if output == 'dict':
+            return OrderedDict((column, list(values)) for column, values in self._data.items())
+        elif output == 'numpy':
+            return self._build_numpy()
+        elif output == 'pandas':
+            pandas = _import_optional('pandas', output)
+            return pandas.DataFrame(self._data, columns=self._columns)
+        elif output == 'arrow':
+            pyarrow = _import_optional('pyarrow', output)
+            return pyarrow.table(
+                [pyarrow.array(values) for values in self._data.values()],
+                names=self._columns)
+        else:
+            raise ValueError('Invalid output format `{}`. Valid values are: {}'
+                             .format(output, ', '.join(self.OUTPUTS)))
+
+    def _build_numpy(self):
+        numpy = _import_optional('numpy', 'numpy')
+        arrays = []
+        for values in self._data.values():
+            if any(value is None or isinstance(value, (dict, list)) for value in values):
+                array = numpy.array(values, dtype=object)
+            else:
+                array = numpy.array(values)
+                if array.dtype.kind in ('U', 'S'):
+                    array = array.astype(object)
+            arrays.append(array)
+        dtype = [(str(column), array.dtype) for column, array in zip(self._columns, arrays)]
+        result = numpy.empty(len(self), dtype=dtype)
+        for column, array in zip(self._columns, arrays):
+            result[str(column)] = array
+        return result
+
+    def _split(self, column):
+        path = column.split('.')
+        if self._explode and path[0] == self._explode and len(path) > 1:
+            return True, path[1:]
+        return False, path
+
+
+def _get_path(obj, path):
+    for key in path:
+        if isinstance(obj, dict):
+            obj = obj.get(key)
+        elif isinstance(obj, list):
+            if key.isdigit():
+                index = int(key)
+                obj = obj[index] if index < len(obj) else None
+            else:
+                obj = next((elem for elem in obj
+                            if isinstance(elem, dict) and elem.get('id') == key), None)
+        else:
+            return None
+        if obj is None:
+            return None
+    return obj
+
+
+def _import_optional(module_name, output):
+    try:
+        return __import__(module_name)
+    except ImportError:
+        raise ImportError('Output format `{}` requires the `{}` package to be installed'
+                          .format(output, module_name))
@@ -8,6 +8,7 @@ from connect.models.asset import Asset
 from connect.models.product import Product
 from connect.models.tier_config import TierConfig
 from connect.resources.base import ApiClient
+from connect.resources.columnar import ColumnBuilder
 
 
 class Directory(object):
@@ -18,6 +19,13 @@ class Directory(object):
 
     _config = None  # type: Config
 
+    ASSET_COLUMNS = ('id', 'status', 'product.id', 'marketplace.id', 'contract.id',
+                     'tiers.customer.id', 'tiers.tier1.id', 'tiers.tier2.id')
+    """ Default columns of :py:meth:`assets_frame`. """
+
+    ASSET_ITEM_COLUMNS = ('id', 'product.id', 'items.id', 'items.mpn', 'items.quantity')
+    """ Default columns of :py:meth:`assets_frame` when exploding items. """
+
     def __init__(self, config=None):
         self._config = config or Config.get_instance()
 
@@ -28,12 +36,46 @@ class Directory(object):
         :return: A list with the assets that match the given filters.
         :rtype: list[Asset]
         """
+        text, code = self._get_assets_client().get(params=filters)
+        return Asset.deserialize(text)
+
+    def assets_frame(self, filters=None, columns=None, explode=None, converters=None,
+                     output='dict', page_size=100):
+        """ Lists the assets in columnar form. Pages are streamed straight into the columns,
+        without creating a model for each asset, so it can be used to analyze large numbers
+        of assets. For example, to get the quantities of all items of all assets as a
+        pandas DataFrame: ::
+
+            Directory().assets_frame(
+                columns=['id', 'product.id', 'items.mpn', 'items.quantity'],
+                explode='items',
+                converters={'items.quantity': float},
+                output='pandas')
+
+        :param dict[str,Any] filters: Filters to pass to the request.
+        :param list[str] columns: Column paths (see :py:class:`.ColumnBuilder`). By default,
+            ``ASSET_COLUMNS`` (or ``ASSET_ITEM_COLUMNS`` when exploding ``'items'``).
+        :param str explode: Optional name of a list field of the asset (like ``'items'``
+            or ``'params'``) to generate one row per element.
+        :param dict[str,Callable] converters: Optional value converters for some columns.
+        :param str output: One of ``'dict'``, ``'numpy'``, ``'pandas'`` or ``'arrow'``.
+        :param int page_size: Number of assets requested per page.
+        :return: The columns in the requested format.
+        """
+        if not columns:
+            columns = self.ASSET_ITEM_COLUMNS if explode == 'items' else self.ASSET_COLUMNS
+        builder = ColumnBuilder(columns, explode, converters)
+        for page in self._get_assets_client().iter_pages(params=filters, limit=page_size):
+            builder.add_page(page)
+        return builder.build(output)
+
+    def _get_assets_client(self):
+        # type: () -> ApiClient
         products = ','.join(self._config.products) if self._config.products else None
         url = self._config.api_url + 'assets?in(product.id,(' + products + '))' \
             if products \
             else 'assets'
-        text, code = ApiClient(self._config, url).get(params=filters)
-        return Asset.deserialize(text)
+        return ApiClient(self._config, url)
 
     def get_asset(self, asset_id):
         """ Returns the asset with the given id.
@@ -51,6 +93,8 @@ class Directory(object):
         :return: A list with all products.
         :rtype: list[Product]
         """
+        if Product.cache is not None:
+            return Product.deserialize(Product.cache.fetch(self._config, 'products'))
         text, code = ApiClient(self._config, 'products').get()
         return Product.deserialize(text)
 
@@ -61,6 +105,9 @@ class Directory(object):
         :return: The product with the given id, or ``None`` if such product does not exist.
         :rtype: Product|None
         """
+        if Product.cache is not None:
+            return Product.deserialize(
+                Product.cache.fetch(self._config, 'products/' + product_id))
         text, code = ApiClient(self._config, 'products/' + product_id).get()
         return Product.deserialize(text)
 
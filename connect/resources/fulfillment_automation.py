@@ -4,17 +4,20 @@
 # Copyright (c) 2019 Ingram Micro. All Rights Reserved.
 
 from abc import ABCMeta
+import hashlib
 import logging
 
 from deprecation import deprecated
-from typing import Optional
+from typing import Callable, List, Optional
 
+from connect.cache import TTLCache
 from connect.exceptions import FailRequest, InquireRequest, SkipRequest
 from connect.logger import function_log
 from connect.models.activation_template_response import ActivationTemplateResponse
 from connect.models.activation_tile_response import ActivationTileResponse
 from connect.models.param import Param
 from connect.models.fulfillment import Fulfillment
+from connect.models.tier_config import TierConfig
 from connect.models.tier_config_request import TierConfigRequest
 from connect.models.conversation import Conversation
 from .automation_engine import AutomationEngine
@@ -33,6 +36,11 @@ class FulfillmentAutomation(AutomationEngine):
     - :py:class:`connect.exceptions.FailRequest`: Causes the request to fail.
     - :py:class:`connect.exceptions.SkipRequest`: Skips processing the request.
 
+    If your backend can process many requests at once, implement ``process_requests`` instead,
+    which receives a batch of requests for the same product and type, and returns the result (or
+    the exception) for each of them. Requests are then approved, inquired, failed or skipped
+    the same way.
+
     Create an instance of your subclass and call its ``process`` method to begin processing.
 
     For an example on how to use this class, see :ref:`fulfillment_example`.
@@ -42,6 +50,25 @@ class FulfillmentAutomation(AutomationEngine):
     resource = 'requests'
     model_class = Fulfillment
     logger = logging.getLogger('Fullfilment.logger')
+    attribute_paths = {'id': 'id', 'asset': 'asset.id', 'product': 'asset.product.id',
+                       'marketplace': 'marketplace.id', 'type': 'type', 'created': 'created',
+                       'updated': 'updated'}
+
+    keyset = ('created', 'id')
+
+    conversation_sink = None  # type: Optional[Callable[[Fulfillment, str], None]]
+    """ (Callable[[Fulfillment,str],None]) If set, conversation messages are passed to this
+    function (with the request they refer to) instead of being added to the conversation of the
+    request by ``dispatch``. Used to post messages in a separate stage, see
+    :py:class:`connect.pipeline.EnginePipeline`. """
+
+    conversation_ttl = 3600  # type: float
+    """ (float) Seconds the conversation of a request is remembered after being looked up. """
+
+    def __init__(self, config=None):
+        super(FulfillmentAutomation, self).__init__(config)
+        # Request id -> (conversation id, digest of its last message)
+        self._conversations = TTLCache(self.conversation_ttl)
 
     def filters(self, status='pending', **kwargs):
         """ Returns the default set of filters for Fulfillment request, plus any others that you
@@ -79,15 +106,14 @@ class FulfillmentAutomation(AutomationEngine):
         # type: (Fulfillment) -> str
         self._set_custom_logger(request.asset.id, request.id)
 
-        conversation = request.get_conversation(self.config)
-
         try:
-            if self.config.products \
-                    and request.asset.product.id not in self.config.products:
-                return 'Invalid product'
+            precheck = self._precheck(request)
+            if precheck is not None:
+                return precheck
 
             self.logger.info('Start request process / ID request - {}'.format(request.id))
-            process_result = self.process_request(request)
+            with self.metrics.time('process_request'):
+                process_result = self.process_request(request)
 
             if not process_result:
                 self.logger.info('Method `process_request` did not return result')
@@ -104,30 +130,32 @@ class FulfillmentAutomation(AutomationEngine):
                 message = ''
                 approved = ''
 
-            self._update_conversation_if_exists(conversation, request.id, message)
+            self._update_conversation_if_exists(request, message)
             return approved
 
         except InquireRequest as inquire:
             self.update_parameters(request.id, inquire.params)
             inquired = self.inquire(request.id)
-            self._update_conversation_if_exists(conversation, request.id, inquire)
+            self._update_conversation_if_exists(request, inquire)
             return inquired
 
         except FailRequest as fail:
             # PyCharm incorrectly detects unreachable code here, so disable
             # noinspection PyUnreachableCode
             failed = self.fail(request.id, reason=str(fail))
-            self._update_conversation_if_exists(conversation, request.id, fail)
+            self._update_conversation_if_exists(request, fail)
             return failed
 
         except SkipRequest as skip:
-            self._update_conversation_if_exists(conversation, request.id, skip)
+            self._remember_skip(request, skip)
+            self._update_conversation_if_exists(request, skip)
             return skip.code
 
         except NotImplementedError:
             raise
 
         except Exception as ex:
+            self.metrics.set_outcome('error')
             self.logger.warning('Skipping request {} because an exception was raised: {}'
                                 .format(request.id, ex))
             return ''
@@ -156,6 +184,9 @@ class FulfillmentAutomation(AutomationEngine):
         :return: The requested Tier Config, or ``None`` if it was not found.
         :rtype: Optional[TierConfig]
         """
+        if TierConfig.cache is not None:
+            return TierConfig.cache.get(tier_id, product_id, self.config)
+
         url = self._api.urljoin(self.config.api_url, 'tier/config-requests')
         params = {
             'status': 'approved',
@@ -181,17 +212,76 @@ class FulfillmentAutomation(AutomationEngine):
         """
         list_dict = []
         for _ in params:
-            list_dict.append(_.__dict__ if isinstance(_, Param) else _)
-        return self._api.put(
-            path=pk,
-            json={'asset': {'params': list_dict}},
-        )[0]
-
-    def _update_conversation_if_exists(self, conversation, request_id, obj):
-        # type: (Optional[Conversation], str, object) -> None
-        if conversation:
+            list_dict.append(_.json if isinstance(_, Param) else _)
+        with self.metrics.time('update_parameters'):
+            return self._api.put(
+                path=pk,
+                json={'asset': {'params': list_dict}},
+            )[0]
+
+    def _precheck(self, request):
+        # type: (Fulfillment) -> Optional[str]
+        if self.config.products \
+                and request.asset.product.id not in self.config.products:
+            return 'Invalid product'
+        return None
+
+    def _prefetch(self, requests):
+        # type: (List[Fulfillment]) -> None
+        if TierConfig.cache is not None:
+            with self.metrics.time('prefetch_tier_configs'):
+                TierConfig.cache.prefetch_requests(requests, self.config)
+        super(FulfillmentAutomation, self)._prefetch(requests)
+
+    def _update_conversation_if_exists(self, request, obj):
+        # type: (Fulfillment, object) -> None
+        if self.conversation_sink:
+            self.conversation_sink(request, str(obj))
+        else:
+            self._add_conversation_message(request, str(obj))
+
+    def _add_conversation_message(self, request, message):
+        # type: (Fulfillment, str) -> None
+        """ Adds a message to the conversation of the request, unless it is the same as the last
+        one. The conversation is only looked up the first time, after that its id and a digest
+        of the last message are taken from the cache. Errors are logged and not raised, so they
+        do not change the outcome of the action the message is about.
+        """
+        entry = self._conversations.get(request.id)
+        if entry is None:
             try:
-                conversation.add_message(str(obj))
-            except TypeError as ex:
+                with self.metrics.time('conversation_lookup'):
+                    conversation = request.get_conversation(self.config)
+            except Exception as ex:
+                self.logger.error('Error getting conversation for request {}: {}'
+                                  .format(request.id, ex))
+                return
+            entry = self._remember_conversation(request.id, conversation)
+
+        conversation_id, last_digest = entry
+        digest = _digest(message)
+        if conversation_id and digest != last_digest:
+            try:
+                with self.metrics.time('conversation_post'):
+                    Conversation(id=conversation_id, messages=[]).add_message(message, self.config)
+                self._conversations.set(request.id, (conversation_id, digest))
+            except Exception as ex:
                 self.logger.error('Error updating conversation for request {}: {}'
-                                  .format(request_id, ex))
+                                  .format(request.id, ex))
+
+    def _remember_conversation(self, request_id, conversation):
+        # type: (str, Optional[Conversation]) -> tuple
+        """ Caches the id and the digest of the last message of the conversation of a request,
+        or that it has none. """
+        if conversation:
+            last = conversation.messages[-1].text if conversation.messages else None
+            entry = conversation.id, _digest(last)
+        else:
+            entry = None, None
+        self._conversations.set(request_id, entry)
+        return entry
+
+
+def _digest(message):
+    # type: (Optional[str]) -> Optional[str]
+    return hashlib.sha1(message.encode('utf-8')).hexdigest() if message is not None else None
@@ -6,11 +6,14 @@
 from abc import ABCMeta
 import logging
 
+from typing import Optional
+
 from connect.exceptions import FailRequest, InquireRequest, SkipRequest
 from connect.logger import function_log
 from connect.models.activation_template_response import ActivationTemplateResponse
 from connect.models.activation_tile_response import ActivationTileResponse
 from connect.models.param import Param
+from connect.models.tier_config import TierConfig
 from connect.models.tier_config_request import TierConfigRequest
 from .automation_engine import AutomationEngine
 
@@ -28,6 +31,11 @@ class TierConfigAutomation(AutomationEngine):
     - :py:class:`connect.exceptions.FailRequest`: Causes the request to fail.
     - :py:class:`connect.exceptions.SkipRequest`: Skips processing the request.
 
+    If your backend can process many requests at once, implement ``process_requests`` instead,
+    which receives a batch of requests for the same product and type, and returns the result (or
+    the exception) for each of them. Requests are then approved, inquired, failed or skipped
+    the same way.
+
     Create an instance of your subclass and call its ``process`` method to begin processing.
 
     For an example on how to use this class, see :ref:`tier_config_example`.
@@ -37,6 +45,10 @@ class TierConfigAutomation(AutomationEngine):
     resource = 'tier/config-requests'
     model_class = TierConfigRequest
     logger = logging.getLogger('Tier.logger')
+    attribute_paths = {'id': 'id', 'account': 'configuration.account.id',
+                       'product': 'configuration.product.id',
+                       'marketplace': 'configuration.marketplace.id', 'type': 'type',
+                       'created': 'events.created.at', 'updated': 'events.updated.at'}
 
     def filters(self, status='pending', **kwargs):
         """ Returns the default set of filters for Tier Config request, plus any others that you
@@ -70,13 +82,14 @@ class TierConfigAutomation(AutomationEngine):
             self._set_custom_logger(request.id, request.configuration.id,
                                     request.configuration.account.id)
 
-            if self.config.products \
-                    and request.configuration.product.id not in self.config.products:
-                return 'Invalid product'
+            precheck = self._precheck(request)
+            if precheck is not None:
+                return precheck
 
             self.logger.info(
                 'Start tier config request process / ID request - {}'.format(request.id))
-            result = self.process_request(request)
+            with self.metrics.time('process_request'):
+                result = self.process_request(request)
 
             if not result:
                 self.logger.info('Method `process_request` did not return result')
@@ -88,7 +101,9 @@ class TierConfigAutomation(AutomationEngine):
             elif isinstance(result, ActivationTemplateResponse):
                 params = {'template': {'id': result.template_id}}
 
-            self.approve(request.id, params)
+            response = self.approve(request.id, params)
+            self._invalidate_tier_config(request)
+            return response
 
         except InquireRequest as inquire:
             self.update_parameters(request.id, inquire.params)
@@ -98,18 +113,18 @@ class TierConfigAutomation(AutomationEngine):
             return self.fail(request.id, reason=str(fail))
 
         except SkipRequest as skip:
+            self._remember_skip(request, skip)
             return skip.code
 
         except NotImplementedError:
             raise
 
         except Exception as ex:
+            self.metrics.set_outcome('error')
             self.logger.warning('Skipping request {} because an exception was raised: {}'
                                 .format(request.id, ex))
             return ''
 
-        return ''
-
     @function_log(custom_logger=logger)
     def update_parameters(self, pk, params):
         """ Sends a list of Param objects to Connect for updating.
@@ -121,9 +136,29 @@ class TierConfigAutomation(AutomationEngine):
         """
         list_dict = []
         for _ in params:
-            list_dict.append(_.__dict__ if isinstance(_, Param) else _)
-
-        return self._api.put(
-            path=pk,
-            json={'params': list_dict},
-        )[0]
+            list_dict.append(_.json if isinstance(_, Param) else _)
+
+        with self.metrics.time('update_parameters'):
+            return self._api.put(
+                path=pk,
+                json={'params': list_dict},
+            )[0]
+
+    def _precheck(self, request):
+        # type: (TierConfigRequest) -> Optional[str]
+        if self.config.products \
+                and request.configuration.product.id not in self.config.products:
+            return 'Invalid product'
+        return None
+
+    def _invalidate_tier_config(self, request):
+        # type: (TierConfigRequest) -> None
+        # The request is already approved, so errors must not change the result of dispatch
+        if TierConfig.cache is None:
+            return
+        try:
+            TierConfig.cache.invalidate(request.configuration.account.id,
+                                        request.configuration.product.id)
+        except Exception as ex:
+            self.logger.warning('Could not invalidate the cached tier config of request {}: {}'
+                                .format(request.id, ex))
@@ -13,6 +13,7 @@ import requests
 from typing import List, Optional
 
 from connect.exceptions import FileCreationError, FileRetrievalError
+from connect.models.product import Product
 from connect.models.usage_listing import UsageListing
 from connect.models.usage_file import UsageFile
 from connect.models.usage_record import UsageRecord
@@ -29,6 +30,8 @@ class UsageAutomation(AutomationEngine):
     resource = 'listings'
     model_class = UsageFile
     logger = logging.getLogger('Usage.logger')
+    attribute_paths = {'id': 'id', 'contract': 'contract.id', 'product': 'product.id',
+                       'marketplace': 'contract.marketplace.id', 'created': 'created_at'}
 
     def filters(self, status='listed', **kwargs):
         """
@@ -48,9 +51,9 @@ class UsageAutomation(AutomationEngine):
         self._set_custom_logger(request.id, request.contract.marketplace.id)
 
         # TODO Shouldn't this raise an exception on ALL automation classes?
-        if self.config.products \
-                and request.product.id not in self.config.products:
-            return 'Listing not handled by this processor'
+        precheck = self._precheck(request)
+        if precheck is not None:
+            return precheck
 
         self.logger.info(
             'Processing Usage for Product {} ({}) '.format(request.product.id,
@@ -59,8 +62,10 @@ class UsageAutomation(AutomationEngine):
             'and provider {}({})'.format(request.provider.id, request.provider.name))
 
         try:
-            result = self.process_request(request)
+            with self.metrics.time('process_request'):
+                result = self.process_request(request)
         except FileCreationError:
+            self.metrics.set_outcome('fail')
             self.logger.info(
                 'Error processing Usage for Product {} ({}) '.format(request.product.id,
                                                                      request.product.name) +
@@ -70,6 +75,7 @@ class UsageAutomation(AutomationEngine):
 
         self.logger.info('Processing result for usage on listing {}: {}'
                          .format(request.product.id, result))
+        self.metrics.set_outcome('success')
         return 'success'
 
     def get_usage_template(self, product):
@@ -80,6 +86,21 @@ class UsageAutomation(AutomationEngine):
         :rtype: bytes
         :raises FileRetrievalError: Raised if the file contents could not be retrieved.
         """
+        if Product.cache is not None:
+            return Product.cache.fetch(
+                self.config, 'usage/products/{}/template/'.format(product.id),
+                load=lambda: self._load_usage_template(product))
+        return self._load_usage_template(product)
+
+    def _precheck(self, request):
+        # type: (UsageListing) -> Optional[str]
+        if self.config.products \
+                and request.product.id not in self.config.products:
+            return 'Listing not handled by this processor'
+        return None
+
+    def _load_usage_template(self, product):
+        # type: (Product) -> bytes
         location = self._get_usage_template_download_location(product.id)
         if not location:
             msg = 'Error obtaining template usage file location'
@@ -7,6 +7,8 @@ import json
 import logging
 from abc import ABCMeta
 
+from typing import Optional
+
 from connect.exceptions import SkipRequest, UsageFileAction
 from connect.models.base import BaseModel
 from connect.models.usage_file import UsageFile
@@ -23,6 +25,9 @@ class UsageFileAutomation(AutomationEngine):
     resource = 'usage/files'
     model_class = UsageFile
     logger = logging.getLogger('UsageFile.logger')
+    attribute_paths = {'id': 'id', 'contract': 'contract.id', 'product': 'product.id',
+                       'marketplace': 'marketplace.id', 'created': 'created_at',
+                       'updated': 'events.updated.at'}
 
     def filters(self, status='ready', **kwargs):
         """
@@ -43,14 +48,15 @@ class UsageFileAutomation(AutomationEngine):
 
         try:
             # Validate product
-            if self.config.products \
-                    and request.product.id not in self.config.products:
-                return 'Invalid product'
+            precheck = self._precheck(request)
+            if precheck is not None:
+                return precheck
 
             # Process request
             self.logger.info(
                 'Start usage file request process / ID request - {}'.format(request.id))
-            result = self.process_request(request)
+            with self.metrics.time('process_request'):
+                result = self.process_request(request)
 
             # Report that expected exception was not raised
             processing_result = 'UsageFileAutomation.process_request returned {} while ' \
@@ -61,17 +67,27 @@ class UsageFileAutomation(AutomationEngine):
 
         # Catch action
         except UsageFileAction as usage:
-            self._api.post(
-                path='{}/{}'.format(request.id, usage.code),
-                data=json.dumps(usage.obj.json
-                                if isinstance(usage.obj, BaseModel)
-                                else usage.obj))
+            with self.metrics.time(usage.code):
+                self._api.post(
+                    path='{}/{}'.format(request.id, usage.code),
+                    data=json.dumps(usage.obj.json
+                                    if isinstance(usage.obj, BaseModel)
+                                    else usage.obj))
+            self.metrics.set_outcome(usage.code)
             processing_result = usage.code
 
         # Catch skip
-        except SkipRequest:
+        except SkipRequest as skip:
+            self._remember_skip(request, skip)
             processing_result = 'skip'
 
         self.logger.info('Finished processing of usage file with ID {} with result {}'
                          .format(request.id, processing_result))
         return processing_result
+
+    def _precheck(self, request):
+        # type: (UsageFile) -> Optional[str]
+        if self.config.products \
+                and request.product.id not in self.config.products:
+            return 'Invalid product'
+        return None
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from collections import OrderedDict
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from connect.models.base import BaseModel
+from connect.sharding import get_attribute, get_timestamp
+
+
+class Scheduler(object):
+    """ Orders pending requests before they are dispatched, so bursts of requests of one
+    product or marketplace do not delay the requests of everybody else.
+
+    Requests are grouped in classes by the attributes named in ``class_keys`` (which must be
+    present in the ``attribute_paths`` of the engine), and classes share the dispatch order
+    with weighted fair queuing: every request gets a virtual finish time equal to that of the
+    previous request of its class plus its cost divided by the weight of the class, and requests
+    are dispatched by increasing finish time. A class with weight 2 gets twice as many turns as
+    a class with weight 1, and no class is starved.
+
+    The cost of a request is lower (so it is dispatched sooner) the more urgent it is. Urgency
+    is the product of the weight of the request ``type`` and an age factor that grows linearly
+    with the time elapsed since the request was created, reaching 2 when it has been waiting
+    for ``sla`` seconds.
+
+    Only the requests of one listing are ordered, so with more pending requests than the
+    ``limit`` of the engine, urgent requests in later pages wait until the requests of the
+    previous pages have been dispatched. Raise the ``limit`` to schedule over a larger window.
+
+    :param Sequence[str] class_keys: Attributes that define the class of a request.
+    :param dict[str,float] class_weights: Weights of classes, by the value of any of their
+        keys (like a product or marketplace id). Classes without weight have weight 1. If
+        several keys of a class have a weight, they are multiplied.
+    :param dict[str,float] type_weights: Weights of request types. Types without weight have
+        weight 1. By default, cancellations and suspensions are the most urgent.
+    :param float sla: Seconds a request is expected to wait at most.
+    """
+
+    TYPE_WEIGHTS = {'cancel': 4.0, 'suspend': 4.0, 'resume': 2.0, 'change': 2.0}
+
+    def __init__(self, class_keys=('marketplace', 'product'), class_weights=None,
+                 type_weights=None, sla=3600.0):
+        # type: (Sequence[str], Dict[str, float], Dict[str, float], float) -> None
+        if sla <= 0:
+            raise ValueError('SLA must be positive')
+        self.class_keys = tuple(class_keys)
+        self.class_weights = dict(class_weights or {})
+        self.type_weights = dict(self.TYPE_WEIGHTS if type_weights is None else type_weights)
+        self.sla = sla
+        self._stats = OrderedDict()  # type: Dict[Tuple, Dict[str, float]]
+
+    @property
+    def stats(self):
+        # type: () -> Dict[Tuple, Dict[str, float]]
+        """ (dict[tuple,dict[str,float]]) For every class in the last call to :py:meth:`order`,
+        the number of requests in queue (``depth``) and the mean and max seconds they had been
+        waiting since they were created (``mean_wait`` and ``max_wait``). """
+        return OrderedDict((key, dict(value)) for key, value in self._stats.items())
+
+    def order(self, engine, requests, now=None):
+        # type: (Any, Iterable[BaseModel], Optional[float]) -> List[BaseModel]
+        """
+        :param AutomationEngine engine: Engine the requests belong to.
+        :param Iterable[BaseModel] requests: Requests to order.
+        :param float now: Current timestamp, or ``None`` to use the current time.
+        :return: The requests, in the order they must be dispatched.
+        :rtype: list[BaseModel]
+        """
+        now = time.time() if now is None else now
+        paths = engine.attribute_paths
+        missing = [key for key in self.class_keys if key not in paths]
+        if missing:
+            raise ValueError('Invalid scheduler class keys for {}: {}. Valid keys are: {}'.format(
+                engine.__class__.__name__, ', '.join(missing), ', '.join(sorted(paths))))
+
+        classes = OrderedDict()  # type: Dict[Tuple, List[Tuple[float, float, int, BaseModel]]]
+        for index, request in enumerate(requests):
+            key = tuple(get_attribute(request, paths[name]) for name in self.class_keys)
+            created = get_timestamp(get_attribute(request, paths['created'])) \
+                if 'created' in paths else None
+            age = max(0.0, now - created) if created is not None else 0.0
+            request_type = get_attribute(request, paths['type']) if 'type' in paths else None
+            urgency = self.type_weights.get(request_type, 1.0) * (1.0 + age / self.sla)
+            classes.setdefault(key, []).append((urgency, age, index, request))
+
+        self._stats = OrderedDict()
+        tagged = []
+        for key, entries in classes.items():
+            weight = self._class_weight(key)
+            ages = [age for _, age, _, _ in entries]
+            self._stats[key] = {
+                'depth': len(entries),
+                'mean_wait': sum(ages) / len(ages),
+                'max_wait': max(ages),
+            }
+
+            # Most urgent requests of the class go first, then the oldest
+            entries.sort(key=lambda entry: (-entry[0], -entry[1], entry[2]))
+            finish = 0.0
+            for urgency, _, index, request in entries:
+                finish += 1.0 / (urgency * weight)
+                tagged.append((finish, index, request))
+
+        tagged.sort(key=lambda entry: (entry[0], entry[1]))
+        return [request for _, _, request in tagged]
+
+    def _class_weight(self, key):
+        # type: (Tuple) -> float
+        weight = 1.0
+        for value in key:
+            weight *= self.class_weights.get(value, 1.0)
+        return weight
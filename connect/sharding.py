@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import bisect
+import calendar
+import datetime
+import hashlib
+import os
+import re
+import time
+from typing import Any, Iterable, List, Optional
+
+import six
+
+from connect.models.base import BaseModel
+
+
+class HashRing(object):
+    """ Consistent hash ring. Every member is placed in the ring at ``replicas`` points, and each
+    key belongs to the member at the first point following the hash of the key. When a member
+    joins or leaves, only the keys around its points change owner.
+
+    :param Iterable[str] members: Initial members.
+    :param int replicas: Number of points of every member in the ring.
+    """
+
+    def __init__(self, members=(), replicas=100):
+        # type: (Iterable[str], int) -> None
+        if replicas < 1:
+            raise ValueError('Replicas must be at least 1')
+        self._replicas = replicas
+        self._members = set()
+        self._hashes = []  # type: List[int]
+        self._owners = []  # type: List[str]
+        for member in members:
+            self.add(member)
+
+    @property
+    def members(self):
+        # type: () -> List[str]
+        return sorted(self._members)
+
+    def add(self, member):
+        # type: (str) -> None
+        if member in self._members:
+            return
+        self._members.add(member)
+        for i in range(self._replicas):
+            point = _hash('{}#{}'.format(member, i))
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._owners.insert(index, member)
+
+    def remove(self, member):
+        # type: (str) -> None
+        if member not in self._members:
+            return
+        self._members.remove(member)
+        points = [(point, owner) for point, owner in zip(self._hashes, self._owners)
+                  if owner != member]
+        self._hashes = [point for point, _ in points]
+        self._owners = [owner for _, owner in points]
+
+    def get(self, key):
+        # type: (str) -> Optional[str]
+        """
+        :param str key: Key to look up.
+        :return: The member that owns the key, or ``None`` if the ring is empty.
+        :rtype: Optional[str]
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class StaticMembership(object):
+    """ Fixed list of replicas.
+
+    :param Iterable[str] members: Ids of all replicas.
+    """
+
+    def __init__(self, members):
+        # type: (Iterable[str]) -> None
+        self._members = sorted(set(members))
+
+    def members(self):
+        # type: () -> List[str]
+        return list(self._members)
+
+    def heartbeat(self, member):
+        # type: (str) -> None
+        pass
+
+    def leave(self, member):
+        # type: (str) -> None
+        pass
+
+
+class FileMembership(object):
+    """ Replicas discover each other through heartbeat files in a shared directory. Every
+    replica updates its own file on each heartbeat, and replicas whose file has not been
+    updated in ``ttl`` seconds are considered gone.
+
+    :param str directory: Directory shared by all replicas.
+    :param float ttl: Seconds after which a replica without heartbeats leaves the group.
+    """
+
+    SUFFIX = '.heartbeat'
+
+    def __init__(self, directory, ttl=60.0):
+        # type: (str, float) -> None
+        self._directory = directory
+        self._ttl = ttl
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def members(self):
+        # type: () -> List[str]
+        now = time.time()
+        members = []
+        for name in os.listdir(self._directory):
+            if not name.endswith(self.SUFFIX):
+                continue
+            try:
+                if now - os.path.getmtime(os.path.join(self._directory, name)) <= self._ttl:
+                    members.append(name[:-len(self.SUFFIX)])
+            except OSError:
+                # The replica left while listing
+                pass
+        return sorted(members)
+
+    def heartbeat(self, member):
+        # type: (str) -> None
+        path = self._path(member)
+        with open(path, 'a'):
+            os.utime(path, None)
+
+    def leave(self, member):
+        # type: (str) -> None
+        try:
+            os.remove(self._path(member))
+        except OSError:
+            pass
+
+    def _path(self, member):
+        # type: (str) -> str
+        return os.path.join(self._directory, member + self.SUFFIX)
+
+
+class Shard(object):
+    """ Selects the requests that belong to one replica, so several replicas of an automation
+    can run at the same time without dispatching the same request twice.
+
+    Requests are assigned to the live replicas with a :py:class:`HashRing`, using the attribute
+    of the request named by ``key``. The available keys depend on the engine (see
+    ``AutomationEngine.attribute_paths``), and always include ``'id'``. For example, sharding a
+    :py:class:`connect.resources.FulfillmentAutomation` by ``'asset'`` makes all requests of an
+    asset be handled by the same replica.
+
+    Membership is refreshed on every call to :py:meth:`select`, so work is rebalanced as
+    replicas join or leave.
+
+    :param str member: Id of this replica.
+    :param membership: A :py:class:`StaticMembership` or :py:class:`FileMembership`.
+    :param str key: Name of the request attribute used to assign requests.
+    :param int replicas: Number of points of every replica in the ring.
+    """
+
+    def __init__(self, member, membership, key='id', replicas=100):
+        # type: (str, Any, str, int) -> None
+        self.member = member
+        self.membership = membership
+        self.key = key
+        self._replicas = replicas
+        self._ring = HashRing(replicas=replicas)
+
+    @property
+    def ring(self):
+        # type: () -> HashRing
+        return self._ring
+
+    def refresh(self):
+        # type: () -> List[str]
+        """ Sends a heartbeat and updates the ring with the live replicas.
+
+        :return: The live replicas.
+        :rtype: list[str]
+        """
+        self.membership.heartbeat(self.member)
+        members = set(self.membership.members())
+        members.add(self.member)
+        current = set(self._ring.members)
+        for member in current - members:
+            self._ring.remove(member)
+        for member in members - current:
+            self._ring.add(member)
+        return sorted(members)
+
+    def select(self, engine, requests):
+        # type: (Any, Iterable[BaseModel]) -> List[BaseModel]
+        """
+        :param AutomationEngine engine: Engine the requests belong to.
+        :param Iterable[BaseModel] requests: Requests to filter.
+        :return: The requests owned by this replica.
+        :rtype: list[BaseModel]
+        """
+        path = engine.attribute_paths.get(self.key)
+        if not path:
+            raise ValueError('Invalid shard key `{}` for {}. Valid keys are: {}'.format(
+                self.key, engine.__class__.__name__, ', '.join(sorted(engine.attribute_paths))))
+        self.refresh()
+        return [request for request in requests
+                if self._ring.get(str(get_attribute(request, path))) == self.member]
+
+    def leave(self):
+        """ Removes this replica from the group, so others take over its requests. """
+        self.membership.leave(self.member)
+
+
+def get_attribute(obj, path):
+    # type: (Any, str) -> Any
+    """
+    :param obj: Object to read from.
+    :param str path: Dotted path of the attribute, like ``'asset.product.id'``.
+    :return: The value of the attribute, or ``None`` if some component is missing.
+    """
+    for name in path.split('.'):
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return obj
+
+
+_ISO_DATETIME = re.compile(r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})(\.\d+)?'
+                           r'(Z|[+-]\d{2}:?\d{2})?$', re.IGNORECASE)
+
+
+def get_timestamp(value):
+    # type: (Any) -> Optional[float]
+    """
+    :param value: A datetime, or an ISO 8601 string like ``'2018-11-21T11:10:29+01:00'``, like
+        the dates of requests. Dates without timezone are taken as UTC.
+    :return: The UTC timestamp of the date, or ``None`` if it is not a valid date.
+    :rtype: Optional[float]
+    """
+    if isinstance(value, six.string_types):
+        match = _ISO_DATETIME.match(value.strip())
+        if not match:
+            return None
+        try:
+            value = datetime.datetime(*[int(part) for part in match.groups()[:6]])
+        except ValueError:
+            return None
+        fraction, zone = match.group(7), match.group(8)
+        offset = 0
+        if zone and zone.upper() != 'Z':
+            digits = zone[1:].replace(':', '')
+            offset = (int(digits[:2]) * 60 + int(digits[2:])) * 60
+            offset = -offset if zone[0] == '-' else offset
+        return calendar.timegm(value.timetuple()) + float(fraction or 0) - offset
+    if isinstance(value, datetime.datetime):
+        offset = value.utcoffset() or datetime.timedelta(0)
+        return ((value.replace(tzinfo=None) - offset)
+                - datetime.datetime(1970, 1, 1)).total_seconds()
+    return None
+
+
+def _hash(key):
+    # type: (str) -> int
+    return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import datetime
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from connect.sharding import get_attribute, get_timestamp
+
+
+class Watermark(object):
+    """ High-water mark of the ``updated`` date of the requests listed by an engine, used to
+    list only the requests that changed since the previous poll.
+
+    When passed to :py:meth:`connect.resources.automation_engine.AutomationEngine.process`,
+    requests are listed in order of update, filtered to those updated after the mark (minus
+    ``overlap`` seconds, to tolerate clock skew and requests updated in the same second), and the
+    mark advances to the latest update listed.
+
+    Requests that are still pending but do not change, like skipped requests or requests whose
+    dispatch failed, are not listed again in incremental polls. A full listing of all the
+    requests (a sweep) is done every ``sweep_interval`` seconds to pick them up.
+
+    :param str path: Path of a JSON file where the mark is persisted, or ``None`` to keep it only
+        in memory, in which case the first poll after a restart is a sweep.
+    :param float sweep_interval: Seconds between sweeps.
+    :param float overlap: Seconds subtracted from the mark when listing requests.
+    """
+
+    logger = logging.getLogger('Watermark.logger')
+
+    def __init__(self, path=None, sweep_interval=3600.0, overlap=60.0):
+        # type: (Optional[str], float, float) -> None
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self.overlap = overlap
+        self.mark = None  # type: Optional[float]
+        self.swept = None  # type: Optional[float]
+        self._sweeping = False
+        self._started = None  # type: Optional[float]
+        if path and os.path.exists(path):
+            with open(path) as fp:
+                state = json.load(fp)
+            self.mark = state.get('mark')
+            self.swept = state.get('swept')
+
+    @property
+    def sweep_due(self):
+        # type: () -> bool
+        """ (bool) Whether the next poll must list all the requests. """
+        return self.mark is None or self.swept is None \
+            or time.time() - self.swept >= self.sweep_interval
+
+    def filters(self, engine, filters=None):
+        # type: (Any, Optional[Dict[str, Any]]) -> Dict[str, Any]
+        """ Adds the watermark to the filters of a poll. Must be followed by :py:meth:`advance`
+        once the listed requests have been dispatched.
+
+        :param AutomationEngine engine: Engine that lists the requests.
+        :param dict[str,Any] filters: Filters of the poll, or ``None`` to use the default ones.
+        :return: The filters to use.
+        :rtype: dict[str,Any]
+        :raises ValueError: Raised if the engine requests have no ``updated`` attribute.
+        """
+        path = self._path_of(engine)
+        filters = dict(filters or engine.filters())
+        self._started = time.time()
+        self._sweeping = self.sweep_due
+        filters['order_by'] = path
+        if not self._sweeping:
+            mark = datetime.datetime.utcfromtimestamp(self.mark - self.overlap)
+            filters['{}__gt'.format(path)] = mark.strftime('%Y-%m-%dT%H:%M:%S+00:00')
+        return filters
+
+    def advance(self, engine, requests):
+        # type: (Any, Iterable[Any]) -> None
+        """ Moves the mark to the latest update of the requests listed with the filters returned
+        by :py:meth:`filters`, and persists it.
+
+        :param AutomationEngine engine: Engine that listed the requests.
+        :param Iterable requests: Requests listed.
+        """
+        path = self._path_of(engine)
+        updates = [get_timestamp(get_attribute(request, path)) for request in requests]
+        updates = [update for update in updates if update is not None]
+        if updates:
+            self.mark = max([self.mark or 0.0] + updates)
+        if self._sweeping:
+            self.swept = self._started
+            if self.mark is None:
+                # Nothing pending, so no request updated before the sweep needs to be listed
+                self.mark = self._started
+            self.logger.info('Sweep finished, watermark set to {}'.format(self.mark))
+        self._sweeping = False
+        self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as fp:
+            json.dump({'mark': self.mark, 'swept': self.swept}, fp)
+        os.rename(temp_path, self.path)
+
+    @staticmethod
+    def _path_of(engine):
+        # type: (Any) -> str
+        path = engine.attribute_paths.get('updated')
+        if not path:
+            raise ValueError('{} does not support watermarks, its requests have no `updated` '
+                             'attribute'.format(engine.__class__.__name__))
+        return path
@@ -22,6 +22,14 @@ install_reqs = parse_requirements(
         'sdk.txt',
     ), session='None')
 
+
+def _requirement(install_req):
+    # Keep environment markers, like the python_version of futures
+    if install_req.markers:
+        return '{}; {}'.format(install_req.req, install_req.markers)
+    return str(install_req.req)
+
+
 PACKAGES = find_packages(exclude=['tests*'])
 
 DOC = ''
@@ -40,7 +48,13 @@ setup(
     url='https://github.com/ingrammicro/connect-python-sdk',
     license='Apache Software License',
     include_package_data=True,
-    install_requires=[str(ir.req) for ir in install_reqs],
+    install_requires=[_requirement(ir) for ir in install_reqs],
+    entry_points={
+        'console_scripts': [
+            'connect-daemon = connect.daemon:main',
+            'connect-replay = connect.replay:main',
+        ],
+    },
 
     classifiers=[
         'Development Status :: 5 - Production/Stable',
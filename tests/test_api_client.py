@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+import os
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.config import Config
+from connect.resources import FulfillmentAutomation
+from connect.resources.base import ApiClient
+from .common import Response
+
+
+class Server(object):
+    """ Serves a list of objects sorted with ``order_by``, and filtered by equality or with
+    ``<field>__gt``. """
+
+    def __init__(self, objects):
+        self.objects = objects
+        self.params = []
+
+    def get(self, url, params, **kwargs):
+        self.params.append(params)
+        keys = params.get('order_by', 'id').split(',')
+        objects = sorted(self.objects, key=lambda obj: tuple(obj[key] for key in keys))
+        for name, value in params.items():
+            if name.endswith('__gt'):
+                objects = [obj for obj in objects if obj[name[:-len('__gt')]] > value]
+            elif name not in ('limit', 'offset', 'order_by'):
+                objects = [obj for obj in objects if obj[name] == value]
+        offset = params.get('offset', 0)
+        page = objects[offset:offset + params['limit']]
+        return Response(ok=True, text=json.dumps(page), status_code=200)
+
+
+def _get_config():
+    return Config(file=os.path.join(os.path.dirname(__file__), 'config.json'))
+
+
+def _get_client():
+    return ApiClient(_get_config(), 'requests')
+
+
+def _get_objects(created):
+    return [{'id': 'PR-{:04d}'.format(i), 'created': value} for i, value in enumerate(created)]
+
+
+def _drain(server, pages):
+    """ Removes every object from the list right after seeing it, like approving it. """
+    seen = []
+    for page in pages:
+        seen.extend(obj['id'] for obj in page)
+        server.objects = [obj for obj in server.objects if obj['id'] not in seen]
+    return seen
+
+
+def test_offset_pages_skip_while_draining():
+    server = Server(_get_objects(['2019-03-01'] * 10))
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        seen = _drain(server, _get_client().iter_pages(limit=3))
+    assert len(seen) < 10
+
+
+def test_keyset_pages_while_draining():
+    server = Server(_get_objects(['2019-03-0{}'.format(i % 5 + 1) for i in range(10)]))
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        seen = _drain(server, _get_client().iter_pages(limit=3, keyset=['created', 'id']))
+    assert sorted(seen) == ['PR-{:04d}'.format(i) for i in range(10)]
+    assert server.params[0] == {'limit': 3, 'order_by': 'created,id'}
+    assert server.params[1] == {'limit': 3, 'order_by': 'created,id',
+                                'created': '2019-03-02', 'id__gt': 'PR-0001'}
+    assert server.params[2] == {'limit': 3, 'order_by': 'created,id',
+                                'created__gt': '2019-03-02'}
+
+
+def test_keyset_pages_with_ties():
+    # Pages full of objects created at the same time seek past the ones already seen by id
+    server = Server(_get_objects(['2019-03-01'] * 7 + ['2019-03-02']))
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        pages = list(_get_client().iter_pages(limit=3, keyset=['created', 'id']))
+    assert [obj['id'] for page in pages for obj in page] \
+        == ['PR-{:04d}'.format(i) for i in range(8)]
+    assert all('offset' not in params for params in server.params)
+    assert server.params[2]['id__gt'] == 'PR-0005'
+
+
+def test_keyset_pages_with_new_objects():
+    # Objects created after the last key while iterating are still found
+    server = Server(_get_objects(['2019-03-01'] * 4))
+    pages = []
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        for page in _get_client().iter_pages(limit=3, keyset=['created', 'id']):
+            pages.append(page)
+            if len(pages) == 1:
+                server.objects.append({'id': 'PR-0000-new', 'created': '2019-03-02'})
+                server.objects.append({'id': 'PR-0004', 'created': '2019-03-01'})
+    assert [obj['id'] for page in pages for obj in page] \
+        == ['PR-{:04d}'.format(i) for i in range(5)] + ['PR-0000-new']
+
+
+def test_keyset_pages_without_key():
+    server = Server([{'id': 'PR-0000', 'created': None}])
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        with pytest.raises(ValueError):
+            list(_get_client().iter_pages(limit=1, keyset=['created', 'id']))
+
+
+def test_engine_list_by_keyset():
+    server = Server(_get_objects(['2019-03-0{}T10:00:00+00:00'.format(i % 3 + 1)
+                                  for i in range(7)]))
+    for obj in server.objects:
+        obj['status'] = 'pending'
+    engine = FulfillmentAutomation(_get_config())
+    with patch('requests.get', MagicMock(side_effect=server.get)):
+        requests = engine.list({'status': 'pending', 'limit': 3})
+    assert sorted(request.id for request in requests) \
+        == ['PR-{:04d}'.format(i) for i in range(7)]
+    assert all(params['order_by'] == 'created,id' and params['limit'] == 3
+               for params in server.params)
+    assert len(server.params) > 1
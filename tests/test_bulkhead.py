@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import os
+import threading
+import time
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.bulkhead import Bulkhead, Bulkheads
+from connect.config import Config
+from connect.exceptions import DispatchTimeout
+from connect.leases import LeaseManager, MemoryLeaseStore
+from connect.models import Fulfillment
+from connect.resources import FulfillmentAutomation
+from .common import Response
+from .test_scheduler import _get_requests
+
+
+def _get_config():
+    return Config(file=os.path.join(os.path.dirname(__file__), 'config.json'))
+
+
+class SlowProductAutomation(FulfillmentAutomation):
+    """ Hangs dispatching requests of PRD-SLOW until released, and tracks concurrency. """
+
+    def __init__(self):
+        super(SlowProductAutomation, self).__init__(_get_config())
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def dispatch(self, request):
+        product = request.asset.product.id
+        with self.lock:
+            self.running[product] = self.running.get(product, 0) + 1
+            self.max_running[product] = max(self.max_running.get(product, 0),
+                                            self.running[product])
+        try:
+            if product == 'PRD-SLOW':
+                self.release.wait(5)
+            else:
+                time.sleep(0.01)
+            return 'ok'
+        finally:
+            with self.lock:
+                self.running[product] -= 1
+
+
+def _get_jobs(engine, specs):
+    requests = Fulfillment.deserialize(_get_requests(
+        [(product, 'purchase', 0) for product in specs]))
+    return [(engine, request) for request in requests]
+
+
+def test_slow_product_is_isolated():
+    engine = SlowProductAutomation()
+    bulkheads = Bulkheads(limits={'PRD-SLOW': Bulkhead(1, timeout=0.1)})
+    jobs = _get_jobs(engine, ['PRD-SLOW', 'PRD-SLOW', 'PRD-SLOW', 'PRD-A', 'PRD-A', 'PRD-B'])
+    try:
+        outcomes = bulkheads.dispatch(engine, jobs)
+    finally:
+        engine.release.set()
+
+    assert [outcome.request_id for outcome in outcomes] \
+        == ['PR-0000', 'PR-0003', 'PR-0004', 'PR-0005']
+    assert isinstance(outcomes[0].error, DispatchTimeout)
+    assert [outcome.result for outcome in outcomes[1:]] == ['ok', 'ok', 'ok']
+    assert bulkheads.stats == {
+        'PRD-SLOW': {'dispatched': 0, 'timed_out': 1, 'deferred': 2},
+        'PRD-A': {'dispatched': 2, 'timed_out': 0, 'deferred': 0},
+        'PRD-B': {'dispatched': 1, 'timed_out': 0, 'deferred': 0},
+    }
+
+
+def test_groups_share_limits():
+    engine = SlowProductAutomation()
+    bulkheads = Bulkheads(default=Bulkhead(4), groups={'PRD-A': 'small', 'PRD-B': 'small'},
+                          limits={'small': Bulkhead(1)})
+    outcomes = bulkheads.dispatch(engine, _get_jobs(engine, ['PRD-A', 'PRD-B'] * 3 + ['PRD-C'] * 4))
+    assert len(outcomes) == 10
+    assert engine.max_running['PRD-A'] + engine.max_running['PRD-B'] == 2
+    assert list(bulkheads.stats) == ['small', 'PRD-C']
+    assert bulkheads.stats['small']['dispatched'] == 6
+
+
+def test_max_queue():
+    engine = SlowProductAutomation()
+    threading.Timer(0.2, engine.release.set).start()
+    bulkheads = Bulkheads(default=Bulkhead(1, max_queue=1))
+    outcomes = bulkheads.dispatch(engine, _get_jobs(engine, ['PRD-SLOW'] * 5))
+    stats = bulkheads.stats['PRD-SLOW']
+    assert len(outcomes) == stats['dispatched']
+    assert stats['dispatched'] + stats['deferred'] == 5
+    assert stats['deferred'] >= 3
+
+
+def test_invalid_key():
+    with pytest.raises(ValueError):
+        Bulkheads(key='contract').dispatch(FulfillmentAutomation(_get_config()), [])
+
+
+def test_process_does_not_raise_timeouts():
+    engine = SlowProductAutomation()
+    response = Response(ok=True, status_code=200, text=_get_requests(
+        [('PRD-SLOW', 'purchase', 0), ('PRD-A', 'purchase', 0)]))
+    bulkheads = Bulkheads(default=Bulkhead(1, timeout=0.1))
+    try:
+        with patch('requests.get', MagicMock(return_value=response)):
+            outcomes = engine.process(bulkheads=bulkheads)
+    finally:
+        engine.release.set()
+    assert isinstance(outcomes[0].error, DispatchTimeout)
+    assert outcomes[1].result == 'ok'
+
+
+def test_timed_out_requests_stay_in_flight():
+    engine = SlowProductAutomation()
+    response = Response(ok=True, status_code=200, text=_get_requests(
+        [('PRD-SLOW', 'purchase', 0), ('PRD-A', 'purchase', 0)]))
+    bulkheads = Bulkheads(default=Bulkhead(1, timeout=0.1))
+    leases = LeaseManager(MemoryLeaseStore(), owner='me', ttl=60)
+    try:
+        with patch('requests.get', MagicMock(return_value=response)):
+            first = engine.process(bulkheads=bulkheads, leases=leases)
+            assert bulkheads.in_flight == ['PR-0000']
+            assert leases.held == ['PR-0000']
+
+            # The request that timed out is still running, so it is not dispatched again
+            second = engine.process(bulkheads=bulkheads, leases=leases)
+    finally:
+        engine.release.set()
+    assert [outcome.request_id for outcome in first] == ['PR-0000', 'PR-0001']
+    assert [outcome.request_id for outcome in second] == ['PR-0001']
+
+    # Its lease is released once it finishes
+    for _ in range(100):
+        if not bulkheads.in_flight and not leases.held:
+            break
+        time.sleep(0.01)
+    assert bulkheads.in_flight == []
+    assert leases.held == []
+
+
+def test_limits_hold_across_calls():
+    # A new request of the slow product on every call does not get a new worker while the
+    # previous one is still running
+    engine = SlowProductAutomation()
+    bulkheads = Bulkheads(default=Bulkhead(1, timeout=0.05))
+    outcomes = []
+    try:
+        for i in range(4):
+            jobs = _get_jobs(engine, ['PRD-SLOW', 'PRD-A'])
+            jobs[0][1].id = 'PR-SLOW-{}'.format(i)
+            jobs[1][1].id = 'PR-A-{}'.format(i)
+            outcomes.append([outcome.request_id for outcome in bulkheads.dispatch(engine, jobs)])
+            assert engine.max_running['PRD-SLOW'] == 1
+    finally:
+        engine.release.set()
+    assert outcomes[0] == ['PR-SLOW-0', 'PR-A-0']
+    assert outcomes[1:] == [['PR-A-1'], ['PR-A-2'], ['PR-A-3']]
+    assert bulkheads.stats['PRD-SLOW'] == {'dispatched': 0, 'timed_out': 0, 'deferred': 1}
+
+    # Once the request that timed out finishes, the pool takes requests again
+    for _ in range(100):
+        if not bulkheads.in_flight:
+            break
+        time.sleep(0.01)
+    jobs = _get_jobs(engine, ['PRD-SLOW'])
+    assert [outcome.result for outcome in bulkheads.dispatch(engine, jobs)] == ['ok']
+    bulkheads.close()
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+import os
+import pickle
+import time
+
+from mock import MagicMock, patch
+
+from connect.cache import ProductCatalog, TierConfigCache, TTLCache
+from connect.config import Config
+from connect.models import Fulfillment, Product, TierConfig, codec
+from connect.resources import Directory
+from .common import Response, load_str
+
+CONFIG = Config(file=os.path.join(os.path.dirname(__file__), 'config.json'))
+
+
+def test_expiration():
+    cache = TTLCache(ttl=10)
+    with patch('time.time', return_value=100):
+        cache.set('a', 1)
+        cache.set('b', None, ttl=30)
+    with patch('time.time', return_value=105):
+        assert cache.get('a') == 1
+        assert 'b' in cache
+    with patch('time.time', return_value=115):
+        assert cache.get('a', 'missing') == 'missing'
+        assert 'b' in cache
+        assert cache.pop('b', 'missing') is None
+        assert 'b' not in cache
+    assert cache.stats == {'hits': 3, 'misses': 2, 'evictions': 0}
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats['evictions'] == 1
+
+
+def test_pickle():
+    cache = TTLCache(ttl=60, max_size=10)
+    cache.set('a', 1)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert (copy.ttl, copy.max_size, len(copy)) == (60, 10, 0)
+    copy.set('a', 2)
+    assert cache.get('a') == 1
+
+
+def _get_tier_config_requests(account_ids):
+    request = json.loads(load_str(os.path.join(
+        os.path.dirname(__file__), 'data', 'response_tier_config_request.json')))[0]
+    return Response(ok=True, status_code=200, text=json.dumps([
+        dict(request, configuration=dict(request['configuration'], account={'id': account_id}))
+        for account_id in account_ids]))
+
+
+def test_tier_config_prefetch():
+    cache = TierConfigCache(chunk_size=2)
+    get = MagicMock(side_effect=[_get_tier_config_requests(['TA-1', 'TA-2']),
+                                 _get_tier_config_requests([])])
+    with patch('requests.get', get):
+        cache.prefetch(['TA-2', 'TA-1', 'TA-3', 'TA-1'], 'CN-1', CONFIG)
+        tier_config = cache.get('TA-1', 'CN-1', CONFIG)
+        assert tier_config.account.id == 'TA-1'
+        assert tier_config.frozen
+        assert cache.get('TA-3', 'CN-1', CONFIG) is None
+        cache.prefetch(['TA-1', 'TA-2', 'TA-3'], 'CN-1', CONFIG)
+    assert get.call_count == 2
+    assert get.call_args_list[0][1]['params'] == {
+        'status': 'approved', 'configuration__product__id': 'CN-1',
+        'configuration__account__id__in': 'TA-1,TA-2', 'limit': 100, 'offset': 0}
+    assert get.call_args_list[1][1]['params']['configuration__account__id__in'] == 'TA-3'
+
+
+def test_tier_config_get_and_invalidate():
+    requests = Fulfillment.deserialize(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json')))
+    TierConfig.cache = TierConfigCache()
+    try:
+        get = MagicMock(return_value=_get_tier_config_requests(['TA-0-7042-5000-3000']))
+        with patch('requests.get', get):
+            TierConfig.cache.prefetch_requests(requests, CONFIG)
+            assert TierConfig.get('TA-0-7042-5000-3000', 'CN-631-322-000', CONFIG)
+            assert get.call_count == 1
+            TierConfig.cache.invalidate('TA-0-7042-5000-3000', 'CN-631-322-000')
+            assert TierConfig.get('TA-0-7042-5000-3000', 'CN-631-322-000', CONFIG)
+        assert get.call_count == 2
+        assert get.call_args[1]['params']['configuration__account__id__in'] \
+            == 'TA-0-7042-5000-3000'
+    finally:
+        TierConfig.cache = None
+
+
+def _get_product(url, **kwargs):
+    product_id = url.rstrip('/').split('/')[-1]
+    return Response(ok=True, status_code=200,
+                    text=json.dumps({'id': product_id, 'name': 'Product ' + product_id}))
+
+
+def _wait_revalidation(catalog):
+    while catalog._revalidating:
+        time.sleep(0.01)
+
+
+def test_product_catalog(tmpdir):
+    path = str(tmpdir.join('catalog'))
+    Product.cache = ProductCatalog(path=path)
+    try:
+        with patch('requests.get', MagicMock(side_effect=_get_product)) as get:
+            Product.cache.warm_up(CONFIG)
+            assert get.call_count == 4
+            product = Directory(CONFIG).get_product('CN-631-322-000')
+            assert product.name == 'Product CN-631-322-000'
+            assert Directory(CONFIG).get_product('CN-000') is not product
+            assert get.call_count == 5
+
+        # Entries survive restarts, and are removed by product
+        Product.cache.flush()
+        Product.cache = ProductCatalog(path=path)
+        assert len(Product.cache) == 5
+        Product.cache.invalidate('CN-000')
+        assert len(Product.cache) == 3
+    finally:
+        Product.cache = None
+
+
+def test_product_catalog_save_interval(tmpdir):
+    path = str(tmpdir.join('catalog'))
+    with patch('time.time', return_value=1000), \
+            patch('requests.get', MagicMock(side_effect=_get_product)):
+        catalog = ProductCatalog(path=path, save_interval=60)
+        catalog.warm_up(CONFIG)
+    assert len(ProductCatalog(path=path)) == 4
+
+    # Stores within the interval are written at once, by the first one after it or a flush
+    with patch('connect.models.codec.dumps', MagicMock(side_effect=codec.dumps)) as dump:
+        with patch('time.time', return_value=1030):
+            catalog.fetch(CONFIG, 'products/CN-1', load=lambda: 'first')
+            catalog.fetch(CONFIG, 'products/CN-2', load=lambda: 'second')
+        assert dump.call_count == 0
+        with patch('time.time', return_value=1070):
+            catalog.fetch(CONFIG, 'products/CN-3', load=lambda: 'third')
+        assert dump.call_count == 1
+        assert len(ProductCatalog(path=path)) == 7
+        catalog.flush()
+        assert dump.call_count == 1
+
+
+def test_product_catalog_file(tmpdir):
+    path = str(tmpdir.join('catalog'))
+    catalog = ProductCatalog(path=path)
+    catalog.fetch(CONFIG, 'products', {'id__in': ['CN-1', 'CN-2']}, load=lambda: '[]')
+    catalog.fetch(CONFIG, 'usage/products/CN-1/template/', load=lambda: b'\x00template')
+    catalog.flush()
+
+    # Entries are encoded with the codec, and found again with the same filters
+    with open(path, 'rb') as fp:
+        assert len(codec.loads(fp.read())) == 2
+    catalog = ProductCatalog(path=path)
+    load = MagicMock()
+    assert catalog.fetch(CONFIG, 'products', {'id__in': ['CN-1', 'CN-2']}, load=load) == '[]'
+    assert catalog.fetch(CONFIG, 'usage/products/CN-1/template/', load=load) \
+        == b'\x00template'
+    assert not load.called
+
+    # Other files are ignored
+    with open(path, 'wb') as fp:
+        pickle.dump([], fp)
+    assert len(ProductCatalog(path=path)) == 0
+
+
+def test_product_catalog_revalidation():
+    catalog = ProductCatalog(ttl=10, max_stale=100)
+    names = iter(['first', 'second', 'third'])
+
+    def load():
+        return next(names)
+
+    with patch('time.time', return_value=1000):
+        assert catalog.fetch(CONFIG, 'products', load=load) == 'first'
+    with patch('time.time', return_value=1005):
+        assert catalog.fetch(CONFIG, 'products', load=load) == 'first'
+    with patch('time.time', return_value=1050):
+        # Stale entries are returned while they are revalidated
+        assert catalog.fetch(CONFIG, 'products', load=load) == 'first'
+        _wait_revalidation(catalog)
+        assert catalog.fetch(CONFIG, 'products', load=load) == 'second'
+    with patch('time.time', return_value=1200):
+        assert catalog.fetch(CONFIG, 'products', load=load) == 'third'
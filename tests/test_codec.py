@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import datetime
+import os
+import pickle
+
+import pytest
+
+from connect.models import Fulfillment, Param, TierConfigRequest, UsageFile, codec
+from .common import load_str
+
+
+def _load(model_class, filename):
+    return model_class.deserialize(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', filename)))
+
+
+@pytest.mark.parametrize('model_class,filename', [
+    (Fulfillment, 'response.json'),
+    (Fulfillment, 'response2.json'),
+    (TierConfigRequest, 'response_tier_config_request.json'),
+    (UsageFile, 'response_usage_file.json'),
+])
+def test_round_trip(model_class, filename):
+    objects = _load(model_class, filename)
+    data = codec.dumps(objects)
+    decoded = codec.loads(data)
+    assert isinstance(decoded, list)
+    assert all(isinstance(obj, model_class) for obj in decoded)
+    assert [obj.json for obj in decoded] == [obj.json for obj in objects]
+    assert len(data) < len(pickle.dumps(objects, protocol=2))
+
+
+def test_round_trip_values():
+    values = [None, True, False, 0, 127, 128, -1, 2 ** 70, 1.5, u'añb', b'\x00\xff',
+              {'a': [1, (2, 3)]}, datetime.datetime(2019, 1, 2, 3, 4, 5, 6)]
+    decoded = codec.loads(codec.dumps(values))
+    values[-2] = {'a': [1, [2, 3]]}
+    assert decoded == values
+
+
+def test_round_trip_aware_datetime():
+    class Tz(datetime.tzinfo):
+        def utcoffset(self, dt):
+            return datetime.timedelta(hours=-3, minutes=-30)
+
+        def dst(self, dt):
+            return datetime.timedelta(0)
+
+    value = datetime.datetime(2019, 1, 1, 12, 0, tzinfo=Tz())
+    decoded = codec.loads(codec.dumps(value))
+    assert decoded == value
+    assert decoded.utcoffset() == value.utcoffset()
+    assert decoded.hour == 12
+
+
+def test_datetime_with_seconds_offset():
+    class Tz(datetime.tzinfo):
+        def utcoffset(self, dt):
+            return datetime.timedelta(hours=5, seconds=30)
+
+        def dst(self, dt):
+            return datetime.timedelta(0)
+
+    with pytest.raises(TypeError):
+        codec.dumps(datetime.datetime(2019, 1, 1, 12, 0, tzinfo=Tz()))
+
+
+def test_missing_and_extra_attributes():
+    param = Param(id='param_a', custom='value')
+    decoded = codec.loads(codec.dumps(param))
+    assert decoded.__dict__ == {'id': 'param_a', 'custom': 'value'}
+    assert decoded.value is None
+
+
+def test_frozen():
+    decoded = codec.loads(codec.dumps(_load(Fulfillment, 'response.json')[0]), frozen=True)
+    assert decoded.frozen
+    assert decoded.asset.frozen
+
+
+def test_incompatible_version():
+    data = bytearray(codec.dumps(Param(id='param_a')))
+    data[5] ^= 0xFF  # Corrupt the checksum of the Param schema in the header
+    with pytest.raises(ValueError):
+        codec.loads(data)
+
+
+def test_invalid_data():
+    with pytest.raises(ValueError):
+        codec.loads(b'{}')
+    with pytest.raises(ValueError):
+        codec.loads(codec.dumps([1, 2])[:-1])
+
+
+def test_unsupported_type():
+    with pytest.raises(TypeError):
+        codec.dumps(object())
+
+
+def test_schema_ids():
+    from connect import models
+    model_names = [name for name in models.__all__
+                   if isinstance(getattr(models, name), type)
+                   and issubclass(getattr(models, name), models.BaseModel)]
+    assert sorted(codec.SCHEMA_IDS) == sorted(model_names)
+    assert len(set(codec.SCHEMA_IDS.values())) == len(codec.SCHEMA_IDS)
+
+    # Ids are part of the format, so they must not change
+    assert codec.SCHEMA_IDS['Fulfillment'] == 21
+    assert codec.SCHEMA_IDS['TierConfigRequest'] == 42
+
+
+def test_schema_not_in_header():
+    data = bytearray(codec.dumps(Param(id='param_a')))
+    data[3] = 0  # Remove the Param schema from the header
+    with pytest.raises(ValueError):
+        codec.loads(bytes(data[:4] + data[9:]))
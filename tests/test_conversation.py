@@ -8,7 +8,10 @@ import os
 
 from mock import patch, call, Mock
 
-from connect.models import Conversation, ConversationMessage, User, Fulfillment
+from connect.exceptions import SkipRequest
+from connect.models import ActivationTemplateResponse, Conversation, ConversationMessage, \
+    User, Fulfillment
+from connect.resources import FulfillmentAutomation
 from .common import Response, load_str
 
 conversation_contents = load_str(
@@ -17,6 +20,8 @@ conversation_contents = load_str(
 add_message_response = load_str(
     os.path.join(os.path.dirname(__file__), 'data', 'add_message_response.json'))
 
+request_contents = load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json'))
+
 
 def test_conversation_attributes():
     # type: () -> None
@@ -142,3 +147,62 @@ def test_get_conversation_bad_deserialize(get_mock):
     ])
 
     assert conversation is None
+
+
+class SkipAutomation(FulfillmentAutomation):
+    def process_request(self, request):
+        if request.note:
+            raise SkipRequest(request.note)
+
+
+@patch('requests.post')
+@patch('requests.get')
+def test_dispatch_resolves_conversation_lazily(get_mock, post_mock):
+    # type: (Mock, Mock) -> None
+    get_mock.side_effect = [
+        Response(True, '[' + conversation_contents + ']', 200),
+        Response(True, conversation_contents, 200)
+    ]
+    post_mock.return_value = Response(True, add_message_response, 200)
+    automation = SkipAutomation()
+    request = Fulfillment.deserialize(request_contents)[0]
+
+    # Requests without messages do not look up the conversation
+    automation.dispatch(request.evolve(note=''))
+    assert get_mock.call_count == 0
+    automation.dispatch(request.evolve(note='Hi, check out'))
+    assert get_mock.call_count == 2
+    assert post_mock.call_count == 0
+
+    # Repeated messages are only posted once, without fetching the conversation again
+    for note in ['Waiting', 'Waiting', 'Still waiting']:
+        automation.dispatch(request.evolve(note=note))
+    assert get_mock.call_count == 2
+    assert [kwargs['json']['text'] for _, kwargs in post_mock.call_args_list] \
+        == ['Waiting', 'Still waiting']
+
+
+class ApproveAutomation(FulfillmentAutomation):
+    def process_request(self, request):
+        return ActivationTemplateResponse('TL-000-000-000')
+
+
+@patch('requests.post')
+@patch('requests.get')
+def test_dispatch_keeps_result_if_conversation_fails(get_mock, post_mock):
+    # type: (Mock, Mock) -> None
+    get_mock.return_value = Response(False, 'Service unavailable', 503)
+    post_mock.return_value = Response(True, 'approved', 200)
+    automation = ApproveAutomation()
+    request = Fulfillment.deserialize(request_contents)[0]
+    with automation.metrics.dispatch():
+        assert automation.dispatch(request) == 'approved'
+    assert automation.metrics.histogram('dispatch', 'approve').count == 1
+
+    # Failing to post the message does not change the result either
+    get_mock.side_effect = [Response(True, '[' + conversation_contents + ']', 200),
+                            Response(True, conversation_contents, 200)]
+    post_mock.side_effect = [Response(True, 'approved', 200),
+                             Response(False, 'Service unavailable', 503)]
+    assert automation.dispatch(request) == 'approved'
+    assert post_mock.call_count == 3
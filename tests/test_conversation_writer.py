@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import pickle
+import threading
+import time
+
+import pytest
+from mock import MagicMock
+
+from connect.conversations import ConversationWriter
+from connect.models import Fulfillment
+
+
+class Engine(object):
+    """ Records messages, failing the ones in ``failures`` as many times as given. """
+
+    def __init__(self, failures=None, release=None):
+        self.failures = dict(failures or {})
+        self.release = release
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def _add_conversation_message(self, request, message):
+        if self.release:
+            self.release.wait(5)
+        with self.lock:
+            if self.failures.get(message):
+                self.failures[message] -= 1
+                raise IOError('Connection error')
+            self.messages.append((request.id, message))
+        time.sleep(0.001)
+
+
+def _requests(count):
+    return [Fulfillment(id='PR-{:04d}'.format(i)) for i in range(count)]
+
+
+def test_write():
+    engine = Engine()
+    requests = _requests(3)
+    with ConversationWriter(engine, workers=3) as writer:
+        for i in range(5):
+            for request in requests:
+                writer.write(request, 'Message {}'.format(i))
+                writer.write(request, 'Message {}'.format(i))
+    assert sorted(engine.messages) \
+        == sorted((request.id, 'Message {}'.format(i)) for request in requests for i in range(5))
+    for request in requests:
+        assert [message for request_id, message in engine.messages if request_id == request.id] \
+            == ['Message {}'.format(i) for i in range(5)]
+    assert writer.stats['written'] == 15
+    assert writer.stats['written'] + writer.stats['coalesced'] == 30
+
+
+def test_write_does_not_block():
+    release = threading.Event()
+    engine = Engine(release=release)
+    writer = ConversationWriter(engine)
+    writer.write(_requests(1)[0], 'Hello')
+    assert not writer.flush(timeout=0.05)
+    release.set()
+    assert writer.close(timeout=5)
+    assert engine.messages == [('PR-0000', 'Hello')]
+
+
+def test_retries():
+    engine = Engine(failures={'Retried': 2, 'Failed': 5})
+    with ConversationWriter(engine, max_retries=2, retry_delay=0) as writer:
+        writer.write(_requests(1)[0], 'Retried')
+        writer.write(_requests(1)[0], 'Failed')
+    assert engine.messages == [('PR-0000', 'Retried')]
+    assert writer.stats == {'written': 1, 'coalesced': 0, 'retried': 4, 'failed': 1}
+
+
+def test_closed():
+    writer = ConversationWriter(Engine())
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.write(_requests(1)[0], 'Hello')
+
+
+def test_pickle():
+    writer = ConversationWriter(MagicMock(), workers=4, max_retries=1)
+    writer.write(_requests(1)[0], 'Hello')
+    writer.close()
+    copy = pickle.loads(pickle.dumps(ConversationWriter(Fulfillment(), workers=4)))
+    assert (copy.workers, copy.max_retries) == (4, 3)
+    copy.engine = writer.engine
+    copy.write(_requests(1)[0], 'Bye')
+    assert copy.close(timeout=5)
+    assert writer.engine._add_conversation_message.call_count == 2
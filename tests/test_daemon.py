@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import os
+import signal
+
+import pytest
+from mock import MagicMock
+
+from connect.config import Config
+from connect.daemon import Daemon, load_engine
+from connect.resources import FulfillmentAutomation
+from connect.resources.automation_engine import AutomationEngine
+
+
+def _get_engine(side_effect):
+    engine = MagicMock(spec=AutomationEngine)
+    engine.limit = 10
+    engine.last_listed = 0
+
+    def process(*args, **kwargs):
+        outcomes = side_effect(*args, **kwargs)
+        engine.last_listed = len(outcomes)
+        return outcomes
+
+    engine.process.side_effect = process if side_effect else None
+    return engine
+
+
+def test_next_interval():
+    daemon = Daemon(_get_engine(None), min_interval=1, max_interval=5, jitter=0)
+    assert daemon.next_interval(None) == 2
+    assert daemon.next_interval(0) == 4
+    assert daemon.next_interval(0) == 5
+    assert daemon.next_interval(10) == 0
+    assert daemon.next_interval(0) == 2
+    assert daemon.next_interval(3) == 1
+
+
+def test_next_interval_jitter():
+    daemon = Daemon(_get_engine(None), min_interval=10, jitter=0.5)
+    for _ in range(20):
+        assert 5 <= daemon.next_interval(1) <= 15
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        Daemon(_get_engine(None), min_interval=0)
+    with pytest.raises(ValueError):
+        Daemon(_get_engine(None), min_interval=2, max_interval=1)
+    with pytest.raises(ValueError):
+        Daemon(_get_engine(None), backoff=0.5)
+    with pytest.raises(ValueError):
+        Daemon(_get_engine(None), jitter=1)
+
+
+def test_run_until_stopped():
+    results = [[1] * 10, ValueError('Connection error'), [1], []]
+
+    def process(filters, **kwargs):
+        result = results.pop(0)
+        if not results:
+            daemon.stop()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    engine = _get_engine(process)
+    daemon = Daemon(engine, min_interval=0.001, max_interval=0.01,
+                    process_kwargs={'max_workers': 2})
+    daemon.run(handle_signals=False)
+    assert engine.process.call_count == 4
+    engine.process.assert_called_with(None, max_workers=2)
+
+
+def test_poll_counts_listed_requests():
+    def process(filters):
+        # The page was full, but other replicas dispatched most requests
+        engine.last_listed = 10
+        return [1]
+
+    engine = _get_engine(None)
+    engine.process.side_effect = process
+    daemon = Daemon(engine, jitter=0)
+    assert daemon.next_interval(daemon.poll()) == 0
+
+
+def test_poll_prunes_journal():
+    journal = MagicMock()
+    journal.prune.return_value = 3
+    engine = _get_engine(lambda filters, journal: [])
+    daemon = Daemon(engine, process_kwargs={'journal': journal}, journal_retention=100)
+    daemon.poll()
+    daemon.poll()
+    journal.prune.assert_called_once_with(100)
+
+    with pytest.raises(ValueError):
+        Daemon(engine, journal_retention=0)
+
+
+def test_sigterm_drains_current_poll():
+    def process(filters):
+        os.kill(os.getpid(), signal.SIGTERM)
+        return [1]
+
+    previous = signal.getsignal(signal.SIGTERM)
+    engine = _get_engine(process)
+    daemon = Daemon(engine, min_interval=0.001)
+    daemon.run()
+    assert engine.process.call_count == 1
+    assert daemon.stopped
+    assert signal.getsignal(signal.SIGTERM) == previous
+
+
+def test_load_engine():
+    config = Config(api_url='http://localhost/public/v1', api_key='ApiKey XXXX:YYYYY')
+    engine = load_engine('connect.resources:FulfillmentAutomation', config)
+    assert isinstance(engine, FulfillmentAutomation)
+    assert engine.config is config
+
+    with pytest.raises(ValueError):
+        load_engine('connect.resources.FulfillmentAutomation', config)
+    with pytest.raises(TypeError):
+        load_engine('connect.resources:Directory', config)
@@ -154,3 +154,32 @@ def test_get_tier_config(get_mock):
 def test_get_tier_config_bad():
     with pytest.raises(ServerError):
         Directory().get_tier_config('TC-000-000-000')
+
+
+@patch('requests.get')
+def test_assets_frame(get_mock):
+    asset = _get_asset_response().text
+    get_mock.side_effect = [
+        Response(ok=True, text='[{0}, {0}]'.format(asset), status_code=200),
+        Response(ok=True, text='[{}]'.format(asset), status_code=200)]
+    frame = Directory().assets_frame(
+        columns=['id', 'tiers.tier1.id', 'items.mpn', 'items.quantity', 'params.missing.value'],
+        explode='items',
+        converters={'items.quantity': int},
+        page_size=2)
+    assert list(frame.keys()) == [
+        'id', 'tiers.tier1.id', 'items.mpn', 'items.quantity', 'params.missing.value']
+    assert len(frame['id']) == 3 * 2
+    assert frame['id'][0] == 'AS-9861-7949-8492'
+    assert frame['items.mpn'][0] == 'TEAM-ST3L2TAC1M'
+    assert frame['items.quantity'][0] == 3
+    assert frame['params.missing.value'] == [None] * 6
+
+    assert get_mock.call_count == 2
+    assert get_mock.call_args[1]['params'] == {'limit': 2, 'offset': 2}
+
+
+@patch('requests.get', MagicMock(return_value=Response(ok=True, text='[]', status_code=200)))
+def test_assets_frame_invalid_output():
+    with pytest.raises(ValueError):
+        Directory().assets_frame(output='invalid')
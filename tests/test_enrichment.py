@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import os
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.enrichment import Conversations, Enrichment, ProductTemplates, TierConfigs, enrich
+from connect.exceptions import FailRequest, SkipRequest
+from connect.models import ActivationTemplateResponse, Fulfillment, Template, TierConfig, codec
+from connect.resources import FulfillmentAutomation
+from connect.sharding import Shard, StaticMembership
+from .common import Response, load_str
+from .test_process import _get_requests_response
+
+conversation_contents = load_str(
+    os.path.join(os.path.dirname(__file__), 'data', 'conversation.json'))
+
+tier_config_contents = load_str(
+    os.path.join(os.path.dirname(__file__), 'data', 'response_tier_config_request.json')) \
+    .replace('TA-1-000-000-000', 'TA-0-7042-5000-3000')
+
+add_message_response = load_str(
+    os.path.join(os.path.dirname(__file__), 'data', 'add_message_response.json'))
+
+
+class EnrichedAutomation(FulfillmentAutomation):
+    enrichments = (TierConfigs(), ProductTemplates(), Conversations())
+
+    def __init__(self):
+        super(EnrichedAutomation, self).__init__()
+        self.enrichments_seen = {}
+
+    def process_request(self, request):
+        self.enrichments_seen[request.id] = request.enrichment
+        self._add_conversation_message(request, 'Hi, check out')
+        raise SkipRequest()
+
+
+class FailingEnrichment(Enrichment):
+    name = 'failing'
+
+    def keys(self, engine, request):
+        return [request.id]
+
+    def fetch_one(self, engine, key):
+        raise ValueError('Unavailable')
+
+
+class RecordingEnrichment(Enrichment):
+    name = 'recording'
+
+    def __init__(self):
+        super(RecordingEnrichment, self).__init__()
+        self.fetched = []
+
+    def keys(self, engine, request):
+        return [request.id]
+
+    def fetch_one(self, engine, key):
+        self.fetched.append(key)
+        return key
+
+
+class UnencodableEnrichment(Enrichment):
+    name = 'unencodable'
+
+    def keys(self, engine, request):
+        return [request.id]
+
+    def fetch_one(self, engine, key):
+        return object()
+
+
+class PoolAutomation(FulfillmentAutomation):
+    """ Approves the requests with their enrichment attached, and fails the rest. """
+
+    enrichments = (UnencodableEnrichment(),)
+
+    def process_request(self, request):
+        if request.enrichment and request.enrichment['unencodable'] is not None:
+            return ActivationTemplateResponse('TL-000-000-000')
+        raise FailRequest('Not enriched')
+
+
+def _get(url, **kwargs):
+    if url.endswith('/requests'):
+        return _get_requests_response(3)
+    elif url.endswith('/tier/config-requests'):
+        text = tier_config_contents
+    elif url.endswith('/templates'):
+        text = '[{"id": "TL-000-000-000", "name": "Template"}]'
+    elif url.endswith('/conversations'):
+        text = '[' + conversation_contents + ']'
+    else:
+        text = conversation_contents
+    return Response(ok=True, text=text, status_code=200)
+
+
+@patch('requests.post', MagicMock(return_value=Response(True, add_message_response, 200)))
+def test_enrichment():
+    engine = EnrichedAutomation()
+    with patch('requests.get', MagicMock(side_effect=_get)) as get:
+        engine.process()
+    assert len(engine.enrichments_seen) == 3
+    enrichment = engine.enrichments_seen['PR-0000-0000-0001']
+    assert isinstance(enrichment['tier_configs']['tier1'], TierConfig)
+    assert enrichment['tier_configs']['tier1'].id == 'TC-000-000-000'
+    assert enrichment['tier_configs']['tier2'] is None
+    assert isinstance(enrichment['templates'][0], Template)
+    assert enrichment['conversation'].id == 'CO-750-033-356'
+    with pytest.raises(TypeError):
+        enrichment['templates'] = []
+
+    # One query for the tier configs and the templates of the whole page, and the conversations
+    # are not looked up again when adding the message, which is the same as the last one
+    urls = [call[1]['url'] for call in get.call_args_list]
+    assert len([url for url in urls if url.endswith('/tier/config-requests')]) == 1
+    assert len([url for url in urls if url.endswith('/templates')]) == 1
+    assert len([url for url in urls if url.endswith('/conversations')]) == 3
+    params = [call[1]['params'] for call in get.call_args_list
+              if call[1]['url'].endswith('/tier/config-requests')][0]
+    assert params['configuration__account__id__in'] == 'TA-0-7042-5000-3000'
+    assert engine.metrics.histogram('enrich_tier_configs').count == 1
+
+
+@patch('requests.post', MagicMock(return_value=Response(True, add_message_response, 200)))
+def test_failing_enrichment():
+    engine = EnrichedAutomation()
+    engine.enrichments = (FailingEnrichment(), ProductTemplates())
+    with patch('requests.get', MagicMock(side_effect=_get)):
+        engine.process()
+    enrichment = engine.enrichments_seen['PR-0000-0000-0000']
+    assert enrichment['failing'] is None
+    assert enrichment['templates'][0].id == 'TL-000-000-000'
+
+
+@patch('requests.post', MagicMock(return_value=Response(True, add_message_response, 200)))
+def test_enrichment_of_selected_requests():
+    engine = EnrichedAutomation()
+    enrichment = RecordingEnrichment()
+    engine.enrichments = (enrichment,)
+    shard = Shard('a', StaticMembership(['a', 'b']))
+    with patch('requests.get', MagicMock(side_effect=_get)):
+        engine.process(shard=shard)
+
+    # Only the requests dispatched by this replica are enriched
+    assert 0 < len(engine.enrichments_seen) < 3
+    assert sorted(enrichment.fetched) == sorted(engine.enrichments_seen)
+
+
+def test_enrichment_not_serialized():
+    request = Fulfillment(id='PR-0000-0000-0000')
+    assert request.enrichment is None
+    request.freeze()
+    enrich(EnrichedAutomation(), [request], [RecordingEnrichment()])
+    assert request.enrichment == {'recording': 'PR-0000-0000-0000'}
+    assert 'enrichment' not in request.json and '_enrichment' not in request.json
+    assert codec.loads(codec.dumps(request)).enrichment is None
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+def test_unencodable_enrichment_in_pool():
+    with patch('connect.models.codec.dumps', MagicMock(side_effect=codec.dumps)) as dumps, \
+            patch('requests.post', MagicMock(
+                return_value=Response(True, add_message_response, 200))) as post:
+        automation = PoolAutomation()
+        outcomes = automation.process(processes=2)
+        automation.close_pool()
+    assert all(outcome.error is None for outcome in outcomes)
+    assert [call[1]['url'].split('/')[-2] for call in post.call_args_list
+            if '/requests/' in call[1]['url']] == ['approve'] * 3
+
+    # Every request is encoded without its enrichment after failing to encode it, and the
+    # workers fetch it again
+    assert dumps.call_count == 6
+    assert all(call[0][0][1] is None for call in dumps.call_args_list[1::2])
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import copy
+import os
+import pickle
+
+import pytest
+
+from connect.models import Asset, Fulfillment, Param, ServerErrorResponse
+from .common import load_str
+
+
+def _get_fulfillment():
+    return Fulfillment.deserialize(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json')))[0]
+
+
+def test_models_are_mutable_by_default():
+    request = _get_fulfillment()
+    assert not request.frozen
+    request.status = 'approved'
+    assert request.status == 'approved'
+
+
+def test_freeze():
+    request = _get_fulfillment()
+    assert request.freeze() is request
+    assert request.frozen
+    assert request.asset.frozen
+    assert isinstance(request.asset.params, tuple)
+    assert all(param.frozen for param in request.asset.params)
+
+    with pytest.raises(AttributeError):
+        request.status = 'approved'
+    with pytest.raises(AttributeError):
+        del request.asset.id
+    with pytest.raises(AttributeError):
+        request.asset.params[0].value = 'value'
+
+
+def test_freeze_dict():
+    error = ServerErrorResponse(error_code='E000', params={'a': [1]}).freeze()
+    assert error.params == {'a': (1,)}
+    with pytest.raises(TypeError):
+        error.params['b'] = 2
+    assert pickle.loads(pickle.dumps(error)).params == error.params
+
+
+def test_evolve_shares_unchanged_attributes():
+    request = _get_fulfillment().freeze()
+    evolved = request.evolve(status='failed')
+    assert isinstance(evolved, Fulfillment)
+    assert evolved.frozen
+    assert evolved.status == 'failed'
+    assert request.status == 'approved'
+    assert evolved.asset is request.asset
+
+    # Frozen lists are shared too, and changed values are frozen
+    asset = request.asset.evolve(id='AS-001', params=[Param(id='param_a')])
+    assert asset.items is request.asset.items
+    assert asset.tiers is request.asset.tiers
+    assert isinstance(asset.params, tuple) and asset.params[0].frozen
+    assert asset.evolve(id='AS-002').params is asset.params
+
+
+def test_evolve_mutable():
+    asset = Asset(id='AS-000', params=[Param(id='param_a')])
+    evolved = asset.evolve(id='AS-001')
+    assert not evolved.frozen
+    assert evolved.id == 'AS-001'
+    assert evolved.params is asset.params
+
+
+def test_frozen_copies():
+    request = _get_fulfillment().freeze()
+    for copied in (copy.deepcopy(request), pickle.loads(pickle.dumps(request))):
+        assert copied.frozen
+        assert copied.asset.id == request.asset.id
+
+
+def test_frozen_json():
+    request = _get_fulfillment()
+    json_data = request.json
+    assert request.freeze().json == json_data
+    assert '_frozen' not in request.json
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+from contextlib import closing
+import sqlite3
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.exceptions import FailRequest, InquireRequest, ServerError, SkipRequest
+from connect.journal import Journal
+from connect.models import ActivationTemplateResponse
+from .common import Response
+from .test_process import FulfillmentAutomationHelper, _get
+
+
+class CountingAutomation(FulfillmentAutomationHelper):
+    def __init__(self):
+        super(CountingAutomation, self).__init__()
+        self.processed = []
+
+    def process_request(self, request):
+        self.processed.append(request.id)
+        return super(CountingAutomation, self).process_request(request)
+
+
+def _ok():
+    return Response(ok=True, text='ok', status_code=200)
+
+
+def _error():
+    return Response(ok=False, text='Service unavailable', status_code=503)
+
+
+def test_journal(tmpdir):
+    path = str(tmpdir.join('journal.db'))
+    journal = Journal(path)
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+    journal.record('PR-1', ActivationTemplateResponse('TL-1'), None)
+    journal.record('PR-2', None, InquireRequest('More info'))
+    assert journal.pending() == ['PR-1', 'PR-2']
+    assert journal.get('PR-1')[0].template_id == 'TL-1'
+    result, error = journal.get('PR-2')
+    assert result is None
+    assert isinstance(error, InquireRequest)
+    assert str(error) == 'More info'
+    assert journal.get('PR-3') is None
+
+    journal.complete('PR-1')
+    assert journal.get('PR-1') is None
+    assert journal.pending() == ['PR-2']
+
+    assert journal.prune(3600) == 0
+    assert journal.prune(-1) == 2
+    assert journal.pending() == []
+
+
+def test_should_record():
+    assert Journal.should_record(ActivationTemplateResponse('TL-1'), None)
+    assert Journal.should_record(None, FailRequest())
+    assert not Journal.should_record(None, SkipRequest())
+    assert not Journal.should_record(None, ValueError())
+    assert not Journal.should_record(None, None)
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=_ok()))
+def test_process_replays_journal(tmpdir):
+    journal = Journal(str(tmpdir.join('journal.db')))
+
+    # Actions do not reach Connect, so their outcomes remain pending
+    automation = CountingAutomation()
+    with patch('requests.post', MagicMock(return_value=_error())):
+        with pytest.raises(ServerError):
+            automation.process(journal=journal, max_workers=2)
+    assert len(automation.processed) == 8
+    assert sorted(journal.pending()) \
+        == ['PR-0000-0000-{:04d}'.format(i) for i in (0, 1, 2, 3, 4, 6)]
+
+    # On restart, only skipped and failing requests are processed again
+    automation = CountingAutomation()
+    with patch('requests.post', MagicMock(return_value=_ok())) as post:
+        outcomes = automation.process(journal=journal, max_workers=2)
+    assert automation.processed == ['PR-0000-0000-0005', 'PR-0000-0000-0007']
+    assert post.call_count == 6
+    assert [outcome.result for outcome in outcomes] \
+        == ['ok', 'ok', 'ok', 'ok', 'ok', 'skip', 'ok', '']
+    assert journal.pending() == []
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=_ok()))
+def test_process_in_pool_replays_journal(tmpdir):
+    journal = Journal(str(tmpdir.join('journal.db')))
+    journal.record('PR-0000-0000-0004', None, FailRequest('Out of stock'))
+
+    with patch('requests.post', MagicMock(return_value=_ok())) as post:
+        automation = FulfillmentAutomationHelper()
+        outcomes = automation.process(journal=journal, processes=2)
+        automation.close_pool()
+    assert [outcome.request_id for outcome in outcomes][:2] \
+        == ['PR-0000-0000-0004', 'PR-0000-0000-0000']
+    assert post.call_args_list[0][1]['url'].endswith('PR-0000-0000-0004/fail/')
+    assert post.call_args_list[0][1]['json'] == {'reason': 'Out of stock'}
+    assert journal.pending() == []
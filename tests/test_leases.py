@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+import threading
+import time
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.leases import FileLeaseStore, LeaseManager, MemoryLeaseStore, SQLiteLeaseStore
+from connect.resources import FulfillmentAutomation
+from .common import Response
+from .test_process import _get_requests_response
+
+
+@pytest.fixture(params=['memory', 'file', 'sqlite'])
+def store(request, tmpdir):
+    if request.param == 'memory':
+        return MemoryLeaseStore()
+    elif request.param == 'file':
+        return FileLeaseStore(str(tmpdir.join('leases')))
+    else:
+        return SQLiteLeaseStore(str(tmpdir.join('leases.db')))
+
+
+def test_store(store):
+    assert store.acquire('PR-1', 'a', 60)
+    assert store.acquire('PR-1', 'a', 60)
+    assert not store.acquire('PR-1', 'b', 60)
+    assert store.acquire('PR-2', 'b', 60)
+
+    assert store.renew('PR-1', 'a', 60)
+    assert not store.renew('PR-1', 'b', 60)
+
+    store.release('PR-1', 'b')
+    assert not store.acquire('PR-1', 'b', 60)
+    store.release('PR-1', 'a')
+    assert store.acquire('PR-1', 'b', 60)
+    assert not store.renew('PR-3', 'a', 60)
+
+
+def test_store_expiration(store):
+    assert store.acquire('PR-1', 'a', 0.05)
+    time.sleep(0.1)
+    assert not store.renew('PR-1', 'a', 60)
+    assert store.acquire('PR-1', 'b', 60)
+
+
+def test_store_concurrent_acquire(store):
+    winners = []
+
+    def acquire(owner):
+        if store.acquire('PR-1', owner, 60):
+            winners.append(owner)
+
+    threads = [threading.Thread(target=acquire, args=(str(i),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(winners) == 1
+
+
+def test_manager_stats():
+    store = MemoryLeaseStore()
+    first = LeaseManager(store, owner='a', ttl=60)
+    second = LeaseManager(store, owner='b', ttl=60)
+    assert first.acquire('PR-1')
+    assert first.acquire('PR-1')
+    assert not second.acquire('PR-1')
+    first.renew_all()
+    first.release('PR-1')
+    assert second.acquire('PR-1')
+    assert first.held == []
+    assert second.held == ['PR-1']
+    assert first.stats == {'acquired': 1, 'contended': 0, 'renewed': 1, 'lost': 0, 'released': 1}
+    assert second.stats == {'acquired': 1, 'contended': 1, 'renewed': 0, 'lost': 0, 'released': 0}
+
+
+def test_manager_renews_in_background():
+    store = MemoryLeaseStore()
+    manager = LeaseManager(store, owner='a', ttl=0.15)
+    assert manager.acquire('PR-1')
+    time.sleep(0.3)
+    assert not store.acquire('PR-1', 'b', 60)
+    assert manager.stats['renewed'] >= 2
+    manager.release('PR-1')
+
+
+def test_manager_lost_lease():
+    store = MemoryLeaseStore()
+    manager = LeaseManager(store, owner='a', ttl=60)
+    assert manager.acquire('PR-1')
+    store.release('PR-1', 'a')
+    assert store.acquire('PR-1', 'b', 60)
+    manager.renew_all()
+    assert manager.held == []
+    assert manager.stats['lost'] == 1
+
+
+@patch('requests.get', MagicMock(return_value=_get_requests_response(8)))
+def test_process_with_leases():
+    store = MemoryLeaseStore()
+    for i in range(0, 8, 2):
+        store.acquire('PR-0000-0000-{:04d}'.format(i), 'other', 60)
+
+    engine = FulfillmentAutomation()
+    engine.dispatch = MagicMock(return_value='')
+    leases = LeaseManager(store, owner='me', ttl=60)
+    outcomes = engine.process(leases=leases, max_workers=4)
+    assert [outcome.request_id for outcome in outcomes] \
+        == ['PR-0000-0000-{:04d}'.format(i) for i in range(1, 8, 2)]
+    assert leases.held == []
+    assert leases.stats['contended'] == 4
+    assert leases.stats['released'] == 4
+
+
+def test_process_with_stale_listing():
+    # Both replicas list the same pending requests, but the second one only starts dispatching
+    # them after the first one has approved them and released their leases
+    listing = [dict(request, status='pending')
+               for request in json.loads(_get_requests_response(4).text)]
+    statuses = {request['id']: 'pending' for request in listing}
+
+    def get(url, **kwargs):
+        if url.endswith('/requests'):
+            return Response(ok=True, text=json.dumps(listing), status_code=200)
+        request_id = url.rstrip('/').split('/')[-1]
+        return Response(ok=True, text=json.dumps(
+            dict(listing[0], id=request_id, status=statuses[request_id])), status_code=200)
+
+    def approve(request):
+        statuses[request.id] = 'approved'
+        return 'ok'
+
+    store = MemoryLeaseStore()
+    first, second = FulfillmentAutomation(), FulfillmentAutomation()
+    first.dispatch = MagicMock(side_effect=approve)
+    second.dispatch = MagicMock(return_value='ok')
+    with patch('requests.get', MagicMock(side_effect=get)):
+        first_leases = LeaseManager(store, owner='first', ttl=60)
+        second_leases = LeaseManager(store, owner='second', ttl=60)
+        listed = second.list()
+        assert len(first.process(leases=first_leases)) == 4
+        with patch.object(second, 'list', MagicMock(return_value=listed)):
+            assert second.process(leases=second_leases) == []
+    assert not second.dispatch.called
+    assert second_leases.held == []
+    assert second_leases.stats['released'] == 4
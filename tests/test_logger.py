@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import logging
+
+import six
+from mock import MagicMock, patch
+
+from connect.logger import RequestContextFilter, function_log, request_context
+
+test_logger = logging.getLogger('Test.logger')
+
+
+class Expensive(object):
+    def __init__(self):
+        self.reprs = 0
+
+    def __repr__(self):
+        self.reprs += 1
+        return 'x' * 5000
+
+
+class Logged(object):
+    @function_log(custom_logger=test_logger, timed=True, max_length=100)
+    def echo(self, value):
+        return value
+
+
+def test_function_log_disabled():
+    value = Expensive()
+    test_logger.setLevel(logging.ERROR)
+    with patch.object(test_logger, '_log', MagicMock()) as log:
+        assert Logged().echo(value) is value
+    assert not log.called
+    assert value.reprs == 0
+
+
+def test_function_log_debug():
+    value = Expensive()
+    test_logger.setLevel(logging.DEBUG)
+    try:
+        with patch.object(test_logger, '_log', MagicMock()) as log, \
+                patch('time.time', MagicMock(side_effect=[10.0, 10.25])):
+            Logged().echo(value)
+    finally:
+        test_logger.setLevel(logging.NOTSET)
+    entering, params, took, returned = [call[0][1] % call[0][2] for call in log.call_args_list]
+    assert entering == 'Entering: echo'
+    assert params.startswith('Function params: (xxx') and params.endswith('xxx... {}')
+    assert took == 'Function `Logged.echo` took 250.0 ms'
+    assert returned == 'Function `Logged.echo` return: ' + 'x' * 48 + '...' + 'x' * 49
+
+
+def test_function_log_debug_truncates_while_formatting():
+    values = [Expensive() for _ in range(1000)]
+    test_logger.setLevel(logging.DEBUG)
+    try:
+        with patch.object(test_logger, '_log', MagicMock()) as log:
+            Logged().echo(values)
+    finally:
+        test_logger.setLevel(logging.NOTSET)
+    returned = [call[0][1] % call[0][2] for call in log.call_args_list][-1]
+    assert returned.endswith('...')
+    assert sum(value.reprs for value in values) < 20
+
+
+def test_request_context_in_handlers_added_later():
+    custom_stream, default_stream = six.StringIO(), six.StringIO()
+    custom = logging.StreamHandler(custom_stream)
+    custom.setFormatter(logging.Formatter('%(request_context)s|%(message)s'))
+    default = logging.StreamHandler(default_stream)
+    root = logging.getLogger()
+    root.addHandler(custom)
+    root.addHandler(default)
+    try:
+        with request_context('PR-1', 'AS-1'):
+            root.error('message')
+        with request_context('PR-2'):
+            root.error('message')
+    finally:
+        root.removeHandler(custom)
+        root.removeHandler(default)
+    assert custom_stream.getvalue().splitlines() == ['PR-1 AS-1|message', 'PR-2|message']
+    assert default_stream.getvalue().startswith('PR-1 AS-1 ERROR ')
+    assert len([log_filter for log_filter in custom.filters
+                if isinstance(log_filter, RequestContextFilter)]) == 1
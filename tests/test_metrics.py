@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import pickle
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.metrics import Histogram, Metrics
+from .common import Response
+from .test_process import FulfillmentAutomationHelper, _get
+
+
+def test_histogram():
+    histogram = Histogram([0.01, 0.1, 1])
+    for seconds in [0.005] * 50 + [0.05] * 45 + [0.5] * 4 + [2]:
+        histogram.observe(seconds)
+    assert histogram.counts == [50, 45, 4, 1]
+    assert (histogram.count, histogram.min, histogram.max) == (100, 0.005, 2)
+    assert histogram.percentile(50) == 0.01
+    assert histogram.percentile(95) == 0.1
+    assert histogram.percentile(99) == 1
+    assert histogram.percentile(100) == 2
+    assert Histogram([1]).percentile(50) == 0
+
+
+def test_dispatch_outcomes():
+    metrics = Metrics()
+    with metrics.time('list'):
+        pass
+    with metrics.dispatch():
+        with metrics.time('process_request'):
+            pass
+        metrics.set_outcome('approve')
+    with pytest.raises(ValueError):
+        with metrics.dispatch():
+            raise ValueError()
+    with metrics.dispatch():
+        pass
+    metrics.set_outcome('ignored')
+
+    assert list(metrics.snapshot()) == [
+        ('dispatch', 'approve'), ('dispatch', 'error'), ('dispatch', 'none'), ('list', ''),
+        ('process_request', 'approve')]
+    assert metrics.histogram('list').count == 1
+    assert metrics.histogram('list', 'approve') is None
+    report = metrics.report().splitlines()
+    assert report[0].split() == ['stage', 'outcome', 'count', 'mean', 'p50', 'p95', 'p99', 'max']
+    assert report[4].split()[:3] == ['list', '-', '1']
+
+    metrics.reset()
+    assert metrics.snapshot() == {}
+    assert pickle.loads(pickle.dumps(metrics)).buckets == Metrics.BUCKETS
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_metrics():
+    automation = FulfillmentAutomationHelper()
+    automation.process(max_workers=2)
+    snapshot = automation.metrics.snapshot()
+    assert {outcome: snapshot[('dispatch', outcome)]['count']
+            for stage, outcome in snapshot if stage == 'dispatch'} \
+        == {'approve': 4, 'inquire': 1, 'fail': 1, 'skip': 1, 'error': 1}
+    assert snapshot[('process_request', 'approve')]['count'] == 4
+    assert snapshot[('update_parameters', 'inquire')]['count'] == 1
+    assert snapshot[('conversation_lookup', 'fail')]['count'] == 1
+    assert snapshot[('list', '')]['count'] == snapshot[('decode', '')]['count'] == 1
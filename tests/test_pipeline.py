@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+import os
+import threading
+import time
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.pipeline import EnginePipeline, Pipeline, Stage
+from .common import Response, load_str
+from .test_process import FulfillmentAutomationHelper, _get, _get_requests_response
+
+conversation_contents = load_str(
+    os.path.join(os.path.dirname(__file__), 'data', 'conversation.json'))
+
+
+def test_pipeline():
+    pipeline = Pipeline([
+        Stage('split', lambda n: [n] * n, fan_out=True),
+        Stage('double', lambda n: n * 2, workers=3),
+        Stage('odd', lambda n: n if n % 4 else None, workers=2),
+    ])
+    assert sorted(pipeline.run([1, 2, 3])) == [2, 6, 6, 6]
+    stats = pipeline.stats
+    assert list(stats) == ['source', 'split', 'double', 'odd']
+    assert [stats[name]['processed'] for name in stats] == [3, 3, 6, 6]
+    assert all(0 <= stats[name]['utilization'] <= 1 for name in stats)
+
+
+def test_pipeline_backpressure():
+    lock = threading.Lock()
+    counts = {'read': 0, 'done': 0, 'ahead': 0}
+
+    def source():
+        for i in range(20):
+            with lock:
+                counts['read'] += 1
+                counts['ahead'] = max(counts['ahead'], counts['read'] - counts['done'])
+            yield i
+
+    def slow(item):
+        time.sleep(0.01)
+        with lock:
+            counts['done'] += 1
+        return item
+
+    pipeline = Pipeline([Stage('fast', lambda item: item, queue_size=1),
+                         Stage('slow', slow, queue_size=1)])
+    assert sorted(pipeline.run(source())) == list(range(20))
+
+    # Items in both queues and workers, and the one being read
+    assert counts['ahead'] <= 5
+    assert pipeline.stats['slow']['utilization'] > pipeline.stats['fast']['utilization']
+
+
+def test_pipeline_error():
+    def fail(item):
+        if item == 3:
+            raise ValueError('Invalid item')
+        return item
+
+    pipeline = Pipeline([Stage('fail', fail, workers=2)])
+    with pytest.raises(ValueError):
+        pipeline.run(iter(range(100)))
+    assert pipeline.stats['source']['processed'] < 100
+
+
+def test_unknown_stage():
+    with pytest.raises(ValueError):
+        EnginePipeline(FulfillmentAutomationHelper(), workers={'fetch': 2})
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_engine_pipeline():
+    automation = FulfillmentAutomationHelper()
+    pipeline = EnginePipeline(automation, workers={'process': 3, 'act': 2})
+    with patch('requests.post', MagicMock(
+            return_value=Response(ok=True, text='ok', status_code=200))) as post:
+        outcomes = pipeline.run()
+    assert sorted((outcome.request_id, outcome.result) for outcome in outcomes) \
+        == [('PR-0000-0000-{:04d}'.format(i), result)
+            for i, result in enumerate(['ok', 'ok', 'ok', 'ok', 'ok', 'skip', 'ok', ''])]
+    assert post.call_count == 6
+    stats = pipeline.stats
+    assert list(stats) == ['fetch', 'decode', 'process', 'act', 'converse']
+    assert stats['fetch']['processed'] == 1
+    assert stats['decode']['processed'] == 1
+    assert stats['converse']['processed'] == 8
+
+
+def _get_with_conversation(url, **kwargs):
+    if url.endswith('/requests'):
+        return _get_requests_response(2)
+    elif url.endswith('/conversations'):
+        return Response(ok=True, text='[' + conversation_contents + ']', status_code=200)
+    else:
+        return Response(ok=True, text=conversation_contents, status_code=200)
+
+
+@patch('requests.get', MagicMock(side_effect=_get_with_conversation))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_engine_pipeline_converse():
+    message = json.dumps(json.loads(conversation_contents)['messages'][0])
+
+    def post_side_effect(url, **kwargs):
+        text = message if url.endswith('/messages') else 'ok'
+        return Response(ok=True, text=text, status_code=200)
+
+    with patch('requests.post', MagicMock(side_effect=post_side_effect)) as post:
+        EnginePipeline(FulfillmentAutomationHelper()).run()
+    urls = sorted(call[1]['url'] for call in post.call_args_list)
+    assert len(urls) == 4
+    assert urls[0].endswith('/conversations/CO-750-033-356/messages')
+    assert urls[2].endswith('/requests/PR-0000-0000-0000/approve/')
+    assert urls[3].endswith('/requests/PR-0000-0000-0001/inquire/')
+
+
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_engine_pipeline_invalid_product():
+    requests = json.loads(_get_requests_response(2).text)
+    requests[0]['asset']['product']['id'] = 'CN-000-000-000'
+    automation = FulfillmentAutomationHelper()
+    automation.process_request = MagicMock(side_effect=automation.process_request)
+    with patch('requests.get', MagicMock(side_effect=lambda url, **kwargs: Response(
+            ok=True, text=json.dumps(requests) if url.endswith('/requests') else '[]',
+            status_code=200))):
+        outcomes = EnginePipeline(automation).run()
+    assert sorted((outcome.request_id, outcome.result) for outcome in outcomes) \
+        == [('PR-0000-0000-0000', 'Invalid product'), ('PR-0000-0000-0001', 'ok')]
+    assert [call[0][0].id for call in automation.process_request.call_args_list] \
+        == ['PR-0000-0000-0001']
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_engine_pipeline_metrics():
+    automation = FulfillmentAutomationHelper()
+    process_request = automation.process_request
+
+    def slow_process_request(request):
+        time.sleep(0.02)
+        return process_request(request)
+
+    automation.process_request = slow_process_request
+    EnginePipeline(automation).run()
+
+    # process_request is counted under the outcome of every dispatch, with its actual duration
+    assert automation.metrics.histogram('process_request') is None
+    approved = automation.metrics.histogram('process_request', 'approve')
+    assert approved.count == 4
+    assert approved.mean >= 0.02
+    assert automation.metrics.merged('process_request').count == 8
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+import logging
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+
+import pytest
+import six
+from mock import MagicMock, patch
+
+from connect.exceptions import AcceptUsageFile, FailRequest, InquireRequest, ServerError, \
+    SkipRequest, SubmitUsageFile
+from connect.logger import RequestContextFilter, RequestContextFormatter
+from connect.models import ActivationTemplateResponse, Param, codec
+from connect.resources import DispatchOutcome, FulfillmentAutomation
+from .common import Response, load_str
+
+
+def _get_requests_response(count=8):
+    request = json.loads(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json')))[0]
+    requests = []
+    for i in range(count):
+        request = dict(request, id='PR-0000-0000-{:04d}'.format(i))
+        requests.append(request)
+    return Response(ok=True, text=json.dumps(requests), status_code=200)
+
+
+def _get_empty_response():
+    return Response(ok=True, text='[]', status_code=200)
+
+
+def _get(url, **kwargs):
+    # Requests are returned by the listing, conversations are empty
+    return _get_requests_response() if url.endswith('/requests') else _get_empty_response()
+
+
+class FulfillmentAutomationHelper(FulfillmentAutomation):
+    """ Approves even requests, and inquires, fails, skips or raises on the rest. """
+
+    def __init__(self):
+        super(FulfillmentAutomationHelper, self).__init__()
+        self.threads = set()
+
+    def process_request(self, request):
+        self.threads.add(threading.current_thread().name)
+        number = int(request.id[-4:])
+        if number % 2 == 0:
+            return ActivationTemplateResponse('TL-000-000-000')
+        elif number % 8 == 1:
+            raise InquireRequest()
+        elif number % 8 == 3:
+            raise FailRequest()
+        elif number % 8 == 5:
+            raise SkipRequest()
+        else:
+            raise ValueError('Unexpected error')
+
+
+@pytest.mark.parametrize('max_workers', [None, 4])
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process(max_workers):
+    automation = FulfillmentAutomationHelper()
+    outcomes = automation.process(max_workers=max_workers)
+    assert len(outcomes) == 8
+    assert automation.last_listed == 8
+    assert all(isinstance(outcome, DispatchOutcome) for outcome in outcomes)
+    assert [outcome.request_id for outcome in outcomes] \
+        == ['PR-0000-0000-{:04d}'.format(i) for i in range(8)]
+    assert [outcome.result for outcome in outcomes] \
+        == ['ok', 'ok', 'ok', 'ok', 'ok', 'skip', 'ok', '']
+    assert all(outcome.error is None for outcome in outcomes)
+    if not max_workers:
+        assert automation.threads == {threading.current_thread().name}
+
+
+@pytest.mark.parametrize('max_workers,dispatched', [(None, 2), (4, 8)])
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_error(max_workers, dispatched):
+    # Failing to inquire PR-...-0001 raises, which stops dispatching only if done one at a time
+    automation = FulfillmentAutomationHelper()
+    with patch('requests.post', MagicMock(return_value=Response(
+            ok=False, text='Service unavailable', status_code=503))):
+        with pytest.raises(ServerError):
+            automation.process(max_workers=max_workers)
+    assert automation.metrics.merged('dispatch').count == dispatched
+
+
+@patch('requests.get', MagicMock(side_effect=_get))
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_in_pool():
+    automation = FulfillmentAutomationHelper()
+    with patch('requests.post', MagicMock(
+            return_value=Response(ok=True, text='ok', status_code=200))) as post:
+        with patch('multiprocessing.Pool', MagicMock(side_effect=multiprocessing.Pool)) as pool:
+            outcomes = automation.process(max_workers=2, processes=2, max_tasks_per_child=2)
+            again = automation.process(max_workers=2, processes=2, max_tasks_per_child=2)
+            with patch('requests.get', MagicMock(return_value=_get_empty_response())):
+                assert automation.process(processes=2, max_tasks_per_child=2) == []
+    try:
+        assert [outcome.result for outcome in outcomes] \
+            == ['ok', 'ok', 'ok', 'ok', 'ok', 'skip', 'ok', '']
+        assert all(outcome.error is None for outcome in outcomes)
+        assert [outcome.result for outcome in again] == [outcome.result for outcome in outcomes]
+
+        # Requests were processed in the workers, and actions applied here
+        assert automation.threads == set()
+        assert post.call_count == 12
+
+        # Workers are started once, and kept for the following calls
+        assert pool.call_count == 1
+        assert automation._pool is not None
+    finally:
+        automation.close_pool()
+    assert automation._pool is None
+
+
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_in_pool_invalid_product():
+    requests = json.loads(_get_requests_response(4).text)
+    requests[1]['asset']['product']['id'] = 'CN-000-000-000'
+    automation = FulfillmentAutomationHelper()
+
+    def get(url, **kwargs):
+        return Response(ok=True, text=json.dumps(requests), status_code=200) \
+            if url.endswith('/requests') else _get_empty_response()
+
+    with patch('requests.get', MagicMock(side_effect=get)), \
+            patch('connect.models.codec.dumps', MagicMock(side_effect=codec.dumps)) as dumps:
+        outcomes = automation.process(processes=2)
+    automation.close_pool()
+    results = {outcome.request_id: outcome.result for outcome in outcomes}
+    assert results['PR-0000-0000-0001'] == 'Invalid product'
+    assert results['PR-0000-0000-0000'] == 'ok'
+
+    # The request of the invalid product was not sent to the workers
+    assert dumps.call_count == 3
+
+
+def test_pickle_exceptions():
+    inquire = pickle.loads(pickle.dumps(InquireRequest('Wrong', [Param(id='p1')])))
+    assert str(inquire) == 'Wrong'
+    assert inquire.code == 'inquire'
+    assert inquire.params[0].id == 'p1'
+
+    accept = pickle.loads(pickle.dumps(AcceptUsageFile('Note')))
+    assert isinstance(accept, AcceptUsageFile)
+    assert accept.obj == {'acceptance_note': 'Note'}
+    assert pickle.loads(pickle.dumps(SubmitUsageFile())).code == 'submit'
+    assert pickle.loads(pickle.dumps(SkipRequest('Later', retry_after=60))).retry_after == 60
+
+
+@patch('requests.get', MagicMock(return_value=_get_requests_response()))
+def test_process_raises_after_dispatching_all():
+    automation = FulfillmentAutomationHelper()
+    automation.dispatch = MagicMock(side_effect=lambda request: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        automation.process(max_workers=4)
+    assert automation.dispatch.call_count == 8
+
+
+class SkipAutomation(FulfillmentAutomation):
+    """ Skips odd requests for a minute, and the rest with the default ttl. """
+
+    skip_ttl = 30
+
+    def __init__(self):
+        super(SkipAutomation, self).__init__()
+        self.processed = []
+
+    def process_request(self, request):
+        self.processed.append(request.id)
+        raise SkipRequest('Waiting', retry_after=60 if int(request.id[-4:]) % 2 else None)
+
+
+def test_skipped_requests_are_bypassed():
+    automation = SkipAutomation()
+    requests = json.loads(_get_requests_response(4).text)
+
+    def get(url, **kwargs):
+        if url.endswith('/requests'):
+            return Response(ok=True, text=json.dumps(requests), status_code=200)
+        return _get_empty_response()
+
+    with patch('requests.get', MagicMock(side_effect=get)):
+        assert len(automation.process()) == 4
+        assert automation.process() == []
+
+        # Updated requests are processed again, and the rest once their ttl expires
+        requests[0]['updated'] = '2019-03-01T10:00:00+00:00'
+        with patch('time.time', return_value=time.time() + 45):
+            outcomes = automation.process()
+    assert [outcome.request_id for outcome in outcomes] \
+        == ['PR-0000-0000-0000', 'PR-0000-0000-0002']
+    assert len(automation.processed) == 6
+
+
+class BatchAutomation(FulfillmentAutomation):
+    """ Approves purchases in batches of three, fails the rest, and breaks on PR-...-0007. """
+
+    batch_size = 3
+
+    def __init__(self):
+        super(BatchAutomation, self).__init__()
+        self.batches = []
+
+    def process_requests(self, requests):
+        self.batches.append([request.id[-1] for request in requests])
+        if any(request.id.endswith('7') for request in requests):
+            raise ValueError('Backend error')
+        return [ActivationTemplateResponse('TL-000-000-000') if request.type == 'purchase'
+                else FailRequest('Unsupported') for request in requests]
+
+
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_in_batches():
+    requests = json.loads(_get_requests_response().text)
+    for request in requests[1::3]:
+        request['type'] = 'change'
+    automation = BatchAutomation()
+    with patch('requests.get', MagicMock(side_effect=lambda url, **kwargs: Response(
+            ok=True, text=json.dumps(requests) if url.endswith('/requests') else '[]',
+            status_code=200))), \
+            patch('requests.post', MagicMock(
+                return_value=Response(ok=True, text='ok', status_code=200))) as post:
+        outcomes = automation.process()
+    assert automation.batches == [['0', '2', '3'], ['1', '4', '7'], ['5', '6']]
+    assert [outcome.request_id[-1] for outcome in outcomes] == list('02314756')
+    assert [outcome.result for outcome in outcomes] == ['ok'] * 3 + [''] * 3 + ['ok'] * 2
+    assert sorted(call[1]['url'].split('/')[-2] for call in post.call_args_list) \
+        == ['approve'] * 5
+
+
+@patch('requests.put', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='ok', status_code=200)))
+def test_process_in_batches_invalid_product():
+    requests = json.loads(_get_requests_response(4).text)
+    requests[1]['asset']['product']['id'] = 'CN-000-000-000'
+    automation = BatchAutomation()
+    with patch('requests.get', MagicMock(side_effect=lambda url, **kwargs: Response(
+            ok=True, text=json.dumps(requests) if url.endswith('/requests') else '[]',
+            status_code=200))):
+        outcomes = automation.process()
+    results = {outcome.request_id: outcome.result for outcome in outcomes}
+    assert results['PR-0000-0000-0001'] == 'Invalid product'
+    assert results['PR-0000-0000-0000'] == 'ok'
+
+    # The request of the invalid product was not passed to process_requests
+    assert automation.batches == [['0', '2', '3']]
+
+
+def test_custom_logger_prefix_per_thread():
+    automation = FulfillmentAutomationHelper()
+    stream = six.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(RequestContextFormatter('%(message)s'))
+    handler.addFilter(RequestContextFilter())
+
+    def log(prefix):
+        automation._set_custom_logger(prefix, None, 'TC-1')
+        time.sleep(0.01)
+        automation.logger.error('message from %s', prefix)
+
+    root = logging.getLogger()
+    with patch.object(root, 'handlers', [handler]):
+        threads = [threading.Thread(target=log, args=('PR-{}'.format(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    lines = stream.getvalue().splitlines()
+    assert sorted(lines) == ['PR-{0} TC-1message from PR-{0}'.format(i) for i in range(4)]
+    assert not automation.logger.handlers
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import json
+
+from mock import MagicMock, patch
+
+from connect.metrics import Metrics
+from connect.replay import Replay, ReplayReport, format_reports, load_pages, main
+from .test_process import FulfillmentAutomationHelper, _get_requests_response
+
+
+class ReplayAutomation(FulfillmentAutomationHelper):
+    def __init__(self, config=None):
+        super(ReplayAutomation, self).__init__()
+
+
+@patch('requests.get', MagicMock(side_effect=AssertionError('Unexpected GET')))
+@patch('requests.post', MagicMock(side_effect=AssertionError('Unexpected POST')))
+@patch('requests.put', MagicMock(side_effect=AssertionError('Unexpected PUT')))
+def test_replay():
+    requests = json.loads(_get_requests_response().text)
+    engine = ReplayAutomation()
+    replay = Replay(engine, requests, action_latency=0.01)
+    reports = [replay.run(concurrency) for concurrency in (1, 4)]
+    for report in reports:
+        assert report.count == 8
+        assert report.outcomes == {'approve': 4, 'inquire': 1, 'fail': 1, 'skip': 1, 'error': 1}
+        assert report.latency()['p99'] >= 0.01
+        assert len(report.latencies) == 8
+        assert report.metrics.histogram('conversation_post', 'fail').count == 1
+    assert reports[1].throughput > reports[0].throughput
+
+    # The engine itself is untouched
+    assert not engine.metrics.snapshot()
+    lines = format_reports(reports).splitlines()
+    assert len(lines) == 3
+    assert lines[1].split()[:2] == ['1', '8']
+
+
+def test_report_latency():
+    metrics = Metrics()
+    metrics.observe('dispatch', 0.5, 'approve')
+    report = ReplayReport(1, 100, 1.0, metrics, [i / 1000.0 for i in range(100, 0, -1)])
+    assert report.latency() == {'p50': 0.05, 'p95': 0.095, 'p99': 0.099}
+    assert report.latency('process_request') == {'p50': 0.0, 'p95': 0.0, 'p99': 0.0}
+    assert ReplayReport(1, 1, 1.0, metrics).latency()['p50'] == 0.5
+
+
+def test_main(tmpdir, capsys):
+    requests = json.loads(_get_requests_response(4).text)
+    paths = [str(tmpdir.join('page.json')), str(tmpdir.join('request.json'))]
+    with open(paths[0], 'w') as fp:
+        json.dump(requests[:3], fp)
+    with open(paths[1], 'w') as fp:
+        json.dump(requests[3], fp)
+    assert len(load_pages(paths)) == 4
+
+    main(['tests.test_replay:ReplayAutomation'] + paths + ['--concurrency', '1', '2', '--stages'])
+    output = capsys.readouterr().out
+    assert output.splitlines()[1].split()[:2] == ['1', '4']
+    assert 'Concurrency 2:' in output
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import datetime
+import json
+import os
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.models import Fulfillment
+from connect.resources import FulfillmentAutomation
+from connect.scheduler import Scheduler
+from .common import Response, load_str
+
+NOW = (datetime.datetime(2019, 3, 1) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def _get_requests(specs):
+    """ Builds one request for each ``(product, type, minutes waiting)`` tuple. """
+    request = json.loads(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json')))[0]
+    requests = []
+    for i, (product, request_type, minutes) in enumerate(specs):
+        created = datetime.datetime(2019, 3, 1) - datetime.timedelta(minutes=minutes)
+        data = dict(request, id='PR-{:04d}'.format(i), type=request_type,
+                    created=created.strftime('%Y-%m-%dT%H:%M:%S+00:00'))
+        data['asset'] = dict(data['asset'], product=dict(data['asset']['product'], id=product))
+        requests.append(data)
+    return json.dumps(requests)
+
+
+def _ids(requests):
+    return [request.id for request in requests]
+
+
+def test_fair_share():
+    # A burst of 6 requests for one product does not delay the other products
+    specs = [('PRD-A', 'purchase', 0)] * 6 + [('PRD-B', 'purchase', 0), ('PRD-C', 'purchase', 0)]
+    requests = Fulfillment.deserialize(_get_requests(specs))
+    ordered = Scheduler().order(FulfillmentAutomation(), requests, now=NOW)
+    assert _ids(ordered)[:3] == ['PR-0000', 'PR-0006', 'PR-0007']
+    assert _ids(ordered)[3:] == ['PR-0001', 'PR-0002', 'PR-0003', 'PR-0004', 'PR-0005']
+
+
+def test_class_weights():
+    specs = [('PRD-A', 'purchase', 0)] * 4 + [('PRD-B', 'purchase', 0)] * 4
+    requests = Fulfillment.deserialize(_get_requests(specs))
+    ordered = Scheduler(class_weights={'PRD-A': 3}).order(FulfillmentAutomation(), requests,
+                                                          now=NOW)
+    assert _ids(ordered)[:4] == ['PR-0000', 'PR-0001', 'PR-0002', 'PR-0004']
+
+
+def test_urgency():
+    specs = [('PRD-A', 'purchase', 0), ('PRD-A', 'purchase', 120), ('PRD-A', 'cancel', 0)]
+    requests = Fulfillment.deserialize(_get_requests(specs))
+    scheduler = Scheduler(sla=3600)
+    assert _ids(scheduler.order(FulfillmentAutomation(), requests, now=NOW)) \
+        == ['PR-0002', 'PR-0001', 'PR-0000']
+
+
+def test_urgency_with_timezones():
+    # The request created later in local time has been waiting longer in UTC
+    requests = Fulfillment.deserialize(_get_requests([('PRD-A', 'purchase', 0)] * 2))
+    requests[0].created = '2019-02-28T23:00:00+00:00'
+    requests[1].created = '2019-03-01T00:30:00+02:00'
+    scheduler = Scheduler(sla=3600)
+    assert _ids(scheduler.order(FulfillmentAutomation(), requests, now=NOW)) \
+        == ['PR-0001', 'PR-0000']
+    assert scheduler.stats[(requests[0].marketplace.id, 'PRD-A')]['max_wait'] == 5400.0
+
+
+def test_stats():
+    specs = [('PRD-A', 'purchase', 10), ('PRD-A', 'purchase', 30), ('PRD-B', 'cancel', 60)]
+    requests = Fulfillment.deserialize(_get_requests(specs))
+    scheduler = Scheduler()
+    scheduler.order(FulfillmentAutomation(), requests, now=NOW)
+    marketplace = requests[0].marketplace.id
+    assert scheduler.stats == {
+        (marketplace, 'PRD-A'): {'depth': 2, 'mean_wait': 1200.0, 'max_wait': 1800.0},
+        (marketplace, 'PRD-B'): {'depth': 1, 'mean_wait': 3600.0, 'max_wait': 3600.0},
+    }
+
+
+def test_invalid_class_key():
+    with pytest.raises(ValueError):
+        Scheduler(class_keys=['asset', 'contract']).order(FulfillmentAutomation(), [])
+
+
+def test_process_with_scheduler():
+    specs = [('PRD-A', 'purchase', 0)] * 3 + [('PRD-B', 'purchase', 0)]
+    response = Response(ok=True, text=_get_requests(specs), status_code=200)
+    engine = FulfillmentAutomation()
+    engine.dispatch = MagicMock(return_value='')
+    with patch('requests.get', MagicMock(return_value=response)):
+        outcomes = engine.process(scheduler=Scheduler())
+    assert [outcome.request_id for outcome in outcomes] \
+        == ['PR-0000', 'PR-0003', 'PR-0001', 'PR-0002']
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import datetime
+import os
+import time
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.models import Fulfillment
+from connect.resources import FulfillmentAutomation
+from connect.sharding import FileMembership, HashRing, Shard, StaticMembership, \
+    get_attribute, get_timestamp
+from .test_process import _get_requests_response
+
+
+def _get_requests(count):
+    return Fulfillment.deserialize(_get_requests_response(count).text)
+
+
+def test_ring_distribution():
+    ring = HashRing(['a', 'b', 'c'])
+    owners = [ring.get('PR-{}'.format(i)) for i in range(3000)]
+    for member in ('a', 'b', 'c'):
+        assert 700 < owners.count(member) < 1300
+
+
+def test_ring_rebalance():
+    ring = HashRing(['a', 'b', 'c'])
+    keys = ['PR-{}'.format(i) for i in range(1000)]
+    before = {key: ring.get(key) for key in keys}
+
+    # Only keys of the removed member move
+    ring.remove('b')
+    after = {key: ring.get(key) for key in keys}
+    assert ring.members == ['a', 'c']
+    assert all(after[key] == before[key] for key in keys if before[key] != 'b')
+    assert 'b' not in after.values()
+
+    # Only keys taken by the new member move
+    ring.add('b')
+    assert {key: ring.get(key) for key in keys} == before
+
+
+def test_empty_ring():
+    assert HashRing().get('PR-1') is None
+
+
+def test_file_membership(tmpdir):
+    membership = FileMembership(str(tmpdir.join('replicas')), ttl=60)
+    membership.heartbeat('a')
+    membership.heartbeat('b')
+    assert membership.members() == ['a', 'b']
+
+    # Expired heartbeat
+    path = str(tmpdir.join('replicas', 'b' + FileMembership.SUFFIX))
+    os.utime(path, (time.time() - 120, time.time() - 120))
+    assert membership.members() == ['a']
+
+    membership.leave('a')
+    assert membership.members() == []
+
+
+def test_shard_select():
+    engine = FulfillmentAutomation()
+    requests = _get_requests(50)
+    membership = StaticMembership(['a', 'b'])
+    selected = [Shard(member, membership).select(engine, requests) for member in ('a', 'b')]
+    ids = sorted(request.id for shard in selected for request in shard)
+    assert ids == sorted(request.id for request in requests)
+    assert all(selected)
+
+
+def test_shard_by_asset():
+    # All requests share the same asset, so they go to the same replica
+    engine = FulfillmentAutomation()
+    requests = _get_requests(10)
+    membership = StaticMembership(['a', 'b', 'c'])
+    sizes = sorted(len(Shard(member, membership, key='asset').select(engine, requests))
+                   for member in ('a', 'b', 'c'))
+    assert sizes == [0, 0, 10]
+
+
+def test_shard_invalid_key():
+    with pytest.raises(ValueError):
+        Shard('a', StaticMembership(['a']), key='contract') \
+            .select(FulfillmentAutomation(), _get_requests(1))
+
+
+def test_get_attribute():
+    request = _get_requests(1)[0]
+    assert get_attribute(request, 'asset.product.id') == request.asset.product.id
+    assert get_attribute(request, 'asset.missing.id') is None
+
+
+def test_get_timestamp():
+    utc = 1542798629.0  # 2018-11-21 11:10:29 UTC
+    assert get_timestamp('2018-11-21T11:10:29') == utc
+    assert get_timestamp('2018-11-21 11:10:29Z') == utc
+    assert get_timestamp('2018-11-21T11:10:29+00:00') == utc
+    assert get_timestamp('2018-11-21T12:10:29+01:00') == utc
+    assert get_timestamp('2018-11-21T07:40:29.5-0330') == utc + 0.5
+    assert get_timestamp(datetime.datetime(2018, 11, 21, 11, 10, 29)) == utc
+    assert get_timestamp(_get_requests(1)[0].created) is not None
+    assert get_timestamp('2018-11-21') is None
+    assert get_timestamp('2018-13-21T11:10:29') is None
+    assert get_timestamp(None) is None
+
+
+@patch('requests.get', MagicMock(return_value=_get_requests_response(20)))
+def test_process_with_shard():
+    engine = FulfillmentAutomation()
+    engine.dispatch = MagicMock(return_value='')
+    shard = Shard('a', StaticMembership(['a', 'b']))
+    outcomes = engine.process(shard=shard)
+    assert 0 < len(outcomes) < 20
+    assert [outcome.request_id for outcome in outcomes] \
+        == [request.id for request in shard.select(engine, _get_requests(20))]
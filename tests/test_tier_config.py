@@ -207,6 +207,19 @@ def test_process_raise_skip():
     automation.process()
 
 
+@patch('requests.get', MagicMock(return_value=_get_response_ok()))
+@patch('requests.post', MagicMock(return_value=Response(ok=True, text='approved',
+                                                        status_code=200)))
+def test_process_cache_invalidation_error():
+    automation = TierConfigAutomationHelper(ActivationTemplateResponse('TL-000-000-000'))
+    cache = MagicMock()
+    cache.invalidate.side_effect = ValueError('Cache unavailable')
+    with patch.object(TierConfig, 'cache', cache):
+        outcomes = automation.process()
+    assert cache.invalidate.called
+    assert [outcome.result for outcome in outcomes] == ['approved']
+
+
 class TierConfigAutomationHelper(TierConfigAutomation):
     def __init__(self, response='', exception_class=None):
         # type: (Union[ActivationTemplateResponse, ActivationTileResponse, str], type) -> None
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# This file is part of the Ingram Micro Cloud Blue Connect SDK.
+# Copyright (c) 2019 Ingram Micro. All Rights Reserved.
+
+import datetime
+import json
+import os
+
+import pytest
+from mock import MagicMock, patch
+
+from connect.models import Fulfillment
+from connect.resources import FulfillmentAutomation, UsageAutomation
+from connect.watermark import Watermark
+from .common import Response, load_str
+
+NOW = (datetime.datetime(2019, 3, 1) - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def _get_requests(updates):
+    """ Builds one request updated at each of the given minutes before NOW. """
+    request = json.loads(
+        load_str(os.path.join(os.path.dirname(__file__), 'data', 'response.json')))[0]
+    return json.dumps([
+        dict(request, id='PR-{:04d}'.format(i), updated=(
+            datetime.datetime(2019, 3, 1) - datetime.timedelta(minutes=minutes)
+        ).strftime('%Y-%m-%dT%H:%M:%S+00:00'))
+        for i, minutes in enumerate(updates)])
+
+
+def test_sweep_and_incremental(tmpdir):
+    path = str(tmpdir.join('watermark.json'))
+    engine = FulfillmentAutomation()
+    watermark = Watermark(path, sweep_interval=600, overlap=30)
+    with patch('time.time', return_value=NOW):
+        filters = watermark.filters(engine)
+        assert filters['order_by'] == 'updated'
+        assert 'updated__gt' not in filters
+        watermark.advance(engine, Fulfillment.deserialize(_get_requests([30, 10, 20])))
+    assert watermark.mark == NOW - 600
+    assert watermark.swept == NOW
+
+    # The mark is persisted
+    watermark = Watermark(path, sweep_interval=600, overlap=30)
+    assert (watermark.mark, watermark.swept) == (NOW - 600, NOW)
+    with patch('time.time', return_value=NOW + 300):
+        filters = watermark.filters(engine)
+        assert filters['updated__gt'] == '2019-02-28T23:49:30+00:00'
+        watermark.advance(engine, [])
+    assert watermark.mark == NOW - 600
+
+    with patch('time.time', return_value=NOW + 600):
+        assert 'updated__gt' not in watermark.filters(engine)
+
+
+def test_advance_with_timezones():
+    # Marks are compared in UTC, whatever the offset of the updates
+    engine = FulfillmentAutomation()
+    watermark = Watermark()
+    with patch('time.time', return_value=NOW):
+        watermark.filters(engine)
+        watermark.advance(engine, [
+            Fulfillment(id='PR-0000', updated='2019-03-01T01:00:00+02:00'),
+            Fulfillment(id='PR-0001', updated='2019-02-28T23:30:00Z'),
+            Fulfillment(id='PR-0002', updated='2019-02-28T20:15:00-03:00'),
+        ])
+    assert watermark.mark == NOW - 1800
+
+
+def test_sweep_without_requests():
+    engine = FulfillmentAutomation()
+    watermark = Watermark()
+    with patch('time.time', return_value=NOW):
+        watermark.filters(engine)
+        watermark.advance(engine, [])
+        assert not watermark.sweep_due
+    assert watermark.mark == NOW
+
+
+def test_engine_without_updates():
+    with pytest.raises(ValueError):
+        Watermark().filters(UsageAutomation())
+
+
+def test_process_with_watermark():
+    engine = FulfillmentAutomation()
+    engine.dispatch = MagicMock(return_value='')
+    watermark = Watermark()
+    response = Response(ok=True, text=_get_requests([5, 1]), status_code=200)
+    with patch('requests.get', MagicMock(return_value=response)) as get:
+        engine.process(watermark=watermark)
+        engine.process(watermark=watermark)
+    sweep, incremental = [call[1]['params'] for call in get.call_args_list]
+    assert 'updated__gt' not in sweep
+    assert incremental['updated__gt'] == '2019-02-28T23:58:00+00:00'
+    assert incremental['status'] == 'pending'